@@ -1,8 +1,20 @@
 """AnkiConnect HTTP client for syncing notes to Anki."""
 
-from typing import Any, Dict, List, Optional
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
 
-import httpx
+from . import json_utils
+from .hashing import compute_fields_hash
+from .http_utils import http2_available
+
+if TYPE_CHECKING:
+    import httpx
+
+
+# Large addNotes/notesInfo requests are split into chunks of this size and
+# sent with bounded concurrency (huge single requests can time out in Anki)
+BATCH_SIZE = 200
+BATCH_CONCURRENCY = 4
 
 
 class AnkiConnectError(Exception):
@@ -24,6 +36,36 @@ class AnkiConnectClient:
         """
         self.base_url = base_url
         self.timeout = timeout
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._queue: List[Tuple[Dict, asyncio.Future]] = []
+
+    async def __aenter__(self) -> "AnkiConnectClient":
+        self._get_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Return the shared HTTP client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            # HTTP/2 is only negotiated over TLS (ALPN); AnkiConnect itself
+            # speaks plain HTTP/1.1, so this matters for HTTPS proxies only
+            self._client = httpx.AsyncClient(
+                http2=self.base_url.startswith("https://") and http2_available(),
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+                headers={"Content-Type": "application/json"},
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and release pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def invoke(self, action: str, **params) -> Any:
         """
@@ -39,24 +81,25 @@ class AnkiConnectClient:
         Raises:
             AnkiConnectError: If connection fails or API returns error
         """
-        payload = {
-            "action": action,
-            "version": 6,
-            "params": params,
-        }
+        import httpx
+
+        payload = build_action(action, **params)
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(self.base_url, json=payload)
-                response.raise_for_status()
+            response = await self._get_client().post(
+                self.base_url, content=json_utils.dumps(payload)
+            )
+            response.raise_for_status()
 
-                result = response.json()
+            result = json_utils.loads(response.content)
 
-                if "error" in result and result["error"] is not None:
-                    raise AnkiConnectError(f"AnkiConnect error: {result['error']}")
+            if "error" in result and result["error"] is not None:
+                raise AnkiConnectError(f"AnkiConnect error: {result['error']}")
 
-                return result.get("result")
+            return result.get("result")
 
+        except AnkiConnectError:
+            raise
         except httpx.ConnectError as e:
             raise AnkiConnectError(
                 f"Cannot connect to AnkiConnect at {self.base_url}. "
@@ -67,6 +110,161 @@ class AnkiConnectClient:
         except Exception as e:
             raise AnkiConnectError(f"Unexpected error: {e}") from e
 
+    async def multi(self, actions: List[Dict]) -> List[Any]:
+        """
+        Invoke several actions in a single request via AnkiConnect's ``multi``.
+
+        Args:
+            actions: Action dictionaries as produced by ``build_action``
+
+        Returns:
+            Per-action results, in the same order as ``actions``
+
+        Raises:
+            AnkiConnectError: If the request fails or any action returns an error
+        """
+        if not actions:
+            return []
+
+        return [_unwrap_multi_result(r) for r in await self._multi_slots(actions)]
+
+    async def _multi_slots(self, actions: List[Dict]) -> List[Any]:
+        """
+        Send one ``multi`` request and return its raw per-action slots.
+
+        Raises:
+            AnkiConnectError: If the request fails or the response does not
+                hold one slot per action
+        """
+        results = await self.invoke("multi", actions=actions)
+        if not isinstance(results, list) or len(results) != len(actions):
+            raise AnkiConnectError(
+                f"AnkiConnect multi returned {len(results or [])} results for {len(actions)} actions"
+            )
+        return results
+
+    async def multi_settled(self, actions: List[Dict]) -> List[Any]:
+        """
+        Invoke many actions via ``multi``, reporting each action's outcome.
+
+        Actions are sent in chunks of ``BATCH_SIZE`` with bounded
+        concurrency. Failures do not raise: an action that failed, or whose
+        chunk could not be sent, has its ``AnkiConnectError`` in its slot,
+        because the other actions may already have been applied.
+
+        Args:
+            actions: Action dictionaries as produced by ``build_action``
+
+        Returns:
+            Per-action results or errors, in the same order as ``actions``
+        """
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def send(chunk: List[Dict]) -> List[Any]:
+            try:
+                async with semaphore:
+                    results = await self._multi_slots(chunk)
+            except AnkiConnectError as e:
+                return [e] * len(chunk)
+
+            outcomes = []
+            for result in results:
+                try:
+                    outcomes.append(_unwrap_multi_result(result))
+                except AnkiConnectError as e:
+                    outcomes.append(e)
+            return outcomes
+
+        chunk_outcomes = await asyncio.gather(
+            *(send(chunk) for chunk in _chunked(actions, BATCH_SIZE))
+        )
+        return [outcome for outcomes in chunk_outcomes for outcome in outcomes]
+
+    async def invoke_many(
+        self, calls: Sequence[Tuple[str, Dict]], max_workers: int = 10
+    ) -> List[Any]:
+        """
+        Invoke independent actions concurrently over the shared client.
+
+        Args:
+            calls: (action, params) pairs
+            max_workers: Maximum number of requests in flight at once
+
+        Returns:
+            Results in the same order as ``calls``
+
+        Raises:
+            AnkiConnectError: If any invocation fails
+        """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def one(action: str, params: Dict) -> Any:
+            async with semaphore:
+                return await self.invoke(action, **params)
+
+        return await asyncio.gather(*(one(a, p) for a, p in calls))
+
+    def queue_action(self, action: str, **params) -> asyncio.Future:
+        """
+        Queue an action to be sent with the next ``flush``.
+
+        Must be called from a coroutine running on the loop that will flush.
+
+        Args:
+            action: AnkiConnect action name
+            **params: Action parameters
+
+        Returns:
+            Future resolved with the action's result once flushed
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((build_action(action, **params), future))
+        return future
+
+    async def flush(self) -> List[Any]:
+        """
+        Send all queued actions in one ``multi`` request.
+
+        Each queued future is resolved with its slot of the response, or
+        fails with the slot's error. If the request fails or the response is
+        malformed, every queued future fails with that error, so none is
+        left pending.
+
+        Returns:
+            Raw per-action results
+
+        Raises:
+            AnkiConnectError: If the request fails or the response does not
+                hold one result per queued action
+        """
+        # Take the queue first so actions queued during the request wait for
+        # the next flush
+        pending, self._queue = self._queue, []
+        if not pending:
+            return []
+
+        error: BaseException = AnkiConnectError("Queued action was not sent")
+        try:
+            results = await self._multi_slots([a for a, _ in pending])
+
+            for (_, future), result in zip(pending, results):
+                if future.done():
+                    continue
+                try:
+                    future.set_result(_unwrap_multi_result(result))
+                except AnkiConnectError as e:
+                    future.set_exception(e)
+            return results
+
+        except Exception as e:
+            error = e
+            raise
+
+        finally:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+
     async def check_connection(self) -> bool:
         """
         Check if AnkiConnect is available.
@@ -88,7 +286,7 @@ class AnkiConnectClient:
             notes: List of note dictionaries in AnkiConnect format
 
         Returns:
-            List of note IDs (None for duplicates/errors)
+            List of note IDs aligned with ``notes`` (None for duplicates/errors)
 
         Raises:
             AnkiConnectError: If API call fails
@@ -96,25 +294,51 @@ class AnkiConnectClient:
         if not notes:
             return []
 
-        result = await self.invoke("addNotes", notes=notes)
-        return result
+        if len(notes) <= BATCH_SIZE:
+            return _pad_note_ids(await self.invoke("addNotes", notes=notes), len(notes))
 
-    async def update_note_fields(self, note_id: int, fields: Dict[str, str]) -> None:
+        chunks = _chunked(notes, BATCH_SIZE)
+        results = await self.invoke_many(
+            [("addNotes", {"notes": chunk}) for chunk in chunks],
+            max_workers=BATCH_CONCURRENCY,
+        )
+        # Pad every chunk so a missing result cannot shift later IDs
+        return [
+            note_id
+            for chunk, result in zip(chunks, results)
+            for note_id in _pad_note_ids(result, len(chunk))
+        ]
+
+    async def update_note_fields(
+        self,
+        note_id: int,
+        fields: Dict[str, str],
+        known_hash: Optional[str] = None,
+    ) -> bool:
         """
         Update fields of an existing note.
 
         Args:
             note_id: Anki note ID
             fields: Dictionary of field name to content
+            known_hash: Fields hash recorded at the last sync; if it matches
+                ``fields`` the request is skipped
+
+        Returns:
+            True if an update was sent, False if skipped as unchanged
 
         Raises:
             AnkiConnectError: If update fails
         """
+        if known_hash is not None and known_hash == compute_fields_hash(fields):
+            return False
+
         note_data = {
             "id": note_id,
             "fields": fields,
         }
         await self.invoke("updateNoteFields", note=note_data)
+        return True
 
     async def add_tags(self, note_ids: List[int], tags: str) -> None:
         """
@@ -180,8 +404,15 @@ class AnkiConnectClient:
         if not note_ids:
             return []
 
-        result = await self.invoke("notesInfo", notes=note_ids)
-        return result if result else []
+        if len(note_ids) <= BATCH_SIZE:
+            result = await self.invoke("notesInfo", notes=note_ids)
+            return result if result else []
+
+        results = await self.invoke_many(
+            [("notesInfo", {"notes": chunk}) for chunk in _chunked(note_ids, BATCH_SIZE)],
+            max_workers=BATCH_CONCURRENCY,
+        )
+        return [info for result in results for info in result or []]
     
     async def delete_notes(self, note_ids: List[int]) -> None:
         """
@@ -252,18 +483,36 @@ class AnkiConnectClient:
         )
         return result
 
-    async def find_notes_by_guid(self, guid_prefix: str) -> List[int]:
+    async def find_notes_by_guid(
+        self, guid_prefixes: Union[str, Sequence[str]], max_workers: int = 10
+    ) -> List[int]:
         """
         Find notes by GUID tag prefix.
 
         Args:
-            guid_prefix: GUID prefix (e.g., first 12 characters)
+            guid_prefixes: One GUID prefix (e.g., first 12 characters) or a list
+                of prefixes, looked up concurrently
+            max_workers: Maximum number of lookups in flight at once
 
         Returns:
-            List of matching note IDs
+            List of matching note IDs (deduplicated, in lookup order)
         """
-        query = f"tag:guid:{guid_prefix}*"
-        return await self.find_notes(query)
+        if isinstance(guid_prefixes, str):
+            guid_prefixes = [guid_prefixes]
+
+        results = await self.invoke_many(
+            [("findNotes", {"query": f"tag:guid:{p}*"}) for p in guid_prefixes],
+            max_workers=max_workers,
+        )
+
+        note_ids = []
+        seen = set()
+        for result in results:
+            for note_id in result or []:
+                if note_id not in seen:
+                    seen.add(note_id)
+                    note_ids.append(note_id)
+        return note_ids
 
     async def sync(self) -> None:
         """
@@ -275,24 +524,90 @@ class AnkiConnectClient:
         await self.invoke("sync")
 
 
+def build_action(action: str, **params) -> Dict:
+    """
+    Build an AnkiConnect action payload.
+
+    Args:
+        action: AnkiConnect action name
+        **params: Action parameters
+
+    Returns:
+        Payload dict usable directly or inside a ``multi`` request
+    """
+    return {
+        "action": action,
+        "version": 6,
+        "params": params,
+    }
+
+
+def _chunked(items: List, size: int) -> List[List]:
+    """Split a list into consecutive chunks of at most ``size`` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _pad_note_ids(result: Optional[List], size: int) -> List[Optional[int]]:
+    """Fit an addNotes result to ``size`` slots, filling missing IDs with None."""
+    note_ids = list(result or [])[:size]
+    return note_ids + [None] * (size - len(note_ids))
+
+
+def _unwrap_multi_result(result: Any) -> Any:
+    """Extract one action's result from a ``multi`` response slot."""
+    if isinstance(result, dict) and "error" in result:
+        if result["error"] is not None:
+            raise AnkiConnectError(f"AnkiConnect error: {result['error']}")
+        return result.get("result")
+    return result
+
+
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    """Create an event loop, preferring uvloop when available."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.new_event_loop()  # uvloop not installed (or Windows)
+    return uvloop.new_event_loop()
+
+
 # Synchronous wrapper for simple use cases
 class SyncAnkiConnectClient:
     """Synchronous wrapper for AnkiConnectClient."""
 
     def __init__(self, base_url: str = "http://127.0.0.1:8765", timeout: int = 30):
         self.client = AnkiConnectClient(base_url, timeout)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __enter__(self) -> "SyncAnkiConnectClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __del__(self):
+        # Best effort for callers that never close(); skip if the loop is busy
+        loop = getattr(self, "_loop", None)
+        if loop is not None and not loop.is_closed() and not loop.is_running():
+            try:
+                self.close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """Close the underlying HTTP connection pool and event loop."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.run_until_complete(self.client.aclose())
+        self._loop.close()
+        self._loop = None
 
     def _run_async(self, coro):
-        """Helper to run async coroutines."""
-        import asyncio
-
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        """Run a coroutine on this wrapper's cached event loop."""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = _new_event_loop()
 
-        return loop.run_until_complete(coro)
+        return self._loop.run_until_complete(coro)
 
     def check_connection(self) -> bool:
         """Check if AnkiConnect is available."""
@@ -302,9 +617,24 @@ class SyncAnkiConnectClient:
         """Add multiple notes to Anki."""
         return self._run_async(self.client.add_notes(notes))
 
-    def update_note_fields(self, note_id: int, fields: Dict[str, str]) -> None:
-        """Update fields of an existing note."""
-        return self._run_async(self.client.update_note_fields(note_id, fields))
+    def update_note_fields(
+        self,
+        note_id: int,
+        fields: Dict[str, str],
+        known_hash: Optional[str] = None,
+    ) -> bool:
+        """Update fields of an existing note (skipped if unchanged)."""
+        return self._run_async(
+            self.client.update_note_fields(note_id, fields, known_hash)
+        )
+
+    def multi(self, actions: List[Dict]) -> List[Any]:
+        """Invoke several actions in a single request."""
+        return self._run_async(self.client.multi(actions))
+
+    def multi_settled(self, actions: List[Dict]) -> List[Any]:
+        """Invoke many actions in chunks, returning each action's result or error."""
+        return self._run_async(self.client.multi_settled(actions))
 
     def add_tags(self, note_ids: List[int], tags: str) -> None:
         """Add tags to notes."""
@@ -1,5 +1,9 @@
 """Command-line interface for anki-tex."""
 
+import atexit
+import logging
+import logging.handlers
+import queue
 from pathlib import Path
 from typing import Optional
 
@@ -16,6 +20,28 @@ app = typer.Typer(
     add_completion=False,
 )
 
+def _configure_logging() -> None:
+    """
+    Route library log records to stderr through a background thread.
+
+    Records are queued by the emitting thread and written by a
+    QueueListener, so concurrent LLM calls never block on console I/O.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.WARNING)
+
+
 def version_callback(value: bool):
     """Show version and exit."""
     if value:
@@ -34,7 +60,7 @@ def main(
     )
 ):
     """Commit - Commit to your learning journey with intelligent flashcards."""
-    pass
+    _configure_logging()
 
 console = Console()
 
@@ -130,7 +156,7 @@ def set_since(
     state_file: Optional[Path] = typer.Option(
         None,
         "--state-file",
-        help="Path to state file (default: ~/.anki_tex_state.json)",
+        help="Path to state file (default: ~/.commit_state.json)",
     ),
 ):
     """
@@ -161,7 +187,7 @@ def clear_cache(
     state_file: Optional[Path] = typer.Option(
         None,
         "--state-file",
-        help="Path to state file (default: ~/.anki_tex_state.json)",
+        help="Path to state file (default: ~/.commit_state.json)",
     ),
     force: bool = typer.Option(
         False,
@@ -206,7 +232,7 @@ def stats(
     state_file: Optional[Path] = typer.Option(
         None,
         "--state-file",
-        help="Path to state file (default: ~/.anki_tex_state.json)",
+        help="Path to state file (default: ~/.commit_state.json)",
     ),
 ):
     """
@@ -232,6 +258,46 @@ def stats(
         raise typer.Exit(code=1)
 
 
+@app.command()
+def export_state(
+    state_file: Optional[Path] = typer.Option(
+        None,
+        "--state-file",
+        help="Path to state file (default: ~/.commit_state.json)",
+    ),
+    output: Optional[Path] = typer.Option(
+        None,
+        "--output",
+        "-o",
+        help="Write to this file instead of stdout",
+    ),
+    pretty: bool = typer.Option(
+        False,
+        "--pretty",
+        help="Indent and sort keys for reading",
+    ),
+):
+    """
+    Export the tracked state as JSON.
+
+    The state file is stored compactly; use --pretty to inspect it.
+    """
+    from .state import StateManager
+
+    try:
+        data = StateManager(state_file).export(pretty=pretty)
+
+        if output:
+            output.write_bytes(data)
+            console.print(f"[green]Exported state to {output}[/green]")
+        else:
+            typer.echo(data.decode("utf-8"))
+
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(code=1)
+
+
 @app.command()
 def undo(
     repo: Path = typer.Argument(..., help="Path to notes repository"),
@@ -327,10 +393,10 @@ def undo(
             client.delete_notes(note_ids)
             console.print(f"[green]✓ Deleted {len(note_ids)} card(s)[/green]")
         
-        # Get all note GUIDs and remove them from state
-        all_guids = manager.get_all_note_guids()
-        if all_guids:
-            removed = manager.remove_notes_by_guids(all_guids)
+        # Remove the notes this commit created from state
+        commit_guids = manager.get_notes_for_commit(last_sha)
+        if commit_guids:
+            removed = manager.remove_notes_by_guids(commit_guids)
             console.print(f"[green]✓ Removed {removed} note(s) from state[/green]")
         
         # Reset to parent commit
@@ -369,7 +435,7 @@ def reconcile_state(
     state_file: Optional[Path] = typer.Option(
         None,
         "--state-file",
-        help="Path to state file (default: ~/.anki_tex_state.json)",
+        help="Path to state file (default: ~/.commit_state.json)",
     ),
     force: bool = typer.Option(
         False,
@@ -433,7 +499,7 @@ def reconcile_state(
                         default=False
                     )
                     if choice:
-                        state._state["note_hashes"] = {}
+                        state.replace_note_hashes({})
                         state.save()
                         console.print("[green]✓ State file cleared[/green]")
                     else:
@@ -590,7 +656,7 @@ def reconcile_state(
                 }
                 added_count += 1
             
-            state._state["note_hashes"] = state_data
+            state.replace_note_hashes(state_data)
             state.save()
             
             console.print(f"[green]✓ State updated:[/green]")
@@ -667,25 +733,27 @@ def check_orphans(
         # Extract all current GUIDs from repo
         current_guids = set()
         
-        from pathlib import Path as PathlibPath
-        for course_name, course_config in config.courses.items():
-            for pattern in course_config.paths:
-                # Find all matching tex files
-                for tex_file in repo.rglob("*.tex"):
-                    rel_path = str(tex_file.relative_to(repo))
-                    
-                    # Check if matches pattern
-                    from .git_utils import _filter_by_patterns
-                    if _filter_by_patterns([rel_path], [pattern]):
-                        # Extract environments
-                        with open(tex_file, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        envs = extract_environments(content, config.envs_to_extract)
-                        
-                        for env in envs:
-                            block = ExtractedBlock.from_environment(env, rel_path)
-                            current_guids.add(block.guid)
+        # Walk the repo once and match every course pattern in one pass, so each
+        # file is read and extracted at most once
+        from .git_utils import _filter_by_patterns
+        patterns = [
+            pattern
+            for course_config in config.courses.values()
+            for pattern in course_config.paths
+        ]
+        tex_files = {str(tex_file.relative_to(repo)): tex_file for tex_file in repo.rglob("*.tex")}
+        matched_paths = _filter_by_patterns(list(tex_files), patterns) if patterns else []
+
+        for rel_path in matched_paths:
+            # Extract environments
+            with open(tex_files[rel_path], 'r', encoding='utf-8') as f:
+                content = f.read()
+
+            envs = extract_environments(content, config.envs_to_extract)
+
+            for env in envs:
+                block = ExtractedBlock.from_environment(env, rel_path)
+                current_guids.add(block.guid)
         
         console.print(f"[cyan]Found {len(current_guids)} notes in current LaTeX files[/cyan]")
         
@@ -2,41 +2,35 @@
 
 import os
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
 
-import yaml
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_validator
 
 # Load environment variables from .env file if present
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass  # dotenv not installed, rely on system env vars
+# (set COMMIT_LOAD_DOTENV=0 to skip, e.g. when keys come from the environment)
+if os.environ.get("COMMIT_LOAD_DOTENV", "1") == "1":
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass  # dotenv not installed, rely on system env vars
 
 
 class CourseConfig(BaseModel):
     """Configuration for a single course."""
 
+    model_config = ConfigDict(frozen=True)
+
     paths: List[str] = Field(description="List of glob patterns for .tex files")
     deck: str = Field(description="Target Anki deck name")
 
 
-class LLMConfig(BaseModel):
-    """Configuration for LLM-generated cards."""
-
-    enabled: bool = Field(default=False, description="Enable LLM-generated cards")
-    max_per_commit: int = Field(
-        default=8, description="Maximum LLM-generated cards per commit"
-    )
-    types: List[str] = Field(
-        default=["cloze", "why"], description="Types of generated cards"
-    )
-
-
 class ChunkingConfig(BaseModel):
     """Configuration for chunking large content."""
 
+    model_config = ConfigDict(frozen=True)
+
     mode: str = Field(
         default="auto",
         description="Chunking mode: 'auto' or 'off'"
@@ -62,6 +56,8 @@ class ChunkingConfig(BaseModel):
 class LLMConfig(BaseModel):
     """Configuration for LLM-based card generation."""
 
+    model_config = ConfigDict(frozen=True)
+
     provider: str = Field(
         default="none",
         description="LLM provider: 'openai', 'anthropic', 'gemini', or 'none'"
@@ -118,6 +114,15 @@ class LLMConfig(BaseModel):
         default=True,
         description="Log raw LLM JSON responses in state"
     )
+    cache_responses: bool = Field(
+        default=True,
+        description="Reuse cached LLM responses for identical requests (~/.cache/commit/llm)"
+    )
+    max_concurrency: int = Field(
+        default=5,
+        ge=1,
+        description="Maximum LLM requests in flight at once"
+    )
 
     @field_validator("provider")
     @classmethod
@@ -148,6 +153,8 @@ class LLMConfig(BaseModel):
 class ChatConfig(BaseModel):
     """Configuration for chat mentor mode."""
 
+    model_config = ConfigDict(frozen=True)
+
     enabled: bool = Field(
         default=True,
         description="Enable chat mode"
@@ -178,6 +185,8 @@ class ChatConfig(BaseModel):
 class AppConfig(BaseModel):
     """Main application configuration."""
 
+    model_config = ConfigDict(frozen=True)
+
     courses: Dict[str, CourseConfig] = Field(
         description="Dictionary of course configurations"
     )
@@ -196,6 +205,10 @@ class AppConfig(BaseModel):
     daily_new_limit: int = Field(
         default=30, description="Daily limit for new cards"
     )
+    max_tex_bytes: int = Field(
+        default=5_000_000,
+        description="Skip .tex files larger than this (likely generated)",
+    )
     priorities: Dict[str, int] = Field(
         default_factory=dict, description="Priority weights per course"
     )
@@ -212,6 +225,8 @@ class AppConfig(BaseModel):
         description="Chat mode configuration"
     )
 
+    _tag_templates: List[List[Tuple[str, Optional[str]]]] = PrivateAttr(default_factory=list)
+
     @field_validator("envs_to_extract")
     @classmethod
     def validate_envs(cls, v: List[str]) -> List[str]:
@@ -220,6 +235,50 @@ class AppConfig(BaseModel):
             raise ValueError("At least one environment must be specified")
         return v
 
+    @field_validator("tags")
+    @classmethod
+    def validate_tags(cls, v: List[str]) -> List[str]:
+        """Ensure tag templates parse (only plain {name} fields are supported)."""
+        for template in v:
+            try:
+                parts = list(Formatter().parse(template))
+            except ValueError as e:
+                raise ValueError(f"Invalid tag template {template!r}: {e}") from e
+            for _, field_name, format_spec, conversion in parts:
+                if field_name is not None and (not field_name or format_spec or conversion):
+                    raise ValueError(
+                        f"Invalid tag template {template!r}: use plain {{name}} placeholders"
+                    )
+        return v
+
+    def model_post_init(self, __context: Any) -> None:
+        """Pre-parse tag templates once so rendering is a plain join."""
+        self._tag_templates = [
+            [(literal, field_name) for literal, field_name, _, _ in Formatter().parse(t)]
+            for t in self.tags
+        ]
+
+    def render_tags(self, **values: Any) -> List[str]:
+        """
+        Render the configured tag templates.
+
+        Args:
+            **values: Placeholder values (e.g., sha=..., file=...)
+
+        Returns:
+            List of rendered tags
+
+        Raises:
+            KeyError: If a template references a value that was not given
+        """
+        return [
+            "".join(
+                literal + (str(values[field_name]) if field_name is not None else "")
+                for literal, field_name in parts
+            )
+            for parts in self._tag_templates
+        ]
+
 
 def load_config(config_path: Path) -> AppConfig:
     """
@@ -239,8 +298,15 @@ def load_config(config_path: Path) -> AppConfig:
     if not config_path.exists():
         raise FileNotFoundError(f"Config file not found: {config_path}")
 
-    with open(config_path, "r", encoding="utf-8") as f:
-        config_data = yaml.safe_load(f)
+    import yaml
+
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader  # libyaml not available, use pure-Python loader
+
+    with open(config_path, "rb") as f:
+        config_data = yaml.load(f, Loader=SafeLoader)
 
     if config_data is None:
         raise ValueError(f"Empty config file: {config_path}")
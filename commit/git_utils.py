@@ -1,22 +1,40 @@
 """Git utilities for detecting changed files."""
 
+import functools
+import re
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple, Union
 
 from git import Repo
 from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
 
 
+# Object ID of the empty tree; diffing a root commit against it lists every file
+EMPTY_TREE_SHA = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+# Pathspecs passed to git so only .tex paths come back
+TEX_PATHSPECS = ("*.tex",)
+
+
 class GitError(Exception):
     """Base exception for Git-related errors."""
 
     pass
 
 
+@functools.lru_cache(maxsize=8)
+def _cached_repo(resolved_path: str) -> Repo:
+    """Open a repository once per resolved path and reuse it."""
+    return Repo(resolved_path, search_parent_directories=True)
+
+
 def get_repo(repo_path: Path) -> Repo:
     """
     Get Git repository object.
 
+    Repository objects are cached per resolved path for the life of the
+    process, so repeated calls do not re-discover and re-parse the repo.
+
     Args:
         repo_path: Path to repository root
 
@@ -27,7 +45,7 @@ def get_repo(repo_path: Path) -> Repo:
         GitError: If path is not a valid Git repository
     """
     try:
-        return Repo(repo_path, search_parent_directories=True)
+        return _cached_repo(str(Path(repo_path).resolve()))
     except InvalidGitRepositoryError as e:
         raise GitError(f"Not a valid Git repository: {repo_path}") from e
     except NoSuchPathError as e:
@@ -102,18 +120,24 @@ def get_changed_files(
     try:
         repo = get_repo(repo_path)
 
+        # Let git apply the path patterns when they translate to pathspecs;
+        # otherwise fetch all .tex paths and filter with the regex matcher
+        pathspecs = _patterns_to_pathspecs(path_patterns) if path_patterns else None
+        if pathspecs is None:
+            pathspecs = TEX_PATHSPECS
+
         if since_sha is None:
             # Get files from HEAD commit only
-            changed_files = _get_files_from_head(repo)
+            changed_files = _get_files_from_head(repo, pathspecs)
         else:
             # Get diff between since_sha and HEAD
-            changed_files = _get_diff_files(repo, since_sha)
+            changed_files = _get_diff_files(repo, since_sha, pathspecs)
 
-        # Filter for .tex files
+        # Filter for .tex files (patterns need not end in .tex)
         tex_files = [f for f in changed_files if f.endswith(".tex")]
 
-        # Apply path patterns if provided
-        if path_patterns:
+        # Apply path patterns git could not handle
+        if path_patterns and pathspecs is TEX_PATHSPECS:
             tex_files = _filter_by_patterns(tex_files, path_patterns)
 
         return tex_files
@@ -122,33 +146,25 @@ def get_changed_files(
         raise GitError(f"Git command failed: {e}") from e
 
 
-def _get_files_from_head(repo: Repo) -> List[str]:
+def _get_files_from_head(repo: Repo, pathspecs: Sequence[str] = ()) -> List[str]:
     """Get files modified in HEAD commit."""
     try:
         head_commit = repo.head.commit
 
-        # If this is the first commit, get all files
+        # If this is the first commit, get all files (diff against the empty tree)
         if not head_commit.parents:
-            return [item.path for item in head_commit.tree.traverse() if item.type == "blob"]
+            return _diff_names(repo, EMPTY_TREE_SHA, head_commit.hexsha, pathspecs)
 
         # Get diff with parent
         parent = head_commit.parents[0]
-        diffs = parent.diff(head_commit)
-
-        changed_files = []
-        for diff in diffs:
-            # Include new files (a_path) and modified files (b_path)
-            if diff.new_file or diff.renamed or diff.a_blob:
-                path = diff.b_path if diff.b_path else diff.a_path
-                if path:
-                    changed_files.append(path)
-
-        return changed_files
+        return _diff_names(repo, parent.hexsha, head_commit.hexsha, pathspecs)
     except (AttributeError, IndexError) as e:
         raise GitError(f"Failed to get HEAD commit files: {e}") from e
 
 
-def _get_diff_files(repo: Repo, since_sha: str) -> List[str]:
+def _get_diff_files(
+    repo: Repo, since_sha: str, pathspecs: Sequence[str] = ()
+) -> List[str]:
     """Get files that changed between since_sha and HEAD."""
     try:
         # Validate that since_sha exists
@@ -163,22 +179,97 @@ def _get_diff_files(repo: Repo, since_sha: str) -> List[str]:
         if since_commit.hexsha == head_commit.hexsha:
             return []
 
-        # Get diff
-        diffs = since_commit.diff(head_commit)
-
-        changed_files = []
-        for diff in diffs:
-            # Include new, modified, and renamed files
-            if diff.new_file or diff.renamed or diff.a_blob:
-                path = diff.b_path if diff.b_path else diff.a_path
-                if path:
-                    changed_files.append(path)
-
-        return changed_files
+        return _diff_names(repo, since_commit.hexsha, head_commit.hexsha, pathspecs)
     except GitCommandError as e:
         raise GitError(f"Failed to get diff: {e}") from e
 
 
+def _diff_names(
+    repo: Repo, from_sha: str, to_sha: str, pathspecs: Sequence[str] = ()
+) -> List[str]:
+    """List added, modified, and renamed paths between two commits."""
+    return _split_z(
+        repo.git.diff(
+            "--name-only", "-z", "--diff-filter=AMR", from_sha, to_sha, "--", *pathspecs
+        )
+    )
+
+
+def _patterns_to_pathspecs(patterns: List[str]) -> Optional[List[str]]:
+    """
+    Convert glob patterns to git ``:(glob)`` pathspecs.
+
+    Returns None if any pattern uses syntax whose meaning differs between
+    git's glob magic and _filter_by_patterns (bracket expressions, escapes,
+    ``**`` that is not a whole path segment, or no wildcard at all, which
+    git also treats as a directory prefix).
+    """
+    pathspecs = []
+    for pattern in patterns:
+        pattern = pattern.lstrip("./")
+        if not pattern or any(c in pattern for c in "[]\\"):
+            return None
+        if not any(c in pattern for c in "*?"):
+            return None
+        if any("**" in seg and seg != "**" for seg in pattern.split("/")):
+            return None
+        pathspecs.append(f":(glob){pattern}")
+    return pathspecs
+
+
+def _split_z(output: str) -> List[str]:
+    """Split NUL-separated git output into paths, dropping empties."""
+    return [name for name in output.split("\x00") if name]
+
+
+# Glob tokens, longest first. "/**" only counts when not followed by "/",
+# so "a/**/b" tokenizes as "a", "/", "**/", "b".
+_GLOB_TOKEN_RE = re.compile(r"/\*\*(?!/)|\*\*/|\*\*|\*|\?|[^*?/]+|/")
+
+# Regex sources are bytes: paths are matched as UTF-8 so the regex engine
+# skips str handling. "?" must therefore consume one whole UTF-8 character.
+_GLOB_TOKENS = {
+    "**/": rb"(.*/)?",   # **/ matches zero or more dirs
+    "/**": rb"(/.*)?",   # /** matches zero or more dirs
+    "**": rb".*",        # ** matches anything
+    "*": rb"[^/]*",      # * matches anything except /
+    "?": rb"(?:[\x00-\x2e\x30-\x7f]|[\xc0-\xff][\x80-\xbf]*)",  # one char except /
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _glob_to_regex(pattern: str) -> bytes:
+    """Convert glob pattern with ** support to an (unanchored) bytes regex source."""
+    return b"".join(
+        _GLOB_TOKENS.get(token) or re.escape(token.encode("utf-8"))
+        for token in _GLOB_TOKEN_RE.findall(pattern)
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_patterns(patterns: Tuple[str, ...]) -> re.Pattern:
+    """Compile glob patterns into a single alternation regex (use fullmatch)."""
+    sources = [_glob_to_regex(p.lstrip('./')) for p in patterns]
+    return re.compile(b"|".join(b"(?:" + src + b")" for src in sources))
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_pattern_groups(groups: Tuple[Tuple[str, ...], ...]) -> re.Pattern:
+    """
+    Compile several groups of glob patterns into one regex (use fullmatch).
+
+    Group ``i`` becomes the named alternative ``g<i>``, so after a match
+    ``match.lastgroup`` names the first group, in order, with a matching
+    pattern. A group without patterns matches every path, as in
+    _filter_by_patterns.
+    """
+    alternatives = []
+    for index, patterns in enumerate(groups):
+        source = _compile_patterns(patterns).pattern if patterns else rb"(?s:.*)"
+        alternatives.append(b"(?P<g%d>" % index + source + b")")
+    return re.compile(b"|".join(alternatives))
+
+
 def _filter_by_patterns(files: List[str], patterns: List[str]) -> List[str]:
     """
     Filter files by glob patterns with ** support.
@@ -190,58 +281,24 @@ def _filter_by_patterns(files: List[str], patterns: List[str]) -> List[str]:
     Returns:
         Filtered list of files matching at least one pattern
     """
-    import re
-    
     if not patterns:
         return files
 
-    # Convert glob patterns to regex patterns
-    def glob_to_regex(pattern: str) -> re.Pattern:
-        """Convert glob pattern with ** support to regex."""
-        # Escape special regex characters except * and ?
-        pattern = pattern.replace('.', r'\.')
-        pattern = pattern.replace('+', r'\+')
-        pattern = pattern.replace('(', r'\(')
-        pattern = pattern.replace(')', r'\)')
-        pattern = pattern.replace('[', r'\[')
-        pattern = pattern.replace(']', r'\]')
-        pattern = pattern.replace('^', r'\^')
-        pattern = pattern.replace('$', r'\$')
-        
-        # Replace ** with regex that matches zero or more path segments
-        # IMPORTANT: Must replace longer patterns first before **
-        pattern = pattern.replace('**/', '__DOUBLESTAR_SLASH__')
-        pattern = pattern.replace('/**', '__SLASH_DOUBLESTAR__')
-        pattern = pattern.replace('**', '__DOUBLESTAR__')
-        
-        # Replace remaining * and ?
-        pattern = pattern.replace('*', '[^/]*')  # * matches anything except /
-        pattern = pattern.replace('?', '[^/]')   # ? matches single char except /
-        
-        # Now replace the placeholders
-        pattern = pattern.replace('__DOUBLESTAR_SLASH__', '(.*/)?' )  # **/ matches zero or more dirs
-        pattern = pattern.replace('__SLASH_DOUBLESTAR__', '(/.*)?')    # /** matches zero or more dirs  
-        pattern = pattern.replace('__DOUBLESTAR__', '.*')               # ** matches anything
-        
-        return re.compile(f'^{pattern}$')
-
-    compiled_patterns = [glob_to_regex(p.lstrip('./')) for p in patterns]
-
-    filtered = []
-    for file_path in files:
-        normalized_file = file_path.lstrip("./")
-        
-        for regex_pattern in compiled_patterns:
-            if regex_pattern.match(normalized_file):
-                filtered.append(file_path)
-                break  # File matches at least one pattern
-
-    return filtered
-
-
-def get_file_at_commit(repo_path: Path, file_path: str, commit_sha: Optional[str] = None) -> str:
+    fullmatch = _compile_patterns(tuple(patterns)).fullmatch
+    return [f for f in files if fullmatch(f.lstrip("./").encode("utf-8"))]
+
+
+def _read_blob(repo: Repo, file_path: str, commit_sha: Optional[str]) -> bytes:
+    """Read a file's raw blob contents at a commit (HEAD if None)."""
+    commit = repo.commit(commit_sha) if commit_sha else repo.head.commit
+    return (commit.tree / file_path).data_stream.read()
+
+
+def get_file_bytes_at_commit(
+    repo_path: Path, file_path: str, commit_sha: Optional[str] = None
+) -> bytes:
     """
-    Get file contents at a specific commit.
+    Get raw file contents at a specific commit, without decoding.
 
     Args:
         repo_path: Path to repository root
@@ -249,19 +306,40 @@ def get_file_at_commit(repo_path: Path, file_path: str, commit_sha: Optional[str
         commit_sha: Commit SHA. If None, uses HEAD
 
     Returns:
-        File contents as string
+        File contents as bytes
 
     Raises:
         GitError: If file doesn't exist at that commit
     """
     try:
-        repo = get_repo(repo_path)
-        commit = repo.commit(commit_sha) if commit_sha else repo.head.commit
+        return _read_blob(get_repo(repo_path), file_path, commit_sha)
+    except (KeyError, GitCommandError) as e:
+        raise GitError(f"Failed to read file {file_path} at commit {commit_sha}: {e}") from e
 
-        # Get blob for file
-        blob = commit.tree / file_path
-        return blob.data_stream.read().decode("utf-8")
 
-    except (KeyError, GitCommandError, UnicodeDecodeError) as e:
-        raise GitError(f"Failed to read file {file_path} at commit {commit_sha}: {e}") from e
+def get_file_at_commit(
+    repo_path: Path, file_path: str, commit_sha: Optional[str] = None, binary: bool = False
+) -> Union[str, bytes]:
+    """
+    Get file contents at a specific commit.
 
+    Args:
+        repo_path: Path to repository root
+        file_path: Relative path to file
+        commit_sha: Commit SHA. If None, uses HEAD
+        binary: If True, return raw bytes instead of decoding as UTF-8
+
+    Returns:
+        File contents as string (or bytes if binary=True)
+
+    Raises:
+        GitError: If file doesn't exist at that commit
+    """
+    data = get_file_bytes_at_commit(repo_path, file_path, commit_sha)
+    if binary:
+        return data
+
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise GitError(f"Failed to read file {file_path} at commit {commit_sha}: {e}") from e
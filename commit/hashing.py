@@ -1,9 +1,13 @@
 """Hashing utilities for generating stable GUIDs and content hashes."""
 
 import hashlib
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
 
 
+# Retried or re-batched LLM cards often repeat exact inputs, so both hashes
+# are memoized; the arguments are plain strings.
+@lru_cache(maxsize=8192)
 def compute_guid(env_name: str, normalized_body: str, file_path: str) -> str:
     """
     Compute a stable GUID for a LaTeX environment block.
@@ -37,6 +41,7 @@ def compute_guid(env_name: str, normalized_body: str, file_path: str) -> str:
     return hash_obj.hexdigest()
 
 
+@lru_cache(maxsize=8192)
 def compute_content_hash(normalized_body: str) -> str:
     """
     Compute a hash of just the content body.
@@ -63,6 +68,32 @@ def compute_content_hash(normalized_body: str) -> str:
     return hash_obj.hexdigest()
 
 
+def compute_fields_hash(fields: Dict[str, str]) -> str:
+    """
+    Compute a hash of a note's rendered fields.
+
+    Used to skip AnkiConnect updates when the fields sent to Anki would be
+    identical to what was sent last time.
+
+    Args:
+        fields: Field name to content mapping
+
+    Returns:
+        32-character hexadecimal BLAKE2b hash
+
+    Examples:
+        >>> compute_fields_hash({"Front": "Q", "Back": "A"}) == compute_fields_hash({"Back": "A", "Front": "Q"})
+        True
+    """
+    hash_obj = hashlib.blake2b(digest_size=16)
+    for name, value in sorted(fields.items()):
+        hash_obj.update(name.encode("utf-8"))
+        hash_obj.update(b"\0")
+        hash_obj.update(value.encode("utf-8"))
+        hash_obj.update(b"\0")
+    return hash_obj.hexdigest()
+
+
 def short_hash(full_hash: str, length: int = 12) -> str:
     """
     Get a shortened version of a hash for display/storage in LaTeX.
@@ -116,6 +147,34 @@ def match_short_guid_to_full(short_guid: str, full_guids: list[str]) -> Optional
         return None
 
 
+# Shortest GUID accepted in a LaTeX comment; also the prefix-index key length
+GUID_PREFIX_LENGTH = 8
+
+
+def build_guid_prefix_index(full_guids: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Index full GUIDs by their first GUID_PREFIX_LENGTH characters.
+
+    Looking up a short GUID's prefix yields the only candidates that
+    match_short_guid_to_full can match, so it need not scan every GUID.
+
+    Args:
+        full_guids: Full GUIDs to index
+
+    Returns:
+        Mapping of prefix to the full GUIDs starting with it
+
+    Examples:
+        >>> index = build_guid_prefix_index(["abc123def4567890", "abc123de00000000"])
+        >>> index["abc123de"]
+        ['abc123def4567890', 'abc123de00000000']
+    """
+    index: Dict[str, List[str]] = {}
+    for guid in full_guids:
+        index.setdefault(guid[:GUID_PREFIX_LENGTH], []).append(guid)
+    return index
+
+
 def compute_block_signature(
     env_name: str,
     file_path: str,
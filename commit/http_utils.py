@@ -0,0 +1,10 @@
+"""HTTP helpers shared by the AnkiConnect and LLM clients."""
+
+
+def http2_available() -> bool:
+    """Check whether httpx's optional HTTP/2 support (h2) is installed."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,47 @@
+"""JSON encoding helpers that use orjson when it is installed."""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """
+    Serialize an object to compact UTF-8 JSON bytes.
+
+    Args:
+        obj: JSON-serializable object
+        pretty: Indent by two spaces and sort keys, for files people read
+
+    Returns:
+        Encoded JSON
+    """
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS if pretty else None
+        return orjson.dumps(obj, option=option)
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Parse JSON from bytes or str.
+
+    Args:
+        data: Encoded JSON
+
+    Returns:
+        Decoded object
+
+    Raises:
+        ValueError: If the input is not valid JSON
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
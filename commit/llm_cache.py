@@ -0,0 +1,93 @@
+"""On-disk cache of raw LLM responses keyed by request content."""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+from . import json_utils
+
+
+def default_cache_dir() -> Path:
+    """
+    Get the default response cache directory.
+
+    Honors XDG_CACHE_HOME, falling back to ~/.cache.
+
+    Returns:
+        Path to the cache directory (may not exist yet)
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "commit" / "llm"
+
+
+def compute_request_key(model: str, system_prompt: str, user_content: str) -> str:
+    """
+    Compute the cache key for an LLM request.
+
+    Args:
+        model: Model name
+        system_prompt: System instructions
+        user_content: Serialized user message
+
+    Returns:
+        64-character hexadecimal SHA-256 hash
+    """
+    hash_obj = hashlib.sha256()
+    for part in (model, system_prompt, user_content):
+        hash_obj.update(part.encode("utf-8"))
+        hash_obj.update(b"\0")
+    return hash_obj.hexdigest()
+
+
+class ResponseCache:
+    """
+    Exact-match cache of raw model responses, one JSON file per request.
+
+    Raw text is cached rather than parsed cards so a hit goes through the
+    same parsing path as a fresh response.
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None):
+        """
+        Initialize response cache.
+
+        Args:
+            cache_dir: Directory for cache files (default: default_cache_dir())
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Request key from compute_request_key
+
+        Returns:
+            Cached response text, or None on a miss or unreadable entry
+        """
+        try:
+            return json_utils.loads(self._path(key).read_bytes())["response"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, key: str, response_text: str) -> None:
+        """
+        Store a response. Failures to write are ignored.
+
+        Args:
+            key: Request key from compute_request_key
+            response_text: Raw model output
+        """
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(json_utils.dumps({"response": response_text}))
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
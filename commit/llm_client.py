@@ -1,10 +1,27 @@
 """Provider-agnostic LLM client for card generation and chat."""
 
-import json
+import asyncio
+import functools
+import importlib
+import logging
+import random
 import re
+import threading
 import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from . import json_utils
+from .http_utils import http2_available
+from .llm_cache import ResponseCache, compute_request_key
+from .prompts import MULTI_BLOCK_INSTRUCTIONS
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
 
 
 class LLMError(Exception):
@@ -12,6 +29,346 @@ class LLMError(Exception):
     pass
 
 
+# Connection pool shared by every SDK-backed client (created on first use)
+_HTTP_CLIENT: Optional["httpx.Client"] = None
+_HTTP_CLIENT_LOCK = threading.Lock()
+
+
+def _get_http_client() -> "httpx.Client":
+    """
+    Return the process-wide HTTP client used by the OpenAI/Anthropic SDKs.
+
+    Sharing one pool means repeated create_llm_client calls reuse warm
+    TCP/TLS connections, and concurrent requests can multiplex over HTTP/2
+    when h2 is installed.
+
+    Returns:
+        Shared httpx.Client
+    """
+    global _HTTP_CLIENT
+    with _HTTP_CLIENT_LOCK:
+        if _HTTP_CLIENT is None:
+            import httpx
+
+            _HTTP_CLIENT = httpx.Client(
+                http2=http2_available(),
+                timeout=60.0,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            )
+        return _HTTP_CLIENT
+
+
+def _prewarm(base_url: str) -> None:
+    """Open a pooled connection to base_url in the background."""
+    def warm() -> None:
+        try:
+            _get_http_client().head(base_url)
+        except Exception:
+            pass  # Best effort; the first real request connects anyway
+
+    threading.Thread(target=warm, daemon=True).start()
+
+
+def _serialize_payload(payload: Dict[str, Any]) -> str:
+    """
+    Serialize a user payload as compact JSON.
+
+    Models don't need pretty-printing, and indentation whitespace is billed
+    as input tokens on every request.
+    """
+    return json_utils.dumps(payload).decode("utf-8")
+
+
+def _strip_code_fence(text: str) -> Optional[str]:
+    """
+    Return the contents of the first markdown code fence, if any.
+
+    Uses literal searches only, so it is linear in the text length. A
+    leading ``json`` language tag is dropped.
+
+    Args:
+        text: Model output
+
+    Returns:
+        Text between the fences, or None if there is no closed fence
+    """
+    start = text.find("```")
+    if start < 0:
+        return None
+    start += 3
+    end = text.find("```", start)
+    if end < 0:
+        return None
+
+    body = text[start:end]
+    if body.startswith("json"):
+        body = body[4:]
+    return body.strip()
+
+
+# Whole JSON strings (with escapes) or bare braces; strings are consumed in one
+# match so braces inside them never reach the depth count.
+_JSON_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]', re.DOTALL)
+
+
+def _find_json_object(text: str) -> Optional[str]:
+    """
+    Find the first balanced JSON object in text with a single scan.
+
+    Braces inside JSON strings (including escaped quotes) are ignored, so
+    LaTeX such as ``"\\frac{a}{b}"`` does not disturb the depth count.
+
+    Args:
+        text: Text that may contain a JSON object
+
+    Returns:
+        Substring spanning the first balanced object, or None if unbalanced
+    """
+    start = text.find('{')
+    if start < 0:
+        return None
+
+    depth = 0
+    for match in _JSON_TOKEN_RE.finditer(text, start):
+        char = match.group()
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:match.end()]
+
+    return None
+
+
+T = TypeVar("T")
+
+class GeneratedCard(BaseModel):
+    """Schema for a card returned by the model."""
+
+    model_config = ConfigDict(extra="allow")
+
+    model: str = "Basic"
+    front: str
+    back: str = ""
+    tags: List[str] = Field(default_factory=list)
+
+    @field_validator("back", mode="before")
+    @classmethod
+    def null_back_is_empty(cls, v: Any) -> Any:
+        """Treat an explicit null back (common for cloze cards) as empty."""
+        return "" if v is None else v
+
+
+def _validate_cards(cards: Any) -> List[Dict[str, Any]]:
+    """
+    Keep only cards that match the GeneratedCard schema.
+
+    Valid cards are returned with the keys the model sent (defaults are not
+    filled in), so downstream code sees the same dicts as before.
+
+    Args:
+        cards: Value of a response's "cards" field
+
+    Returns:
+        Validated card dictionaries
+    """
+    if not isinstance(cards, list):
+        logger.warning("Ignoring non-list 'cards' value in LLM response")
+        return []
+
+    valid = []
+    for card in cards:
+        try:
+            valid.append(GeneratedCard.model_validate(card).model_dump(exclude_unset=True))
+        except ValidationError as e:
+            logger.warning("Skipping malformed card from LLM: %s", e.errors()[0]["msg"])
+    return valid
+
+
+@functools.lru_cache(maxsize=None)
+def _import_sdk(module: str, package: str) -> Any:
+    """
+    Import a provider SDK once and reuse the module afterwards.
+
+    Args:
+        module: Module to import (e.g., "openai")
+        package: pip package name for the error message
+
+    Returns:
+        Imported module
+
+    Raises:
+        LLMError: If the package is not installed
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise LLMError(
+            f"{package} package not installed. Install with: pip install {package}"
+        ) from None
+
+
+# genai.configure sets process-global state; only redo it when the key changes
+_gemini_api_key: Optional[str] = None
+
+
+def _configure_gemini(genai: Any, api_key: str) -> None:
+    """Configure the Gemini SDK unless it is already set up with this key."""
+    global _gemini_api_key
+    if _gemini_api_key != api_key:
+        genai.configure(api_key=api_key)
+        _gemini_api_key = api_key
+
+
+# Retry policy for transient provider errors (rate limits, 5xx, timeouts)
+MAX_ATTEMPTS = 5
+RETRY_INITIAL_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+_TRANSIENT_ERROR_NAMES = (
+    "RateLimit", "Timeout", "Connection", "InternalServer",
+    "ServiceUnavailable", "ResourceExhausted", "DeadlineExceeded",
+)
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Check whether a provider error is worth retrying.
+
+    Uses the HTTP status when the SDK exposes one (429, 408 and 5xx retry;
+    auth and bad-request errors do not), otherwise the exception class name.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    name = type(error).__name__
+    return any(marker in name for marker in _TRANSIENT_ERROR_NAMES)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before the next attempt.
+
+    Honors a numeric Retry-After header when present, otherwise uses
+    exponential backoff with up to one second of jitter.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers:
+        try:
+            return min(float(headers.get("retry-after")), RETRY_MAX_DELAY)
+        except (TypeError, ValueError):
+            pass
+    return min(RETRY_INITIAL_DELAY * (2 ** attempt) + random.uniform(0, 1), RETRY_MAX_DELAY)
+
+
+def _with_retries(call: Callable[[], T], provider: str) -> T:
+    """
+    Run a provider call, retrying transient failures.
+
+    Args:
+        call: Zero-argument function performing one request
+        provider: Provider name for error messages
+
+    Returns:
+        The call's result
+
+    Raises:
+        LLMError: On a non-transient error or once attempts are exhausted
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return call()
+        except Exception as e:
+            if attempt < MAX_ATTEMPTS - 1 and _is_transient(e):
+                time.sleep(_retry_delay(e, attempt))
+                continue
+            raise LLMError(f"{provider} API error: {e}") from e
+
+
+async def _with_retries_async(call: Callable[[], Awaitable[T]], provider: str) -> T:
+    """Async counterpart of _with_retries."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt < MAX_ATTEMPTS - 1 and _is_transient(e):
+                await asyncio.sleep(_retry_delay(e, attempt))
+                continue
+            raise LLMError(f"{provider} API error: {e}") from e
+
+
+def _parse_json_stream(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield card objects from a streamed ``{"cards": [...]}`` response.
+
+    Each chunk is scanned once, tracking nesting and string state across
+    chunk boundaries; a card is decoded as soon as its closing brace arrives.
+
+    Args:
+        chunks: Response text fragments in arrival order
+
+    Yields:
+        Card dictionaries
+    """
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    card_parts: List[str] = []
+    in_card = False
+
+    for chunk in chunks:
+        card_start = 0
+        for i, char in enumerate(chunk):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in '{[':
+                if char == '{' and stack == ['{', '[']:
+                    in_card = True
+                    card_start = i
+                stack.append(char)
+            elif char in '}]' and stack:
+                stack.pop()
+                if char == '}' and in_card and stack == ['{', '[']:
+                    card_parts.append(chunk[card_start:i + 1])
+                    in_card = False
+                    try:
+                        card = json_utils.loads("".join(card_parts))
+                    except ValueError:
+                        card = None
+                    card_parts = []
+                    if card is None:
+                        continue
+                    yield from _validate_cards([card])
+        if in_card:
+            card_parts.append(chunk[card_start:])
+
+
+class _RateLimiter:
+    """Space request starts evenly so no more than N begin per minute."""
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+
+    async def acquire(self) -> None:
+        """Wait until the next request slot is available."""
+        now = asyncio.get_running_loop().time()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
 class LLMClient(ABC):
     """Abstract base class for LLM clients."""
 
@@ -20,6 +377,7 @@ class LLMClient(ABC):
         model: str,
         temperature: float = 0.2,
         max_tokens: int = 4096,
+        cache: Optional[ResponseCache] = None,
     ):
         """
         Initialize LLM client.
@@ -28,16 +386,162 @@ class LLMClient(ABC):
             model: Model name
             temperature: Sampling temperature
             max_tokens: Maximum output tokens
+            cache: Optional response cache for card generation requests
         """
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.cache = cache
+        self._async_client: Any = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[str, "asyncio.Task[str]"] = {}
+
+    # Set by providers whose card requests use a native JSON output mode; a
+    # response that fails to parse is then not worth recovery attempts.
+    json_mode = False
 
     @abstractmethod
     def _call_api(self, system_prompt: str, user_content: str) -> str:
         """Call the provider's API. Subclasses must implement."""
         pass
 
+    def _call_api_json(self, system_prompt: str, user_content: str) -> str:
+        """Call the API for a request that expects a JSON object back."""
+        return self._call_api(system_prompt, user_content)
+
+    async def _call_api_json_async(self, system_prompt: str, user_content: str) -> str:
+        """Async counterpart of _call_api_json."""
+        return await self._call_api_async(system_prompt, user_content)
+
+    def _complete(self, system_prompt: str, user_content: str) -> str:
+        """
+        Call the API, serving identical requests from the response cache.
+
+        Args:
+            system_prompt: System instructions
+            user_content: Serialized user message
+
+        Returns:
+            Raw response text
+        """
+        if self.cache is None:
+            return self._call_api_json(system_prompt, user_content)
+
+        key = compute_request_key(self.model, system_prompt, user_content)
+        response_text = self.cache.get(key)
+        if response_text is None:
+            response_text = self._call_api_json(system_prompt, user_content)
+            if response_text:
+                self.cache.set(key, response_text)
+        return response_text
+
+    async def _complete_async(self, system_prompt: str, user_content: str) -> str:
+        """
+        Async counterpart of _complete.
+
+        Identical requests already in flight share one pending call instead
+        of each paying for their own.
+        """
+        key = compute_request_key(self.model, system_prompt, user_content)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._complete_uncoalesced_async(key, system_prompt, user_content)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled waiter does not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _complete_uncoalesced_async(
+        self, key: str, system_prompt: str, user_content: str
+    ) -> str:
+        """Serve a request from the cache or the API, ignoring in-flight peers."""
+        if self.cache is None:
+            return await self._call_api_json_async(system_prompt, user_content)
+
+        response_text = self.cache.get(key)
+        if response_text is None:
+            response_text = await self._call_api_json_async(system_prompt, user_content)
+            if response_text:
+                self.cache.set(key, response_text)
+        return response_text
+
+    async def _call_api_async(self, system_prompt: str, user_content: str) -> str:
+        """
+        Call the provider's API without blocking the event loop.
+
+        Providers with a native async SDK override this; the default runs the
+        synchronous call in a worker thread.
+        """
+        return await asyncio.to_thread(self._call_api, system_prompt, user_content)
+
+    def _create_async_client(self) -> Any:
+        """Build the provider's async SDK client. Subclasses override as needed."""
+        raise NotImplementedError
+
+    def _get_async_client(self) -> Any:
+        """
+        Return the async SDK client for the running event loop.
+
+        Async HTTP connections are bound to the loop that opened them, so the
+        client is rebuilt when called from a different loop. Entry points
+        that run on their own loop close it with ``aclose`` before returning.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = self._create_async_client()
+            self._async_loop = loop
+        return self._async_client
+
+    async def aclose(self) -> None:
+        """Close the async SDK client and release its pooled connections."""
+        client, loop = self._async_client, self._async_loop
+        self._async_client = None
+        self._async_loop = None
+        # A client from another (by now closed) loop cannot be awaited
+        if client is not None and loop is asyncio.get_running_loop():
+            await client.close()
+
+    async def generate_cards_concurrent(
+        self,
+        system_prompt: str,
+        payloads: List[Dict[str, Any]],
+        max_concurrency: int = 10,
+        rate_limit_rpm: Optional[int] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Generate cards for many blocks with concurrent requests.
+
+        Args:
+            system_prompt: System instructions shared by every request
+            payloads: User payloads, one per block
+            max_concurrency: Maximum requests in flight at once
+            rate_limit_rpm: Optional cap on requests started per minute
+
+        Returns:
+            One card list per payload, in payload order ([] on failure)
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        limiter = _RateLimiter(rate_limit_rpm) if rate_limit_rpm else None
+
+        async def generate_one(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+            user_content = _serialize_payload(payload)
+            async with semaphore:
+                if limiter is not None:
+                    await limiter.acquire()
+                try:
+                    response_text = await self._complete_async(system_prompt, user_content)
+                except Exception as e:
+                    logger.error("LLM API error: %s", e)
+                    return []
+            return self._parse_json_response(response_text)
+
+        try:
+            return list(await asyncio.gather(*(generate_one(p) for p in payloads)))
+        finally:
+            await self.aclose()
+
     def generate_cards(
         self, system_prompt: str, user_payload: Dict[str, Any]
     ) -> List[Dict[str, Any]]:
@@ -51,16 +555,173 @@ class LLMClient(ABC):
         Returns:
             List of card dictionaries with 'model', 'front', 'back', 'tags'
         """
-        # Convert payload to JSON string for the model
-        user_content = json.dumps(user_payload, indent=2)
+        # Convert payload to compact JSON string for the model
+        user_content = _serialize_payload(user_payload)
 
         try:
-            response_text = self._call_api(system_prompt, user_content)
+            response_text = self._complete(system_prompt, user_content)
             return self._parse_json_response(response_text)
         except Exception as e:
-            print(f"LLM API error: {e}")
+            logger.error("LLM API error: %s", e)
+            return []
+
+    def _call_api_stream(self, system_prompt: str, user_content: str) -> Iterator[str]:
+        """
+        Stream the response text. Providers without streaming yield it whole.
+        """
+        yield self._call_api_json(system_prompt, user_content)
+
+    def generate_cards_stream(
+        self, system_prompt: str, user_payload: Dict[str, Any]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Generate flashcards from a LaTeX block, yielding each card as it arrives.
+
+        Args:
+            system_prompt: System instructions for the model
+            user_payload: Dictionary with block info
+
+        Yields:
+            Card dictionaries with 'model', 'front', 'back', 'tags'
+        """
+        user_content = _serialize_payload(user_payload)
+        key = None
+
+        if self.cache is not None:
+            key = compute_request_key(self.model, system_prompt, user_content)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield from self._parse_json_response(cached)
+                return
+
+        received: List[str] = []
+
+        def record(chunks: Iterator[str]) -> Iterator[str]:
+            for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+
+        try:
+            yield from _parse_json_stream(
+                record(self._call_api_stream(system_prompt, user_content))
+            )
+        except Exception as e:
+            logger.error("LLM API error: %s", e)
+            return
+
+        if key is not None and received:
+            self.cache.set(key, "".join(received))
+
+    def generate_cards_multi(
+        self, system_prompt: str, payloads: List[Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Generate flashcards for several LaTeX blocks in a single request.
+
+        The blocks are packed into one user message with a ``block_id`` each,
+        so the shared system prompt is sent (and billed) once.
+
+        Args:
+            system_prompt: System instructions for a single block
+            payloads: One user payload per block (as for generate_cards)
+
+        Returns:
+            One list of card dictionaries per payload, in input order
+        """
+        if not payloads:
             return []
 
+        user_content = _serialize_payload(
+            {"blocks": [{"block_id": i, **p} for i, p in enumerate(payloads)]}
+        )
+
+        try:
+            response_text = self._complete(
+                system_prompt + MULTI_BLOCK_INSTRUCTIONS, user_content
+            )
+            return self._parse_multi_response(response_text, len(payloads))
+        except Exception as e:
+            logger.error("LLM API error: %s", e)
+            return [[] for _ in payloads]
+
+    def submit_batch(
+        self, system_prompt: str, payloads: Dict[str, Dict[str, Any]]
+    ) -> str:
+        """
+        Submit card-generation requests to the provider's asynchronous batch API.
+
+        Args:
+            system_prompt: System instructions shared by every request
+            payloads: Mapping of custom ID (e.g., block GUID) to user payload
+
+        Returns:
+            Provider batch ID
+
+        Raises:
+            LLMError: If the provider has no batch API or submission fails
+        """
+        raise LLMError(f"{type(self).__name__} does not support batch submission")
+
+    def poll_batch(self, batch_id: str) -> Optional[Dict[str, str]]:
+        """
+        Check a submitted batch.
+
+        Args:
+            batch_id: ID returned by submit_batch
+
+        Returns:
+            Mapping of custom ID to raw response text once the batch has
+            finished (failed requests are omitted), or None while pending
+
+        Raises:
+            LLMError: If the provider has no batch API or the batch failed
+        """
+        raise LLMError(f"{type(self).__name__} does not support batch submission")
+
+    def generate_cards_async_batch(
+        self,
+        system_prompt: str,
+        payloads: Dict[str, Dict[str, Any]],
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Generate cards for many blocks through the provider's batch API.
+
+        Batch requests are cheaper and not subject to per-minute rate limits,
+        but may take up to 24 hours, so this suits offline bulk generation.
+
+        Args:
+            system_prompt: System instructions shared by every request
+            payloads: Mapping of custom ID (e.g., block GUID) to user payload
+            poll_interval: Seconds between status checks
+            timeout: Give up after this many seconds (None waits indefinitely)
+
+        Returns:
+            Mapping of custom ID to card list ([] for failed requests)
+
+        Raises:
+            LLMError: If submission fails, the batch fails, or it times out
+        """
+        if not payloads:
+            return {}
+
+        batch_id = self.submit_batch(system_prompt, payloads)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while True:
+            results = self.poll_batch(batch_id)
+            if results is not None:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LLMError(f"Batch {batch_id} did not finish within {timeout}s")
+            time.sleep(poll_interval)
+
+        return {
+            custom_id: self._parse_json_response(results[custom_id]) if custom_id in results else []
+            for custom_id in payloads
+        }
+
     def chat(self, system_prompt: str, user_message: str) -> str:
         """
         Send a chat message and get response.
@@ -89,17 +750,40 @@ class LLMClient(ABC):
             Dict with selected_blocks, skipped_blocks, summary
         """
         try:
-            # Convert batch payload to formatted JSON string for user message
-            user_message = json.dumps(batch_payload, indent=2)
+            # Convert batch payload to compact JSON string for user message
+            user_message = _serialize_payload(batch_payload)
             
             # Call API
-            response_text = self._call_api(system_prompt, user_message)
+            response_text = self._complete(system_prompt, user_message)
             
             # Parse batch response
             return self._parse_batch_response(response_text)
         except Exception as e:
             raise LLMError(f"Batch generation error: {e}") from e
 
+    async def generate_cards_batch_async(
+        self, system_prompt: str, batch_payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Async counterpart of generate_cards_batch.
+
+        Args:
+            system_prompt: System instruction for batch processing
+            batch_payload: Dict with blocks, priorities, daily_limit, constraints
+
+        Returns:
+            Dict with selected_blocks, skipped_blocks, summary
+
+        Raises:
+            LLMError: If the request fails
+        """
+        try:
+            user_message = _serialize_payload(batch_payload)
+            response_text = await self._complete_async(system_prompt, user_message)
+            return self._parse_batch_response(response_text)
+        except Exception as e:
+            raise LLMError(f"Batch generation error: {e}") from e
+
     def _parse_batch_response(self, response_text: str) -> Dict[str, Any]:
         """
         Parse batch response JSON from LLM.
@@ -117,70 +801,20 @@ class LLMClient(ABC):
         Returns:
             Dict with selected_blocks and skipped_blocks
         """
-        original_text = response_text
-        
-        # Strategy 1: Direct parse
-        try:
-            data = json.loads(response_text)
-            if isinstance(data, dict):
-                # Ensure required keys exist
-                if "selected_blocks" not in data:
-                    data["selected_blocks"] = []
-                if "skipped_blocks" not in data:
-                    data["skipped_blocks"] = []
-                return data
-        except json.JSONDecodeError as e:
-            print(f"  Direct parse failed: {e}")
-            pass
+        data = self._load_json_object(response_text)
+        if data is not None:
+            data.setdefault("selected_blocks", [])
+            data.setdefault("skipped_blocks", [])
+            for selected in data["selected_blocks"]:
+                if isinstance(selected, dict) and "cards" in selected:
+                    selected["cards"] = _validate_cards(selected["cards"])
+            return data
 
-        # Strategy 2: Extract from markdown code blocks
-        code_block_patterns = [
-            r'```json\s*(\{.*?\})\s*```',
-            r'```\s*(\{.*?\})\s*```',
-            r'```json\s*([\s\S]*?)\s*```',
-            r'```\s*([\s\S]*?)\s*```',
-        ]
-        
-        for pattern in code_block_patterns:
-            match = re.search(pattern, response_text, re.DOTALL)
-            if match:
-                extracted = match.group(1).strip()
-                try:
-                    data = json.loads(extracted)
-                    if isinstance(data, dict):
-                        if "selected_blocks" not in data:
-                            data["selected_blocks"] = []
-                        if "skipped_blocks" not in data:
-                            data["skipped_blocks"] = []
-                        return data
-                except json.JSONDecodeError:
-                    continue
-
-        # Strategy 3: Find JSON object by matching braces
-        start = response_text.find('{')
-        if start >= 0:
-            depth = 0
-            for i in range(start, len(response_text)):
-                if response_text[i] == '{':
-                    depth += 1
-                elif response_text[i] == '}':
-                    depth -= 1
-                    if depth == 0:
-                        json_str = response_text[start:i+1]
-                        try:
-                            data = json.loads(json_str)
-                            if isinstance(data, dict):
-                                if "selected_blocks" not in data:
-                                    data["selected_blocks"] = []
-                                if "skipped_blocks" not in data:
-                                    data["skipped_blocks"] = []
-                                return data
-                        except json.JSONDecodeError:
-                            break
-
-        # All strategies failed - save response for debugging and return empty structure
-        print(f"Warning: Could not parse batch response from LLM")
-        print(f"Response preview: {original_text[:500]}...")
+        # Parsing failed - save response for debugging and return empty structure
+        logger.warning(
+            "Could not parse batch response from LLM. Response preview: %s...",
+            response_text[:500],
+        )
         
         # Save full response to file for debugging
         import tempfile
@@ -188,21 +822,101 @@ class LLMClient(ABC):
         debug_file = os.path.join(tempfile.gettempdir(), 'llm_batch_response_debug.txt')
         try:
             with open(debug_file, 'w') as f:
-                f.write(original_text)
-            print(f"  Full response saved to: {debug_file}")
+                f.write(response_text)
+            logger.warning("Full response saved to: %s", debug_file)
         except Exception as e:
-            print(f"  Could not save debug file: {e}")
+            logger.warning("Could not save debug file: %s", e)
         
         return {"selected_blocks": [], "skipped_blocks": []}
 
+    def _parse_multi_response(
+        self, response_text: str, count: int
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Split a multi-block response into per-block card lists.
+
+        Args:
+            response_text: Raw text from model
+            count: Number of blocks that were sent
+
+        Returns:
+            ``count`` card lists; blocks missing from the response get []
+        """
+        per_block: List[List[Dict[str, Any]]] = [[] for _ in range(count)]
+        data = self._load_json_object(response_text)
+
+        if data is None:
+            logger.warning(
+                "Could not parse multi-block response from LLM. Response preview: %s...",
+                response_text[:300],
+            )
+            return per_block
+
+        # A single block may come back in the plain {"cards": [...]} format
+        if "results" not in data and "cards" in data and count == 1:
+            per_block[0] = _validate_cards(data["cards"])
+            return per_block
+
+        for entry in data.get("results", []):
+            if not isinstance(entry, dict):
+                continue
+            block_id = entry.get("block_id")
+            if isinstance(block_id, int) and 0 <= block_id < count:
+                per_block[block_id] = _validate_cards(entry.get("cards", []))
+
+        return per_block
+
+    def _load_json_object(self, response_text: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the first JSON object from model output.
+
+        Tries a direct parse, then the contents of the first markdown code
+        fence, then extracts the first balanced object from the whole text. The recovery
+        scan is skipped in JSON mode, where output is either valid or garbage.
+
+        Args:
+            response_text: Raw text from model
+
+        Returns:
+            Parsed object, or None if no JSON object could be found
+        """
+        try:
+            data = json_utils.loads(response_text)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+
+        if self.json_mode:
+            return None
+
+        fenced = _strip_code_fence(response_text)
+        if fenced is not None:
+            try:
+                data = json_utils.loads(fenced)
+                if isinstance(data, dict):
+                    return data
+            except ValueError:
+                pass
+
+        candidate = _find_json_object(response_text)
+        if candidate is not None:
+            try:
+                data = json_utils.loads(candidate)
+                if isinstance(data, dict):
+                    return data
+            except ValueError:
+                pass
+
+        return None
+
     def _parse_json_response(self, response_text: str) -> List[Dict[str, Any]]:
         """
-        Parse JSON from LLM response, with multiple fallback strategies.
+        Parse JSON from LLM response.
         
         Handles common issues:
         - Markdown code blocks wrapping JSON
         - Extra text before/after JSON
-        - LaTeX escaping inconsistencies
 
         Args:
             response_text: Raw text from model
@@ -210,69 +924,14 @@ class LLMClient(ABC):
         Returns:
             List of card dictionaries
         """
-        original_text = response_text
-        
-        # Strategy 1: Direct parse
-        try:
-            data = json.loads(response_text)
-            if isinstance(data, dict) and "cards" in data:
-                return data["cards"]
-            return []
-        except json.JSONDecodeError:
-            pass
+        data = self._load_json_object(response_text)
+        if data is not None:
+            return _validate_cards(data.get("cards", []))
 
-        # Strategy 2: Extract from markdown code blocks
-        # Try multiple markdown patterns
-        code_block_patterns = [
-            r'```json\s*(\{.*?\})\s*```',  # ```json { ... } ```
-            r'```\s*(\{.*?\})\s*```',      # ``` { ... } ```
-            r'```json\s*([\s\S]*?)\s*```', # ```json ... ``` (multiline)
-            r'```\s*([\s\S]*?)\s*```',     # ``` ... ``` (multiline)
-        ]
-        
-        for pattern in code_block_patterns:
-            match = re.search(pattern, response_text, re.DOTALL)
-            if match:
-                extracted = match.group(1).strip()
-                try:
-                    data = json.loads(extracted)
-                    if isinstance(data, dict) and "cards" in data:
-                        return data["cards"]
-                except json.JSONDecodeError:
-                    continue
-
-        # Strategy 3: Find JSON object by matching braces
-        start = response_text.find('{')
-        if start >= 0:
-            # Find matching closing brace
-            depth = 0
-            for i in range(start, len(response_text)):
-                if response_text[i] == '{':
-                    depth += 1
-                elif response_text[i] == '}':
-                    depth -= 1
-                    if depth == 0:
-                        json_str = response_text[start:i+1]
-                        try:
-                            data = json.loads(json_str)
-                            if isinstance(data, dict) and "cards" in data:
-                                return data["cards"]
-                        except json.JSONDecodeError:
-                            break
-
-        # Strategy 4: Use JSONDecoder's raw_decode (more lenient)
-        try:
-            if start >= 0:
-                decoder = json.JSONDecoder()
-                data, _ = decoder.raw_decode(response_text[start:])
-                if isinstance(data, dict) and "cards" in data:
-                    return data["cards"]
-        except (json.JSONDecodeError, ValueError):
-            pass
-
-        # All strategies failed
-        print(f"Warning: Could not parse JSON from LLM response after trying all strategies")
-        print(f"Response preview: {original_text[:300]}...")
+        logger.warning(
+            "Could not parse JSON from LLM response. Response preview: %s...",
+            response_text[:300],
+        )
         return []
 
 
@@ -285,41 +944,143 @@ class OpenAIClient(LLMClient):
         model: str = "gpt-4o-mini",
         temperature: float = 0.2,
         max_tokens: int = 4096,
+        cache: Optional[ResponseCache] = None,
     ):
         """Initialize OpenAI client."""
-        super().__init__(model, temperature, max_tokens)
+        super().__init__(model, temperature, max_tokens, cache)
         
+        openai = _import_sdk("openai", "openai")
+        # Retries are handled by _with_retries, not the SDK
+        self.client = openai.OpenAI(
+            api_key=api_key, http_client=_get_http_client(), max_retries=0
+        )
+        self._api_key = api_key
+
+    json_mode = True
+
+    def _request_body(
+        self, system_prompt: str, user_content: str, json_mode: bool = False
+    ) -> Dict[str, Any]:
+        """Build chat completion parameters for one request."""
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        if json_mode:
+            body["response_format"] = {"type": "json_object"}
+        return body
+
+    def _call_api(
+        self, system_prompt: str, user_content: str, json_mode: bool = False
+    ) -> str:
+        """Call OpenAI API with retry logic."""
+        def request() -> str:
+            response = self.client.chat.completions.create(
+                **self._request_body(system_prompt, user_content, json_mode)
+            )
+            return response.choices[0].message.content
+
+        return _with_retries(request, "OpenAI")
+
+    def _call_api_json(self, system_prompt: str, user_content: str) -> str:
+        """Call OpenAI API in JSON mode."""
+        return self._call_api(system_prompt, user_content, json_mode=True)
+
+    async def _call_api_json_async(self, system_prompt: str, user_content: str) -> str:
+        """Call OpenAI API asynchronously in JSON mode."""
+        return await self._call_api_async(system_prompt, user_content, json_mode=True)
+
+    def _call_api_stream(self, system_prompt: str, user_content: str) -> Iterator[str]:
+        """Stream OpenAI completion text deltas."""
+        stream = _with_retries(
+            lambda: self.client.chat.completions.create(
+                **self._request_body(system_prompt, user_content, json_mode=True),
+                stream=True,
+            ),
+            "OpenAI",
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _create_async_client(self) -> Any:
+        """Build an AsyncOpenAI client."""
+        return _import_sdk("openai", "openai").AsyncOpenAI(api_key=self._api_key, max_retries=0)
+
+    async def _call_api_async(
+        self, system_prompt: str, user_content: str, json_mode: bool = False
+    ) -> str:
+        """Call OpenAI API asynchronously with retry logic."""
+        async def request() -> str:
+            response = await self._get_async_client().chat.completions.create(
+                **self._request_body(system_prompt, user_content, json_mode)
+            )
+            return response.choices[0].message.content
+
+        return await _with_retries_async(request, "OpenAI")
+
+    def submit_batch(
+        self, system_prompt: str, payloads: Dict[str, Dict[str, Any]]
+    ) -> str:
+        """Upload a JSONL batch file and create an OpenAI batch job."""
+        lines = [
+            json_utils.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._request_body(
+                    system_prompt, _serialize_payload(payload), json_mode=True
+                ),
+            })
+            for custom_id, payload in payloads.items()
+        ]
+
         try:
-            import openai
-            self.client = openai.OpenAI(api_key=api_key)
-        except ImportError:
-            raise LLMError(
-                "openai package not installed. Install with: pip install openai"
+            batch_file = self.client.files.create(
+                file=("batch.jsonl", b"\n".join(lines)),
+                purpose="batch",
+            )
+            batch = self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
             )
+            return batch.id
+        except Exception as e:
+            raise LLMError(f"OpenAI batch submission error: {e}") from e
 
-    def _call_api(self, system_prompt: str, user_content: str) -> str:
-        """Call OpenAI API with retry logic."""
-        max_retries = 3
-        retry_delay = 1
+    def poll_batch(self, batch_id: str) -> Optional[Dict[str, str]]:
+        """Check an OpenAI batch job and download its output when complete."""
+        try:
+            batch = self.client.batches.retrieve(batch_id)
+        except Exception as e:
+            raise LLMError(f"OpenAI batch status error: {e}") from e
 
-        for attempt in range(max_retries):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_content},
-                    ],
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                )
-                return response.choices[0].message.content
-
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (2 ** attempt))
-                    continue
-                raise LLMError(f"OpenAI API error: {e}") from e
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise LLMError(f"OpenAI batch {batch_id} {batch.status}")
+        if batch.status != "completed":
+            return None
+        if not batch.output_file_id:
+            return {}
+
+        results = {}
+        output = self.client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json_utils.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            choices = response.get("body", {}).get("choices") or []
+            if choices:
+                results[record["custom_id"]] = choices[0]["message"]["content"] or ""
+        return results
 
 
 class AnthropicClient(LLMClient):
@@ -331,41 +1092,104 @@ class AnthropicClient(LLMClient):
         model: str = "claude-sonnet-4",
         temperature: float = 0.2,
         max_tokens: int = 4096,
+        cache: Optional[ResponseCache] = None,
     ):
         """Initialize Anthropic client."""
-        super().__init__(model, temperature, max_tokens)
+        super().__init__(model, temperature, max_tokens, cache)
         
-        try:
-            import anthropic
-            self.client = anthropic.Anthropic(api_key=api_key)
-        except ImportError:
-            raise LLMError(
-                "anthropic package not installed. Install with: pip install anthropic"
-            )
+        anthropic = _import_sdk("anthropic", "anthropic")
+        # Retries are handled by _with_retries, not the SDK
+        self.client = anthropic.Anthropic(
+            api_key=api_key, http_client=_get_http_client(), max_retries=0
+        )
+        self._api_key = api_key
+
+    def _request_params(self, system_prompt: str, user_content: str) -> Dict[str, Any]:
+        """
+        Build Messages API parameters for one request.
+
+        The system prompt is the same across requests, so it is marked as a
+        cache breakpoint and later requests reuse its cached prefill.
+        """
+        return {
+            "model": self.model,
+            "system": [
+                {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}},
+            ],
+            "messages": [
+                {"role": "user", "content": user_content},
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
 
     def _call_api(self, system_prompt: str, user_content: str) -> str:
         """Call Anthropic API with retry logic."""
-        max_retries = 3
-        retry_delay = 1
+        def request() -> str:
+            response = self.client.messages.create(
+                **self._request_params(system_prompt, user_content)
+            )
+            return response.content[0].text
 
-        for attempt in range(max_retries):
-            try:
-                response = self.client.messages.create(
-                    model=self.model,
-                    system=system_prompt,
-                    messages=[
-                        {"role": "user", "content": user_content},
-                    ],
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                )
-                return response.content[0].text
-
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (2 ** attempt))
-                    continue
-                raise LLMError(f"Anthropic API error: {e}") from e
+        return _with_retries(request, "Anthropic")
+
+    def _call_api_stream(self, system_prompt: str, user_content: str) -> Iterator[str]:
+        """Stream Anthropic message text deltas."""
+        stream = _with_retries(
+            lambda: self.client.messages.create(
+                **self._request_params(system_prompt, user_content), stream=True
+            ),
+            "Anthropic",
+        )
+        for event in stream:
+            if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                yield event.delta.text
+
+    def _create_async_client(self) -> Any:
+        """Build an AsyncAnthropic client."""
+        return _import_sdk("anthropic", "anthropic").AsyncAnthropic(api_key=self._api_key, max_retries=0)
+
+    async def _call_api_async(self, system_prompt: str, user_content: str) -> str:
+        """Call Anthropic API asynchronously with retry logic."""
+        async def request() -> str:
+            response = await self._get_async_client().messages.create(
+                **self._request_params(system_prompt, user_content)
+            )
+            return response.content[0].text
+
+        return await _with_retries_async(request, "Anthropic")
+
+    def submit_batch(
+        self, system_prompt: str, payloads: Dict[str, Dict[str, Any]]
+    ) -> str:
+        """Create an Anthropic Message Batch."""
+        requests = [
+            {
+                "custom_id": custom_id,
+                "params": self._request_params(system_prompt, _serialize_payload(payload)),
+            }
+            for custom_id, payload in payloads.items()
+        ]
+
+        try:
+            return self.client.messages.batches.create(requests=requests).id
+        except Exception as e:
+            raise LLMError(f"Anthropic batch submission error: {e}") from e
+
+    def poll_batch(self, batch_id: str) -> Optional[Dict[str, str]]:
+        """Check an Anthropic Message Batch and collect results once ended."""
+        try:
+            batch = self.client.messages.batches.retrieve(batch_id)
+            if batch.processing_status != "ended":
+                return None
+
+            results = {}
+            for entry in self.client.messages.batches.results(batch_id):
+                if entry.result.type == "succeeded":
+                    results[entry.custom_id] = entry.result.message.content[0].text
+            return results
+        except Exception as e:
+            raise LLMError(f"Anthropic batch status error: {e}") from e
 
 
 class GeminiClient(LLMClient):
@@ -377,45 +1201,65 @@ class GeminiClient(LLMClient):
         model: str = "gemini-2.0-flash-exp",
         temperature: float = 0.2,
         max_tokens: int = 4096,
+        cache: Optional[ResponseCache] = None,
     ):
         """Initialize Gemini client."""
-        super().__init__(model, temperature, max_tokens)
+        super().__init__(model, temperature, max_tokens, cache)
         
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=api_key)
-            self.model_instance = genai.GenerativeModel(
-                model_name=model,
+        self._genai = _import_sdk("google.generativeai", "google-generativeai")
+        _configure_gemini(self._genai, api_key)
+        self._models: Dict[str, Any] = {}
+
+    def _model_for(self, system_prompt: str) -> Any:
+        """
+        Get the GenerativeModel bound to a system prompt, creating it once.
+
+        Passing the prompt as system_instruction (rather than prepending it to
+        the user content) keeps the request prefix stable so Gemini's
+        server-side prompt caching can apply.
+        """
+        model = self._models.get(system_prompt)
+        if model is None:
+            model = self._genai.GenerativeModel(
+                model_name=self.model,
+                system_instruction=system_prompt,
                 generation_config={
-                    "temperature": temperature,
-                    "max_output_tokens": max_tokens,
-                }
-            )
-        except ImportError:
-            raise LLMError(
-                "google-generativeai package not installed. "
-                "Install with: pip install google-generativeai"
+                    "temperature": self.temperature,
+                    "max_output_tokens": self.max_tokens,
+                },
             )
+            self._models[system_prompt] = model
+        return model
 
     def _call_api(self, system_prompt: str, user_content: str) -> str:
         """Call Gemini API with retry logic."""
-        max_retries = 3
-        retry_delay = 1
+        model = self._model_for(system_prompt)
 
-        # Gemini doesn't have separate system/user roles in the same way
-        # Combine system prompt with user content
-        combined_prompt = f"{system_prompt}\n\n{user_content}"
+        def request() -> str:
+            return model.generate_content(user_content).text
 
-        for attempt in range(max_retries):
-            try:
-                response = self.model_instance.generate_content(combined_prompt)
-                return response.text
+        return _with_retries(request, "Gemini")
+
+    def _call_api_stream(self, system_prompt: str, user_content: str) -> Iterator[str]:
+        """Stream Gemini response text."""
+        model = self._model_for(system_prompt)
+        stream = _with_retries(
+            lambda: model.generate_content(user_content, stream=True),
+            "Gemini",
+        )
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    async def _call_api_async(self, system_prompt: str, user_content: str) -> str:
+        """Call Gemini API asynchronously with retry logic."""
+        model = self._model_for(system_prompt)
+
+        async def request() -> str:
+            response = await model.generate_content_async(user_content)
+            return response.text
 
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (2 ** attempt))
-                    continue
-                raise LLMError(f"Gemini API error: {e}") from e
+        return await _with_retries_async(request, "Gemini")
 
 
 class NoneClient(LLMClient):
@@ -435,6 +1279,28 @@ class NoneClient(LLMClient):
         """Return empty list."""
         return []
 
+    def generate_cards_stream(
+        self, system_prompt: str, user_payload: Dict[str, Any]
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield nothing."""
+        return iter(())
+
+    def generate_cards_multi(
+        self, system_prompt: str, payloads: List[Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """Return an empty card list per payload."""
+        return [[] for _ in payloads]
+
+    async def generate_cards_concurrent(
+        self,
+        system_prompt: str,
+        payloads: List[Dict[str, Any]],
+        max_concurrency: int = 10,
+        rate_limit_rpm: Optional[int] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Return an empty card list per payload."""
+        return [[] for _ in payloads]
+
     def chat(self, system_prompt: str, user_message: str) -> str:
         """Return message indicating LLM is disabled."""
         return "LLM is disabled. Set llm.provider in config to enable."
@@ -446,6 +1312,8 @@ def create_llm_client(
     model: str,
     temperature: float = 0.2,
     max_tokens: int = 1200,
+    prewarm: bool = False,
+    cache: Optional[ResponseCache] = None,
 ) -> LLMClient:
     """
     Factory function to create appropriate LLM client.
@@ -456,6 +1324,9 @@ def create_llm_client(
         model: Model name
         temperature: Sampling temperature
         max_tokens: Maximum output tokens
+        prewarm: Open a connection to the provider in the background so the
+            first request skips the TCP/TLS handshake
+        cache: Optional response cache for card generation requests
 
     Returns:
         LLMClient instance
@@ -474,12 +1345,14 @@ def create_llm_client(
             f"Set {provider.upper()}_API_KEY in environment."
         )
 
-    if provider == "openai":
-        return OpenAIClient(api_key, model, temperature, max_tokens)
-    elif provider == "anthropic":
-        return AnthropicClient(api_key, model, temperature, max_tokens)
+    if provider in ("openai", "anthropic"):
+        client_class = OpenAIClient if provider == "openai" else AnthropicClient
+        client = client_class(api_key, model, temperature, max_tokens, cache)
+        if prewarm:
+            _prewarm(str(client.client.base_url))
+        return client
     elif provider == "gemini":
-        return GeminiClient(api_key, model, temperature, max_tokens)
+        return GeminiClient(api_key, model, temperature, max_tokens, cache)
     else:
         raise LLMError(
             f"Unknown provider '{provider}'. "
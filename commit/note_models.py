@@ -1,33 +1,177 @@
 """Data models for extracted blocks and Anki notes."""
 
+import logging
+import os
 import re
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
-
-from pydantic import BaseModel, Field
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache, partial
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 
 from .hashing import compute_content_hash, compute_guid
+from .security import strip_dangerous_latex
 from .tex_parser import ExtractedEnvironment, get_first_sentence, normalize_tex
 
+logger = logging.getLogger(__name__)
+
+# dataclass(slots=True) needs Python 3.10+; older interpreters get plain dataclasses
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# Invariant HTML fragments shared by the note formatters
+_CONTENT_OPEN = '<div class="latex-content">\n'
+_CONTENT_CLOSE = "\n</div>\n"
+_LABELLED_BODY_OPEN = ':</strong>\n<div style="margin-top: 0.5em;">\n'
+_LABELLED_BODY_CLOSE = "\n</div>\n</div>\n"
+_EXAMPLE_PROMPT = "<div style='margin-top: 1em; color: #666; font-size: 0.9em;'>What does this example demonstrate?</div>"
+
+
+@lru_cache(maxsize=8192)
+def _render_source(file_path: str, line_number: int) -> str:
+    """Source-location footer shown at the bottom of every back field."""
+    return f"<div style='margin-top: 1em; font-size: 0.9em; color: #666;'>Source: <code>{file_path}:{line_number}</code></div>"
+
+
+@lru_cache(maxsize=4096)
+def _first_sentence(body: str, max_length: int) -> str:
+    """
+    Memoized get_first_sentence for repeated mapping of the same body.
+
+    Keyed on the raw body rather than content_hash: the hash covers the
+    normalized body, and two raw bodies that normalize alike can still
+    have different first sentences.
+    """
+    return get_first_sentence(body, max_length=max_length)
+
 
-@dataclass
+def _plain_back(block: "ExtractedBlock") -> str:
+    """Back field with the block body followed by its source location."""
+    return "".join((
+        _CONTENT_OPEN, block.body, _CONTENT_CLOSE,
+        _render_source(block.file_path, block.line_number),
+    ))
+
+
+def _labelled_back(block: "ExtractedBlock", *heading: str) -> str:
+    """
+    Back field with a bold heading above the block body, then the source.
+
+    The heading is passed as fragments so it is joined in the same pass as
+    the rest of the field instead of being built separately.
+    """
+    return "".join((
+        _CONTENT_OPEN, "<strong>", *heading, _LABELLED_BODY_OPEN,
+        block.body, _LABELLED_BODY_CLOSE,
+        _render_source(block.file_path, block.line_number),
+    ))
+
+
+# Shared, read-only parts of every addNotes payload
+_ADD_NOTE_OPTIONS = {
+    "allowDuplicate": True,  # We handle duplicates via GUID tracking
+    "duplicateScope": "deck",
+}
+_NO_MEDIA = ()  # Serializes as an empty JSON array
+
+# Display names for the environments the mapper knows about; anything else
+# falls back to str.title() at format time
+_ENV_TITLE = {
+    env: env.title()
+    for env in ("theorem", "proposition", "lemma", "corollary", "definition", "remark", "example")
+}
+
+# Path separators and dots become underscores in file tags
+_FILE_TAG_TABLE = str.maketrans({"/": "_", "\\": "_", ".": "_"})
+
+
+@dataclass(frozen=True, eq=False, **DATACLASS_SLOTS)
 class ExtractedBlock:
-    """Represents a parsed LaTeX block with computed hashes."""
+    """
+    Represents a parsed LaTeX block with computed hashes.
+
+    The normalized body, content hash, sanitized text and generated GUID
+    are computed on first access, so blocks that are dropped early never
+    pay for them.
+    Blocks are immutable and compare and hash by GUID, so they can be
+    deduplicated with plain sets and dicts.
+    """
 
     env: str
     title: Optional[str]
     body: str
-    normalized_body: str
     file_path: str
     line_number: int
-    guid: str
-    content_hash: str
     raw_text: str
     neighbor_context: Optional[str] = None  # For LLM context
+    _guid: Optional[str] = field(default=None, repr=False)  # Persistent GUID from LaTeX, if any
+    _normalized_body: Optional[str] = field(default=None, init=False, repr=False)
+    _content_hash: Optional[str] = field(default=None, init=False, repr=False)
+    _sanitized_body: Optional[str] = field(default=None, init=False, repr=False)
+    _sanitized_context: Optional[str] = field(default=None, init=False, repr=False)
+
+    @property
+    def normalized_body(self) -> str:
+        """Normalized LaTeX content."""
+        if self._normalized_body is None:
+            object.__setattr__(self, "_normalized_body", normalize_tex(self.body))
+        return self._normalized_body
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of the normalized body."""
+        if self._content_hash is None:
+            object.__setattr__(
+                self, "_content_hash", compute_content_hash(self.normalized_body)
+            )
+        return self._content_hash
+
+    @property
+    def sanitized_body(self) -> str:
+        """Body with dangerous LaTeX commands removed, for sending to an LLM."""
+        if self._sanitized_body is None:
+            object.__setattr__(self, "_sanitized_body", strip_dangerous_latex(self.body))
+        return self._sanitized_body
+
+    @property
+    def sanitized_context(self) -> str:
+        """Neighbor context with dangerous LaTeX commands removed ("" if none)."""
+        if self._sanitized_context is None:
+            object.__setattr__(
+                self, "_sanitized_context", strip_dangerous_latex(self.neighbor_context or "")
+            )
+        return self._sanitized_context
+
+    @property
+    def guid(self) -> str:
+        """
+        Block GUID.
+
+        Uses the persistent GUID from the LaTeX comment if available (might
+        be a short 12-char version), otherwise one generated from
+        content+location (which will be injected later).
+        """
+        if self._guid is None:
+            object.__setattr__(
+                self, "_guid", compute_guid(self.env, self.normalized_body, self.file_path)
+            )
+        return self._guid
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ExtractedBlock):
+            return NotImplemented
+        return self.guid == other.guid
+
+    def __hash__(self) -> int:
+        return hash(self.guid)
 
     @classmethod
     def from_environment(
-        cls, env: ExtractedEnvironment, file_path: str
+        cls,
+        env: ExtractedEnvironment,
+        file_path: str,
+        guid: Optional[str] = None,
+        neighbor_context: Optional[str] = None,
     ) -> "ExtractedBlock":
         """
         Create ExtractedBlock from ExtractedEnvironment.
@@ -35,78 +179,78 @@ class ExtractedBlock:
         Args:
             env: Extracted environment from parser
             file_path: Relative path to source file
+            guid: GUID overriding the one found in the LaTeX source, if any
+            neighbor_context: Surrounding text for LLM context
 
         Returns:
-            ExtractedBlock with computed hashes
+            ExtractedBlock whose hashes are computed on first access
         """
-        normalized = normalize_tex(env.body)
-        
-        # Use persistent GUID from LaTeX comment if available, otherwise generate
-        if env.guid:
-            # GUID extracted from LaTeX (might be short 12-char version)
-            guid = env.guid
-        else:
-            # Generate GUID based on content+location (will be injected later)
-            guid = compute_guid(env.env, normalized, file_path)
-        
-        content_hash = compute_content_hash(normalized)
-
         return cls(
-            env=env.env,
+            env=sys.intern(env.env),  # Few distinct values across many blocks
             title=env.title,
             body=env.body,
-            normalized_body=normalized,
             file_path=file_path,
             line_number=env.start_line,
-            guid=guid,
-            content_hash=content_hash,
             raw_text=env.raw_text,
+            neighbor_context=neighbor_context,
+            _guid=guid or env.guid,
         )
 
 
-class AnkiNote(BaseModel):
-    """Represents an Anki note ready to be synced."""
+@dataclass(**DATACLASS_SLOTS)
+class AnkiNote:
+    """
+    Represents an Anki note ready to be synced.
+
+    Notes are only built by trusted internal code, so this is a slotted
+    dataclass rather than a validating model.
+    """
 
-    guid: str = Field(description="Stable GUID for idempotency")
-    deck_name: str = Field(description="Target deck")
-    model_name: str = Field(description="Note type (Basic, Cloze, etc.)")
-    fields: Dict[str, str] = Field(description="Field name to content mapping")
-    tags: List[str] = Field(default_factory=list, description="List of tags")
-    content_hash: str = Field(description="Hash of content for change detection")
+    guid: str  # Stable GUID for idempotency
+    deck_name: str  # Target deck
+    model_name: str  # Note type (Basic, Cloze, etc.)
+    fields: Dict[str, str]  # Field name to content mapping
+    content_hash: str  # Hash of content for change detection
+    tags: List[str] = field(default_factory=list)
 
     def to_anki_connect_format(self) -> Dict:
         """
         Convert to AnkiConnect API format.
 
         Returns:
-            Dictionary ready for AnkiConnect addNotes action
+            Dictionary ready for AnkiConnect addNotes action. The options
+            and media values are shared between notes and must not be mutated.
         """
         return {
             "deckName": self.deck_name,
             "modelName": self.model_name,
             "fields": self.fields,
-            "options": {
-                "allowDuplicate": True,  # We handle duplicates via GUID tracking
-                "duplicateScope": "deck",
-            },
+            "options": _ADD_NOTE_OPTIONS,
             "tags": self.tags,
-            "audio": [],
-            "video": [],
-            "picture": [],
+            "audio": _NO_MEDIA,
+            "video": _NO_MEDIA,
+            "picture": _NO_MEDIA,
         }
 
 
+@dataclass(**DATACLASS_SLOTS)
+class UnchangedNote:
+    """Marker returned by NoteMapper.map_blocks for blocks whose content is unchanged."""
+
+    guid: str
+
+
 class NoteMapper:
     """Maps ExtractedBlocks to AnkiNotes based on environment type."""
 
     # Environment types that should use Basic model with theorem-style formatting
-    THEOREM_LIKE = {"theorem", "proposition", "lemma", "corollary"}
+    THEOREM_LIKE = frozenset({"theorem", "proposition", "lemma", "corollary"})
 
     # Environment types that should use Basic model with definition-style formatting
-    DEFINITION_LIKE = {"definition", "remark"}
+    DEFINITION_LIKE = frozenset({"definition", "remark"})
 
     # Environment types that should use example-style formatting
-    EXAMPLE_LIKE = {"example"}
+    EXAMPLE_LIKE = frozenset({"example"})
 
     def __init__(self, course_name: str, commit_sha: str):
         """
@@ -119,6 +263,16 @@ class NoteMapper:
         self.course_name = course_name
         self.commit_sha = commit_sha
 
+        # Tags shared by every note from this mapper, built once
+        self._base_tags = (
+            "auto",
+            "from-tex",
+            f"course:{course_name}",
+            f"commit:{commit_sha[:8]}",  # Short commit hash
+        )
+        # Source path -> sanitized file tag; blocks from one file share it
+        self._file_tags: Dict[str, str] = {}
+
     def map_block(self, block: ExtractedBlock, deck_name: str) -> AnkiNote:
         """
         Map an extracted block to an Anki note.
@@ -130,22 +284,18 @@ class NoteMapper:
         Returns:
             AnkiNote ready for syncing
         """
-        env_lower = block.env.lower()
-
-        # Determine note type and create fields
-        if env_lower in self.DEFINITION_LIKE:
-            front, back = self._format_definition(block)
-            model_name = "Basic"
-        elif env_lower in self.THEOREM_LIKE:
-            front, back = self._format_theorem(block)
-            model_name = "Basic"
-        elif env_lower in self.EXAMPLE_LIKE:
-            front, back = self._format_example(block)
-            model_name = "Basic"
-        else:
-            # Generic fallback
-            front, back = self._format_generic(block)
-            model_name = "Basic"
+        # Nothing to format for an empty environment; go straight to placeholders
+        if not block.body.strip():
+            return self._empty_note(block, deck_name)
+
+        # Determine note type and create fields (generic fallback for unknown envs).
+        # Env names are interned and usually lowercase already, so the first
+        # lookup normally hits without allocating a lowercased copy.
+        formatter = self._FORMAT_BY_ENV.get(block.env) or self._FORMAT_BY_ENV.get(
+            block.env.lower(), NoteMapper._format_generic
+        )
+        front, back = formatter(self, block)
+        model_name = "Basic"
 
         # Build tags
         tags = self._build_tags(block)
@@ -153,151 +303,194 @@ class NoteMapper:
         # Validate that front/back are not empty
         if not front.strip():
             # This shouldn't happen, but log it
-            print(f"[WARNING] Empty front field for {block.file_path}:{block.line_number}")
+            logger.warning(
+                "Empty front field for %s:%d (env=%s)", block.file_path, block.line_number, block.env
+            )
             front = f"[Empty front - env: {block.env}]"
         
         if not back.strip():
-            print(f"[WARNING] Empty back field for {block.file_path}:{block.line_number}")
+            logger.warning(
+                "Empty back field for %s:%d (env=%s)", block.file_path, block.line_number, block.env
+            )
             back = f"[Empty back - check source at {block.file_path}:{block.line_number}]"
 
         return AnkiNote(
             guid=block.guid,
-            deck_name=deck_name,
+            deck_name=sys.intern(deck_name),
             model_name=model_name,
             fields={"Front": front, "Back": back},
             tags=tags,
             content_hash=block.content_hash,
         )
 
-    def _format_definition(self, block: ExtractedBlock) -> tuple[str, str]:
-        """Format definition-style environments."""
-        env_title = block.env.title()
-
-        # Front: "Definition: {title}" or first sentence
+    def _empty_note(self, block: ExtractedBlock, deck_name: str) -> AnkiNote:
+        """Build a placeholder note for a block with an empty body."""
+        logger.warning(
+            "Empty body for %s:%d (env=%s)", block.file_path, block.line_number, block.env
+        )
         if block.title:
-            front = f"{env_title}: {block.title}"
+            front = f"{_ENV_TITLE.get(block.env) or block.env.title()}: {block.title}"
         else:
-            # Use first sentence or beginning of body
-            first_sent = get_first_sentence(block.body, max_length=80)
-            front = f"{env_title}: {first_sent}"
+            front = f"[Empty front - env: {block.env}]"
+        back = f"[Empty back - check source at {block.file_path}:{block.line_number}]"
 
-        # Back: Full content + source
-        source = f"<div style='margin-top: 1em; font-size: 0.9em; color: #666;'>Source: <code>{block.file_path}:{block.line_number}</code></div>"
+        return AnkiNote(
+            guid=block.guid,
+            deck_name=sys.intern(deck_name),
+            model_name="Basic",
+            fields={"Front": front, "Back": back},
+            tags=self._build_tags(block),
+            content_hash=block.content_hash,
+        )
+
+    def map_blocks(
+        self,
+        blocks: Iterable[ExtractedBlock],
+        deck_name: str,
+        prior_hashes: Mapping[str, Optional[str]],
+    ) -> Iterator[Union[AnkiNote, UnchangedNote]]:
+        """
+        Map blocks to notes, skipping blocks whose content has not changed.
+
+        Args:
+            blocks: Extracted LaTeX blocks
+            deck_name: Target Anki deck
+            prior_hashes: GUID -> content hash from the previous run
 
-        back = f"""<div class="latex-content">
-{block.body}
-</div>
-{source}"""
+        Yields:
+            One item per block: an AnkiNote, or UnchangedNote when the block's
+            content hash matches prior_hashes (no formatting is done)
+        """
+        for block in blocks:
+            if prior_hashes.get(block.guid) == block.content_hash:
+                yield UnchangedNote(block.guid)
+            else:
+                yield self.map_block(block, deck_name)
+
+    def map_blocks_parallel(
+        self,
+        blocks: Sequence[ExtractedBlock],
+        deck_name: str,
+        workers: Optional[int] = None,
+        min_parallel: int = 128,
+    ) -> List[AnkiNote]:
+        """
+        Map many blocks across a process pool.
+
+        Normalizing, hashing and HTML formatting are CPU-bound and independent
+        per block, so large batches scale with cores. Small batches are mapped
+        serially, where process start-up would dominate.
+
+        Args:
+            blocks: Extracted LaTeX blocks
+            deck_name: Target Anki deck
+            workers: Worker processes (default: CPU count)
+            min_parallel: Batches smaller than this are mapped in-process
+
+        Returns:
+            One AnkiNote per block, in input order
+        """
+        if len(blocks) < min_parallel:
+            return [self.map_block(block, deck_name) for block in blocks]
+
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(blocks) // (workers * 4))
+        with ProcessPoolExecutor(workers) as executor:
+            return list(executor.map(
+                partial(self.map_block, deck_name=deck_name), blocks, chunksize=chunksize
+            ))
+
+    def _format_definition(self, block: ExtractedBlock) -> tuple[str, str]:
+        """Format definition-style environments (also the generic fallback)."""
+        # Front: "Definition: {title}" or first sentence
+        env_title = _ENV_TITLE.get(block.env) or block.env.title()
+        front = f"{env_title}: {block.title or _first_sentence(block.body, 80)}"
+
+        # Back: Full content + source
+        return front, _plain_back(block)
 
-        return front, back
+    _format_generic = _format_definition
 
     def _format_theorem(self, block: ExtractedBlock) -> tuple[str, str]:
         """Format theorem-style environments."""
-        env_title = block.env.title()
+        env_title = _ENV_TITLE.get(block.env) or block.env.title()
 
-        # Front: "Theorem: {title}" or statement
-        if block.title:
-            front = f"{env_title}: {block.title}"
-        else:
-            # For theorems, try to extract a short statement
-            first_sent = get_first_sentence(block.body, max_length=100)
-            front = f"{env_title}: {first_sent}"
+        # Front: "Theorem: {title}" or a short statement
+        front = f"{env_title}: {block.title or _first_sentence(block.body, 100)}"
 
         # Back: Full statement + source
-        source = f"<div style='margin-top: 1em; font-size: 0.9em; color: #666;'>Source: <code>{block.file_path}:{block.line_number}</code></div>"
-
-        back = f"""<div class="latex-content">
-<strong>{env_title}{' (' + block.title + ')' if block.title else ''}:</strong>
-<div style="margin-top: 0.5em;">
-{block.body}
-</div>
-</div>
-{source}"""
-
-        return front, back
+        if block.title:
+            return front, _labelled_back(block, env_title, " (", block.title, ")")
+        return front, _labelled_back(block, env_title)
 
     def _format_example(self, block: ExtractedBlock) -> tuple[str, str]:
         """Format example environments."""
         # Front: Show the example setup/context (first part)
         if block.title:
-            # If there's a title, use it prominently
+            # If there's a title, use it prominently, with a preview of the content
+            preview = _first_sentence(block.body, 150)
             front = f"<strong>Example: {block.title}</strong>"
-            # Add a preview of the content
-            preview = get_first_sentence(block.body, max_length=150)
             if preview:
-                front += f"<div style='margin-top: 0.5em;'>{preview}</div>"
+                front = f"{front}<div style='margin-top: 0.5em;'>{preview}</div>"
         else:
             # No title: show a substantial preview of the example
-            preview = get_first_sentence(block.body, max_length=200)
+            preview = _first_sentence(block.body, 200)
             if preview:
                 front = f"<strong>Example:</strong><div style='margin-top: 0.5em;'>{preview}</div>"
             else:
                 # Fallback if extraction fails
                 front = f"Example from {block.file_path}:{block.line_number}"
-        
-        front += "<div style='margin-top: 1em; color: #666; font-size: 0.9em;'>What does this example demonstrate?</div>"
 
         # Back: Full example content
-        source = f"<div style='margin-top: 1em; font-size: 0.9em; color: #666;'>Source: <code>{block.file_path}:{block.line_number}</code></div>"
-
-        back = f"""<div class="latex-content">
-<strong>Example{': ' + block.title if block.title else ''}:</strong>
-<div style="margin-top: 0.5em;">
-{block.body}
-</div>
-</div>
-{source}"""
-
-        return front, back
-
-    def _format_generic(self, block: ExtractedBlock) -> tuple[str, str]:
-        """Generic fallback formatting."""
-        env_title = block.env.title()
-
+        front += _EXAMPLE_PROMPT
         if block.title:
-            front = f"{env_title}: {block.title}"
-        else:
-            front = f"{env_title}: {get_first_sentence(block.body, max_length=80)}"
-
-        source = f"<div style='margin-top: 1em; font-size: 0.9em; color: #666;'>Source: <code>{block.file_path}:{block.line_number}</code></div>"
-
-        back = f"""<div class="latex-content">
-{block.body}
-</div>
-{source}"""
+            return front, _labelled_back(block, "Example: ", block.title)
+        return front, _labelled_back(block, "Example")
 
-        return front, back
+    # Lowercased environment name -> formatter, built once for the class
+    _FORMAT_BY_ENV = {
+        **dict.fromkeys(DEFINITION_LIKE, _format_definition),
+        **dict.fromkeys(THEOREM_LIKE, _format_theorem),
+        **dict.fromkeys(EXAMPLE_LIKE, _format_example),
+    }
 
     def _build_tags(self, block: ExtractedBlock) -> List[str]:
         """Build tags for a note."""
-        tags = [
-            "auto",
-            "from-tex",
-            f"course:{self.course_name}",
-            f"commit:{self.commit_sha[:8]}",  # Short commit hash
-            f"env:{block.env}",
-        ]
-
         # Add file tag (sanitize path for tag format)
-        file_tag = block.file_path.replace("/", "_").replace("\\", "_").replace(".", "_")
-        tags.append(f"file:{file_tag}")
-
-        # Add GUID tag for lookup
-        tags.append(f"guid:{block.guid[:12]}")  # Short GUID for readability
+        file_tag = self._file_tags.get(block.file_path)
+        if file_tag is None:
+            file_tag = block.file_path.translate(_FILE_TAG_TABLE)
+            self._file_tags[block.file_path] = file_tag
 
-        return tags
+        return [
+            *self._base_tags,
+            f"env:{block.env}",
+            f"file:{file_tag}",
+            f"guid:{block.guid[:12]}",  # Short GUID for lookup and readability
+        ]
 
 
-def create_revision_tag() -> str:
+def create_revision_tag(today: Optional[date] = None) -> str:
     """
     Create a revision tag with current date.
 
+    Args:
+        today: Date to tag with (default: today's local date)
+
     Returns:
         Tag in format "rev:YYYYMMDD"
     """
-    from datetime import datetime
+    return _revision_tag_for(today or date.today())
+
+
+@lru_cache(maxsize=1)
+def _revision_tag_for(day: date) -> str:
+    """Format the revision tag once per distinct date."""
+    return f"rev:{day:%Y%m%d}"
+
 
-    return f"rev:{datetime.now().strftime('%Y%m%d')}"
+# Content that's only whitespace and LaTeX command characters
+_LATEX_ONLY_RE = re.compile(r'^[\s\\{}]*$')
 
 
 def validate_card_content(front: str, back: str, model: str) -> Tuple[bool, str]:
@@ -324,9 +517,7 @@ def validate_card_content(front: str, back: str, model: str) -> Tuple[bool, str]
         return False, "Basic card requires non-empty back"
     
     # Check for LaTeX-only content (labels, refs, etc.) that renders as empty
-    # This matches content that's only whitespace and LaTeX commands
-    latex_only_pattern = r'^[\s\\{}]*$'
-    if re.match(latex_only_pattern, front):
+    if _LATEX_ONLY_RE.match(front):
         return False, "Front contains only LaTeX commands"
     
     # Check for whitespace-only content
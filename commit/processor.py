@@ -1,25 +1,58 @@
 """Main processing logic for anki-tex."""
 
-import json
+import asyncio
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
 
 from rich.console import Console
+from rich.markup import escape
 from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.table import Table
 
-from .anki_connect import AnkiConnectError, SyncAnkiConnectClient
+from . import json_utils
+from .anki_connect import AnkiConnectError, SyncAnkiConnectClient, build_action
 from .apkg_builder import APKGBuilderError, build_apkg, is_genanki_available
 from .config import find_config, load_config
-from .git_utils import GitError, get_changed_files, get_current_sha
+from .git_utils import GitError, _compile_pattern_groups, get_changed_files, get_current_sha
+from .hashing import (
+    GUID_PREFIX_LENGTH,
+    build_guid_prefix_index,
+    compute_fields_hash,
+    match_short_guid_to_full,
+)
+from .llm_cache import ResponseCache, compute_request_key
 from .llm_client import LLMClient, create_llm_client
-from .note_models import AnkiNote, ExtractedBlock, NoteMapper, create_revision_tag, validate_card_content
+from .note_models import (
+    AnkiNote,
+    ExtractedBlock,
+    NoteMapper,
+    UnchangedNote,
+    create_revision_tag,
+    validate_card_content,
+)
 from .prompts import CARDS_SYSTEM_PROMPT, BATCH_CARDS_SYSTEM_PROMPT
-from .security import strip_dangerous_latex
 from .state import StateManager
-from .tex_parser import extract_environments, extract_neighbor_context, inject_guid_comment
+from .tex_parser import (
+    ExtractedEnvironment,
+    extract_environments,
+    extract_neighbor_context,
+    inject_guid_comments,
+)
 
 console = Console()
 
+# Source files read concurrently; bounded to keep open file descriptors modest
+MAX_READ_WORKERS = 16
+
+# Below this many files, extraction stays in-process; pool start-up would dominate
+MIN_PARALLEL_EXTRACT_FILES = 32
+
 
 class ProcessorError(Exception):
     """Exception raised during processing."""
@@ -107,6 +140,8 @@ def process_repository(
                 model=model,
                 temperature=config.llm.temperature,
                 max_tokens=config.llm.max_output_tokens,
+                prewarm=True,
+                cache=ResponseCache() if config.llm.cache_responses else None,
             )
             console.print("  [green]✓ LLM client ready[/green]")
         except Exception as e:
@@ -169,7 +204,37 @@ def process_repository(
     console.print("\n[cyan]Extracting LaTeX environments...[/cyan]")
 
     all_blocks: List[ExtractedBlock] = []
-    course_blocks: Dict[str, List[ExtractedBlock]] = {}
+    course_blocks: Dict[str, List[ExtractedBlock]] = defaultdict(list)
+
+    # Tracked GUIDs by prefix, built on the first short GUID found
+    guid_index: Optional[Dict[str, List[str]]] = None
+
+    # Match files to courses up front so only relevant files are read
+    match_course = _course_matcher(config.courses)
+    course_files = []
+    for file_path in changed_files:
+        if not file_path.endswith(".tex"):
+            continue
+
+        course_name = match_course(file_path)
+        if not course_name:
+            stats["warnings"].append(
+                f"File {file_path} doesn't match any course pattern"
+            )
+            continue
+
+        # Very large sources are almost certainly generated; skip the read
+        try:
+            size = (repo_path / file_path).stat().st_size
+        except OSError:
+            size = 0  # Reported as not found when read
+        if size > config.max_tex_bytes:
+            stats["warnings"].append(
+                f"Skipping {file_path}: {size} bytes exceeds max_tex_bytes ({config.max_tex_bytes})"
+            )
+            continue
+
+        course_files.append((file_path, course_name))
 
     with Progress(
         SpinnerColumn(),
@@ -177,79 +242,104 @@ def process_repository(
         console=console,
     ) as progress:
         task = progress.add_task("Processing files...", total=len(changed_files))
+        progress.update(task, advance=len(changed_files) - len(course_files))
 
-        for file_path in changed_files:
-            try:
-                # Determine which course this file belongs to
-                course_name = _match_file_to_course(file_path, config.courses)
-                if not course_name:
-                    stats["warnings"].append(
-                        f"File {file_path} doesn't match any course pattern"
-                    )
-                    continue
+        # Read every file up front; reads are I/O-bound and overlap in threads
+        with ThreadPoolExecutor(MAX_READ_WORKERS) as read_pool:
+            reads = [
+                read_pool.submit(_read_source, repo_path / file_path)
+                for file_path, _ in course_files
+            ]
 
-                # Read file content
-                full_path = repo_path / file_path
-                if not full_path.exists():
-                    stats["warnings"].append(f"File not found: {file_path}")
-                    continue
+        sources = []
+        for (file_path, course_name), read in zip(course_files, reads):
+            try:
+                content = read.result()
+            except UnicodeDecodeError as e:
+                stats["warnings"].append(f"Skipping {file_path}: not valid UTF-8 ({e})")
+                progress.update(task, advance=1)
+                continue
+            except Exception as e:
+                stats["errors"].append(f"Error processing {file_path}: {e}")
+                progress.update(task, advance=1)
+                continue
+            if content is None:
+                stats["warnings"].append(f"File not found: {file_path}")
+                progress.update(task, advance=1)
+                continue
+            sources.append((file_path, course_name, content))
 
-                with open(full_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+        # Regex extraction is CPU-bound, so many files are parsed across processes
+        extract_pool = (
+            ProcessPoolExecutor(mp_context=_extract_mp_context())
+            if len(sources) > MIN_PARALLEL_EXTRACT_FILES
+            else nullcontext()
+        )
 
-                # Extract environments
-                environments = extract_environments(content, config.envs_to_extract)
+        with extract_pool:
+            extractions = _extract_sources(
+                [content for _, _, content in sources],
+                config.envs_to_extract,
+                extract_pool if isinstance(extract_pool, Executor) else None,
+            )
 
-                # Convert to ExtractedBlocks and extract context if LLM enabled
-                for env in environments:
-                    block = ExtractedBlock.from_environment(env, file_path)
+            for (file_path, course_name, content), environments in zip(sources, extractions):
+                try:
+                    if isinstance(environments, Exception):
+                        raise environments
+
+                    # Convert to ExtractedBlocks and extract context if LLM enabled
+                    for env in environments:
+                        # If GUID was extracted from LaTeX (short version), match to full GUID in state
+                        matched_full_guid = None
+                        if env.guid and len(env.guid) < 40:
+                            # Short GUID extracted - match to full GUID in state
+                            if guid_index is None:
+                                guid_index = build_guid_prefix_index(state.get_all_note_guids())
+                            candidates = guid_index.get(env.guid[:GUID_PREFIX_LENGTH], [])
+                            matched_full_guid = match_short_guid_to_full(env.guid, candidates)
+                            # If no match or collision, keep generated GUID (will inject new one)
                     
-                    # If GUID was extracted from LaTeX (short version), match to full GUID in state
-                    if env.guid and len(env.guid) < 40:
-                        # Short GUID extracted - match to full GUID in state
-                        from .hashing import match_short_guid_to_full
-                        state_guids = list(state.state.get("note_hashes", {}).keys())
-                        matched_full_guid = match_short_guid_to_full(env.guid, state_guids)
-                        
-                        if matched_full_guid:
-                            # Found unique match - use full GUID
-                            block.guid = matched_full_guid
-                        # If no match or collision, keep generated GUID (will inject new one)
-                    
-                    # Extract neighbor context for LLM if enabled
-                    if use_llm:
-                        neighbor_context = extract_neighbor_context(
-                            content,
-                            env.start_line,
-                            env.end_line,
-                            total_context_lines=config.llm.neighbor_context_lines,
+                        # Extract neighbor context for LLM if enabled
+                        neighbor_context = None
+                        if use_llm:
+                            neighbor_context = extract_neighbor_context(
+                                content,
+                                env.start_line,
+                                env.end_line,
+                                total_context_lines=config.llm.neighbor_context_lines,
+                            )
+
+                        # Blocks are immutable, so the GUID and context go in at construction
+                        block = ExtractedBlock.from_environment(
+                            env,
+                            file_path,
+                            guid=matched_full_guid,
+                            neighbor_context=neighbor_context,
                         )
-                        # Store context in block for later use
-                        block.neighbor_context = neighbor_context
                     
-                    # Apply limit if specified (for testing)
-                    if limit_blocks is None or len(all_blocks) < limit_blocks:
-                        all_blocks.append(block)
-
-                        if course_name not in course_blocks:
-                            course_blocks[course_name] = []
-                        course_blocks[course_name].append(block)
+                        # Apply limit if specified (for testing)
+                        if limit_blocks is None or len(all_blocks) < limit_blocks:
+                            all_blocks.append(block)
+                            course_blocks[course_name].append(block)
                     
-                    # Stop early if limit reached
+                        # Stop early if limit reached
+                        if limit_blocks and len(all_blocks) >= limit_blocks:
+                            break
+
+                    stats["files_processed"] += 1
+                    stats["blocks_extracted"] += len(environments)
+                
+                    # Stop processing files if limit reached
                     if limit_blocks and len(all_blocks) >= limit_blocks:
+                        extractions.close()  # Cancels extractions not yet started
                         break
 
-                stats["files_processed"] += 1
-                stats["blocks_extracted"] += len(environments)
-                
-                # Stop processing files if limit reached
-                if limit_blocks and len(all_blocks) >= limit_blocks:
-                    break
+                except Exception as e:
+                    stats["errors"].append(f"Error processing {file_path}: {e}")
 
-            except Exception as e:
-                stats["errors"].append(f"Error processing {file_path}: {e}")
-
-            progress.update(task, advance=1)
+                finally:
+                    progress.update(task, advance=1)
 
     console.print(f"  Extracted {stats['blocks_extracted']} block(s)")
 
@@ -269,24 +359,36 @@ def process_repository(
 
     if use_llm and llm_client:
         # BATCH PROCESSING MODE: Process all blocks at once with LLM
-        # Collect all blocks with metadata
-        all_blocks_with_meta = []
+        # Collect blocks with metadata. Blocks sent to the LLM before with the
+        # same content and prompt settings, whose notes are all still tracked,
+        # need nothing new; only the rest are worth the tokens
+        prompt_key = _batch_prompt_key(_selection_guidance(config), config)
+        dirty_blocks_with_meta = []
         for course_name, blocks in course_blocks.items():
             course_config = config.courses[course_name]
             deck_name = course_config.deck
             priority = config.priorities.get(course_name, 1)
             
             for block in blocks:
-                all_blocks_with_meta.append({
+                if state.is_llm_block_current(
+                    block.guid, _llm_block_key(llm_client.model, prompt_key, block)
+                ):
+                    continue
+                dirty_blocks_with_meta.append({
                     "block": block,
                     "course": course_name,
                     "priority": priority,
                     "deck": deck_name
                 })
         
+        unchanged_count = len(all_blocks) - len(dirty_blocks_with_meta)
+        if unchanged_count:
+            console.print(f"  Skipping {unchanged_count} block(s) unchanged since their last LLM run")
+            stats["notes_skipped"] += unchanged_count
+
         # Call batch generation function
         note_actions = _generate_cards_batch_with_llm(
-            all_blocks_with_meta,
+            dirty_blocks_with_meta,
             llm_client,
             config,
             state,
@@ -318,34 +420,33 @@ def process_repository(
     
     else:
         # BASIC MODE: Process blocks one at a time without LLM
+        prior_hashes = state.get_content_hashes()
+
         for course_name, blocks in course_blocks.items():
             course_config = config.courses[course_name]
             deck_name = course_config.deck
             mapper = NoteMapper(course_name, current_sha)
 
-            for block in blocks:
-                # Check if note exists and has changed
-                if state.is_note_seen(block.guid):
-                    if state.has_note_changed(block.guid, block.content_hash):
+            for block, anki_note in zip(blocks, mapper.map_blocks(blocks, deck_name, prior_hashes)):
+                if isinstance(anki_note, UnchangedNote):
+                    # Unchanged since last sync: nothing to format or send
+                    stats["notes_skipped"] += 1
+                else:
+                    if block.guid in prior_hashes:
                         action = "update"
                         stats["notes_updated"] += 1
                     else:
-                        action = "skip"
-                        stats["notes_skipped"] += 1
-                else:
-                    action = "create"
-                    stats["notes_created"] += 1
+                        action = "create"
+                        stats["notes_created"] += 1
 
-                # Generate note
-                anki_note = mapper.map_block(block, deck_name)
-                anki_notes.append(anki_note)
+                    anki_notes.append(anki_note)
 
-                # Track for display
-                note_actions.append({
-                    "note": anki_note,
-                    "action": action,
-                    "block": block,
-                })
+                    # Track for display
+                    note_actions.append({
+                        "note": anki_note,
+                        "action": action,
+                        "block": block,
+                    })
 
                 stats["notes"].append({
                     "env": block.env,
@@ -386,7 +487,8 @@ def process_repository(
 
             console.print(f"[green]Created {apkg_path}[/green]")
 
-            # Update state (even in offline mode)
+            # Update state (even in offline mode), with one timestamp for the run
+            now = datetime.now().isoformat()
             for na in note_actions:
                 if na["action"] in ("create", "update"):
                     block = na["block"]
@@ -395,6 +497,8 @@ def process_repository(
                         None,  # No Anki note ID in offline mode
                         na["note"].deck_name,
                         block.content_hash,
+                        now=now,
+                        commit_sha=current_sha,
                     )
 
             state.set_last_processed_sha(current_sha)
@@ -422,116 +526,137 @@ def process_repository(
             for course_config in config.courses.values():
                 client.create_deck(course_config.deck)
 
-            # Track which blocks have had GUIDs injected (to avoid duplicates)
-            blocks_with_injected_guids = set()
+            # GUID comments to inject, per source file and block start line
+            pending_guids: Dict[str, Dict[int, str]] = defaultdict(dict)
+
+            # Notes to add, as (note, block, re-added after a missing Anki ID)
+            to_create: List[tuple] = []
+            queued_guids = set()
+            # Field updates to send, as (note, Anki note ID, fields hash)
+            pending_updates: List[tuple] = []
+
+            # Every note recorded by this sync shares one timestamp
+            now = datetime.now().isoformat()
+
+            # Per-note messages, printed once after the loop
+            duplicate_guids: List[str] = []
+            injected_counts: List[tuple] = []
+
+            # Validate new notes up front and report every rejected one together
+            validity = [
+                validate_card_content(
+                    na["note"].fields.get("Front", ""),
+                    na["note"].fields.get("Back", ""),
+                    na["note"].model_name,
+                )
+                if na["action"] == "create" else (True, "")
+                for na in note_actions
+            ]
+            _report_invalid_notes(
+                [(na, error_msg) for na, (is_valid, error_msg) in zip(note_actions, validity) if not is_valid],
+                stats,
+            )
 
             # Process notes
-            for na in note_actions:
+            for na, (is_valid, _) in zip(note_actions, validity):
                 note = na["note"]
                 action = na["action"]
                 block = na["block"]
 
+                if not is_valid:
+                    continue
+
                 if action == "create":
-                    # Validate note before sending to AnkiConnect
-                    front = note.fields.get("Front", "")
-                    back = note.fields.get("Back", "")
-                    
-                    is_valid, error_msg = validate_card_content(front, back, note.model_name)
-                    if not is_valid:
-                        console.print(f"[yellow]  Warning: Skipping invalid note from {block.file_path}:{block.line_number}[/yellow]")
-                        console.print(f"[yellow]    Reason: {error_msg}[/yellow]")
-                        console.print(f"[yellow]    Front: '{front[:50]}...' Back: '{back[:50]}...'[/yellow]")
-                        stats["warnings"].append(
-                            f"Skipped invalid note ({error_msg}): {block.file_path}:{block.line_number}"
-                        )
-                        continue
-                    
-                    # Double-check: skip if already in state (safety net)
-                    if state.is_note_seen(note.guid):
-                        console.print(f"[dim]  Skipping duplicate GUID: {note.guid[:16]}...[/dim]")
+                    # Double-check: skip if already in state or queued (safety net)
+                    if state.is_note_seen(note.guid) or note.guid in queued_guids:
+                        duplicate_guids.append(note.guid)
                         stats["notes_skipped"] += 1
                         continue
                     
-                    # Add new note
-                    anki_format = [note.to_anki_connect_format()]
-                    note_ids = client.add_notes(anki_format)
-
-                    if note_ids and note_ids[0]:
-                        # Record note with its own GUID (not block.guid)
-                        # For LLM cards, note.guid is content-based and different from block.guid
-                        state.record_note(
-                            note.guid,  # Use note's GUID, not block's
-                            note_ids[0],
-                            note.deck_name,
-                            note.content_hash,  # Use note's content hash
-                        )
-                        
-                        # Inject GUID into source file if it doesn't exist
-                        # Only inject once per block (even if multiple LLM cards)
-                        block_key = (block.file_path, block.line_number)
-                        if block_key not in blocks_with_injected_guids:
-                            full_path = repo_path / block.file_path
-                            if full_path.exists():
-                                try:
-                                    # Check if GUID comment exists in context window
-                                    with open(full_path, 'r', encoding='utf-8') as f:
-                                        lines = f.readlines()
-                                    
-                                    context_start = max(0, block.line_number - 21)
-                                    context_lines = lines[context_start:block.line_number - 1]
-                                    
-                                    import re
-                                    # Match any GUID length (8-40 chars)
-                                    guid_pattern = re.compile(r'%\s*(?:anki-tex-)?guid:\s*[a-f0-9]{8,40}', re.IGNORECASE)
-                                    has_guid = any(guid_pattern.search(line) for line in context_lines)
-                                    
-                                    if not has_guid:
-                                        # Inject GUID comment
-                                        inject_guid_comment(str(full_path), block.line_number, block.guid)
-                                        console.print(f"[dim]  ✓ Injected GUID into {block.file_path}:{block.line_number}[/dim]")
-                                        blocks_with_injected_guids.add(block_key)
-                                except Exception as e:
-                                    # Non-fatal: log but continue
-                                    stats["warnings"].append(
-                                        f"Could not inject GUID into {block.file_path}:{block.line_number}: {e}"
-                                    )
-                    else:
-                        stats["warnings"].append(
-                            f"Failed to add note for {block.file_path}:{block.line_number}"
-                        )
+                    queued_guids.add(note.guid)
+                    to_create.append((note, block, False))
 
                 elif action == "update":
                     # Update existing note
                     anki_note_id = state.get_anki_note_id(note.guid)  # Use note.guid
 
                     if anki_note_id:
-                        client.update_note_fields(anki_note_id, note.fields)
-
-                        # Add revision tag
-                        rev_tag = create_revision_tag()
-                        client.add_tags([anki_note_id], rev_tag)
-
-                        # Update state with note's GUID
-                        state.record_note(
-                            note.guid,
-                            anki_note_id,
-                            note.deck_name,
-                            note.content_hash,
-                        )
+                        # Skip the round trip if Anki already has these fields;
+                        # sent updates are recorded once Anki accepts them
+                        fields_hash = compute_fields_hash(note.fields)
+                        if fields_hash != state.get_fields_hash(note.guid):
+                            pending_updates.append((note, anki_note_id, fields_hash))
+                        else:
+                            state.record_note(
+                                note.guid,
+                                anki_note_id,
+                                note.deck_name,
+                                note.content_hash,
+                                fields_hash,
+                                now=now,
+                            )
                     else:
                         stats["warnings"].append(
                             f"Note {block.guid[:8]} has no Anki ID, treating as new"
                         )
                         # Try to add as new
-                        anki_format = [note.to_anki_connect_format()]
-                        note_ids = client.add_notes(anki_format)
-                        if note_ids and note_ids[0]:
-                            state.record_note(
-                                block.guid,
-                                note_ids[0],
-                                note.deck_name,
-                                block.content_hash,
-                            )
+                        to_create.append((note, block, True))
+
+            _send_field_updates(client, pending_updates, state, stats, now)
+
+            # Add all new notes in one request; IDs come back in input order
+            note_ids = client.add_notes([note.to_anki_connect_format() for note, *_ in to_create])
+
+            for (note, block, readded), note_id in zip(to_create, note_ids):
+                if readded:
+                    if note_id:
+                        state.record_note(
+                            block.guid,
+                            note_id,
+                            note.deck_name,
+                            block.content_hash,
+                            compute_fields_hash(note.fields),
+                            now=now,
+                            commit_sha=current_sha,
+                        )
+                elif note_id:
+                    # Record note with its own GUID (not block.guid)
+                    # For LLM cards, note.guid is content-based and different from block.guid
+                    state.record_note(
+                        note.guid,  # Use note's GUID, not block's
+                        note_id,
+                        note.deck_name,
+                        note.content_hash,  # Use note's content hash
+                        compute_fields_hash(note.fields),
+                        now=now,
+                        commit_sha=current_sha,
+                    )
+
+                    # Queue a GUID comment for the source file; only the first
+                    # note per block counts (even if multiple LLM cards)
+                    pending_guids[block.file_path].setdefault(block.line_number, block.guid)
+                else:
+                    stats["warnings"].append(
+                        f"Failed to add note for {block.file_path}:{block.line_number}"
+                    )
+
+            # Inject GUIDs into source files that don't have them yet, one
+            # rewrite per file
+            for file_path, guids_by_line in pending_guids.items():
+                full_path = repo_path / file_path
+                if not full_path.exists():
+                    continue
+                try:
+                    injected = inject_guid_comments(
+                        str(full_path), guids_by_line, update_existing=False
+                    )
+                    if injected:
+                        injected_counts.append((file_path, injected))
+                except Exception as e:
+                    # Non-fatal: log but continue
+                    stats["warnings"].append(f"Could not inject GUIDs into {file_path}: {e}")
+
+            _report_sync_summary(duplicate_guids, injected_counts)
 
             # Update state
             state.set_last_processed_sha(current_sha)
@@ -541,6 +666,8 @@ def process_repository(
 
         except AnkiConnectError as e:
             raise ProcessorError(f"AnkiConnect error: {e}") from e
+        finally:
+            client.close()
 
     return stats
 
@@ -573,21 +700,16 @@ def _generate_cards_with_llm(
         "file": block.file_path,
         "env": block.env,
         "title": block.title or "",
-        "body": strip_dangerous_latex(block.body),
-        "neighbor_context": strip_dangerous_latex(block.neighbor_context or ""),
+        "body": block.sanitized_body,
+        "neighbor_context": block.sanitized_context,
         "allow_generated": config.llm.enable_generated,
         "max_cards": config.llm.max_cards_per_block,
+        "paraphrase_strength": config.llm.paraphrase_strength,
     }
     
-    # Generate system prompt with config values
-    system_prompt = CARDS_SYSTEM_PROMPT.format(
-        max_cards=config.llm.max_cards_per_block,
-        paraphrase_strength=config.llm.paraphrase_strength
-    )
-    
     try:
         # Call LLM
-        cards = llm_client.generate_cards(system_prompt, user_payload)
+        cards = llm_client.generate_cards(CARDS_SYSTEM_PROMPT, user_payload)
         
         # Log generation to state for audit
         state.record_llm_generation(
@@ -716,6 +838,36 @@ def _create_anki_note_from_card(
     )
 
 
+def _batch_payload_entry(index: int, meta: Dict, env_upper_names: Dict[str, str]) -> Dict:
+    """
+    Build the batch payload entry describing one block.
+
+    Args:
+        index: Position of the block in the whole batch
+        meta: Block metadata with block, course and priority
+        env_upper_names: Uppercased name for each environment in the batch
+
+    Returns:
+        Payload dict sent to the LLM
+    """
+    block = meta["block"]
+    title = block.title
+    env_upper = env_upper_names[block.env]
+    return {
+        "index": index,
+        "course": meta["course"],
+        "priority": meta["priority"],
+        "env_type": env_upper,  # Prominent uppercase env type
+        "env": block.env,  # Original lowercase
+        "description": f"[{env_upper}] {title}" if title else f"[{env_upper}] (untitled)",
+        "title": title or "",
+        "body": block.sanitized_body[:5000],
+        "file": block.file_path,
+        "line": block.line_number,
+        "neighbor_context": block.sanitized_context[:2000],
+    }
+
+
 def _generate_cards_batch_with_llm(
     blocks_with_meta: List[Dict],
     llm_client: LLMClient,
@@ -726,6 +878,7 @@ def _generate_cards_batch_with_llm(
     """
     Generate cards from multiple blocks in batch mode.
     LLM sees all blocks and decides which deserve cards based on quality and priorities.
+    If the LLM request fails, every block is mapped with the basic mapper instead.
     
     Args:
         blocks_with_meta: List of dicts with block, course, priority, deck
@@ -742,59 +895,28 @@ def _generate_cards_batch_with_llm(
     
     console.print(f"[cyan]Processing {len(blocks_with_meta)} blocks in batch mode...[/cyan]")
     
-    # Build batch payload
-    batch_payload = {
-        "blocks": [],
-        "priorities": {},
-        "daily_limit": config.daily_new_limit,
-        "constraints": {
-            "max_cards_per_block": config.llm.max_cards_per_block,
-            "paraphrase_strength": config.llm.paraphrase_strength,
-        }
-    }
-    
-    for i, meta in enumerate(blocks_with_meta):
-        block = meta["block"]
-        # Create clear description with environment type prominently displayed
-        env_upper = block.env.upper()
-        description = f"[{env_upper}] {block.title}" if block.title else f"[{env_upper}] (untitled)"
-        
-        batch_payload["blocks"].append({
-            "index": i,
-            "course": meta["course"],
-            "priority": meta["priority"],
-            "env_type": env_upper,  # Prominent uppercase env type
-            "env": block.env,  # Original lowercase
-            "description": description,  # Combined description
-            "title": block.title or "",
-            "body": strip_dangerous_latex(block.body)[:5000],
-            "file": block.file_path,
-            "line": block.line_number,
-            "neighbor_context": strip_dangerous_latex(block.neighbor_context or "")[:2000]
-        })
-        batch_payload["priorities"][meta["course"]] = meta["priority"]
+    # Build one payload entry per block, indexed across the whole batch.
+    # Uppercase env names are computed once per distinct environment.
+    env_upper = {env: env.upper() for env in {meta["block"].env for meta in blocks_with_meta}}
+    payload_blocks = [
+        _batch_payload_entry(i, meta, env_upper) for i, meta in enumerate(blocks_with_meta)
+    ]
     
-    # Format batch prompt
-    # Convert conservativeness to guidance text
-    conservativeness = config.llm.selection_conservativeness
-    if conservativeness < 0.3:
-        guidance = "Be LIBERAL in selection - create cards for most blocks that have learning value. Err on the side of creating more cards."
-    elif conservativeness < 0.7:
-        guidance = "Be BALANCED in selection - select blocks with clear learning value, skip only obviously redundant content."
-    else:
-        guidance = "Be CONSERVATIVE in selection - only select the highest-value, most essential blocks."
-    
-    system_prompt = BATCH_CARDS_SYSTEM_PROMPT.format(
-        total_blocks=len(blocks_with_meta),
-        daily_limit=config.daily_new_limit,
-        max_cards_per_block=config.llm.max_cards_per_block,
-        paraphrase_strength=config.llm.paraphrase_strength,
-        selection_guidance=guidance
-    )
+    guidance = _selection_guidance(config)
     
     # Call LLM
     try:
-        response = llm_client.generate_cards_batch(system_prompt, batch_payload)
+        # The requests run on an event loop; the spinner reports chunks as they finish
+        with console.status("Waiting for LLM...") as status:
+            response = asyncio.run(_request_batch_chunks(
+                payload_blocks,
+                guidance,
+                llm_client,
+                config,
+                on_progress=lambda done, total: status.update(
+                    f"Waiting for LLM... {done}/{total} request(s) done"
+                ),
+            ))
         
         # Log response for audit
         state.record_llm_generation(
@@ -804,102 +926,509 @@ def _generate_cards_batch_with_llm(
             provider=config.llm.provider,
         )
         
-        # Parse response and create AnkiNotes
-        note_actions = []
-        selected_blocks = response.get("selected_blocks", [])
-        skipped_blocks = response.get("skipped_blocks", [])
-        
-        console.print(f"[green]✓ LLM selected {len(selected_blocks)} blocks, skipped {len(skipped_blocks)}[/green]")
-        
-        for selected in selected_blocks:
-            block_idx = selected.get("block_index")
-            if block_idx is None or block_idx >= len(blocks_with_meta):
-                continue
-                
-            meta = blocks_with_meta[block_idx]
-            block = meta["block"]
-            
-            console.print(f"[dim]  ✓ Block {block_idx}: {block.file_path}:{block.line_number} ({selected.get('reasoning', 'No reason')})[/dim]")
-            
-            for card in selected.get("cards", []):
-                note = _create_anki_note_from_card(
-                    card, block, meta["course"], meta["deck"], current_sha
-                )
-                if note:
-                    # Check if note already exists to determine action
-                    if state.is_note_seen(note.guid):
-                        if state.has_note_changed(note.guid, note.content_hash):
-                            action = "update"
-                        else:
-                            action = "skip"
-                    else:
-                        action = "create"
-                    
-                    note_actions.append({
-                        "note": note,
-                        "action": action,
-                        "block": block
-                    })
-        
-        # Log skipped blocks
-        for skipped in skipped_blocks:
-            block_idx = skipped.get("block_index")
-            reasoning = skipped.get("reasoning", "No reason provided")
-            if block_idx is not None and block_idx < len(blocks_with_meta):
-                meta = blocks_with_meta[block_idx]
-                block = meta["block"]
-                console.print(f"[dim]  Skipped block {block_idx}: {block.file_path}:{block.line_number} - {reasoning}[/dim]")
-        
-        # Show summary if available
-        summary = response.get("summary", {})
-        if summary:
-            console.print(f"\n[cyan]Batch Summary:[/cyan]")
-            console.print(f"  Total blocks: {summary.get('total_blocks', len(blocks_with_meta))}")
-            console.print(f"  Selected: {summary.get('selected_count', len(selected_blocks))}")
-            console.print(f"  Cards generated: {summary.get('total_cards', len(note_actions))}")
-            console.print(f"  Daily limit: {summary.get('daily_limit', config.daily_new_limit)}")
-            if summary.get('quality_threshold_met'):
-                console.print(f"  [green]✓ Quality threshold maintained[/green]")
-        
-        return note_actions
-        
     except Exception as e:
         console.print(f"[yellow]Batch LLM failed: {e}. Falling back to basic mapping.[/yellow]")
         # Fallback: create basic cards for all blocks
-        note_actions = []
         mapper = NoteMapper("", current_sha)  # Temporary mapper
         
+        note_actions = []
         for meta in blocks_with_meta:
             block = meta["block"]
             note = mapper.map_block(block, meta["deck"])
             note_actions.append({
                 "note": note,
-                "action": "create" if not state.is_note_seen(note.guid) else "skip",
+                "action": "skip" if state.is_note_seen(note.guid) else "create",
                 "block": block
             })
-        
         return note_actions
+    
+    # Parse response and create AnkiNotes; cards were validated by the client
+    note_actions = []
+    block_notes: Dict[str, List[str]] = defaultdict(list)
+    selected_blocks = response.get("selected_blocks", [])
+    skipped_blocks = response.get("skipped_blocks", [])
+    
+    # Per-block lines are collected and printed in one call after the loop;
+    # model-written reasoning is escaped so it can't break the markup
+    log_lines = [
+        f"[green]✓ LLM selected {len(selected_blocks)} blocks, skipped {len(skipped_blocks)}[/green]"
+    ]
+    
+    for selected in selected_blocks:
+        block_idx = selected.get("block_index")
+        if block_idx is None or block_idx >= len(blocks_with_meta):
+            continue
+            
+        meta = blocks_with_meta[block_idx]
+        block = meta["block"]
+        
+        log_lines.append(
+            f"[dim]  ✓ Block {block_idx}: {escape(f'{block.file_path}:{block.line_number}')}"
+            f" ({escape(str(selected.get('reasoning', 'No reason')))})[/dim]"
+        )
+        
+        for card in selected.get("cards", []):
+            note = _create_anki_note_from_card(
+                card, block, meta["course"], meta["deck"], current_sha
+            )
+            if note:
+                block_notes[block.guid].append(note.guid)
+                note_actions.append({
+                    "note": note,
+                    "action": state.get_note_action(note.guid, note.content_hash),
+                    "block": block
+                })
+    
+    # Log skipped blocks
+    for skipped in skipped_blocks:
+        block_idx = skipped.get("block_index")
+        reasoning = skipped.get("reasoning", "No reason provided")
+        if block_idx is not None and block_idx < len(blocks_with_meta):
+            meta = blocks_with_meta[block_idx]
+            block = meta["block"]
+            log_lines.append(
+                f"[dim]  Skipped block {block_idx}: {escape(f'{block.file_path}:{block.line_number}')}"
+                f" - {escape(str(reasoning))}[/dim]"
+            )
+    
+    # Show summary if available
+    summary = response.get("summary", {})
+    if summary:
+        log_lines += [
+            "\n[cyan]Batch Summary:[/cyan]",
+            f"  Total blocks: {summary.get('total_blocks', len(blocks_with_meta))}",
+            f"  Selected: {summary.get('selected_count', len(selected_blocks))}",
+            f"  Cards generated: {summary.get('total_cards', len(note_actions))}",
+            f"  Daily limit: {summary.get('daily_limit', config.daily_new_limit)}",
+        ]
+        if summary.get('quality_threshold_met'):
+            log_lines.append("  [green]✓ Quality threshold maintained[/green]")
+    
+    console.print("\n".join(log_lines))
+
+    # Remember which notes each block produced, so the block is not sent
+    # again while its content, the prompt settings and those notes stand.
+    # Blocks that produced no notes are sent again next time.
+    prompt_key = _batch_prompt_key(guidance, config)
+    for meta in blocks_with_meta:
+        block = meta["block"]
+        if block_notes.get(block.guid):
+            state.record_llm_block(
+                block.guid,
+                _llm_block_key(llm_client.model, prompt_key, block),
+                block_notes[block.guid],
+            )
+
+    return note_actions
+
+
+def _selection_guidance(config) -> str:
+    """Convert the configured selection conservativeness to guidance text for the prompt."""
+    conservativeness = config.llm.selection_conservativeness
+    if conservativeness < 0.3:
+        return "Be LIBERAL in selection - create cards for most blocks that have learning value. Err on the side of creating more cards."
+    if conservativeness < 0.7:
+        return "Be BALANCED in selection - select blocks with clear learning value, skip only obviously redundant content."
+    return "Be CONSERVATIVE in selection - only select the highest-value, most essential blocks."
+
+
+def _batch_prompt_key(guidance: str, config) -> str:
+    """Everything besides the blocks that shapes a batch request's answer."""
+    return "\0".join((
+        BATCH_CARDS_SYSTEM_PROMPT,
+        guidance,
+        str(config.llm.max_cards_per_block),
+        str(config.llm.paraphrase_strength),
+    ))
+
+
+def _llm_block_key(model: str, prompt_key: str, block: ExtractedBlock) -> str:
+    """Key of a block's content and the model and prompt settings it is sent with."""
+    return compute_request_key(model, prompt_key, block.content_hash)
 
 
-def _match_file_to_course(file_path: str, courses: Dict) -> Optional[str]:
+def _chunk_batch_blocks(payload_blocks: List[Dict], max_chars: int) -> List[List[Dict]]:
     """
-    Match a file path to a course based on path patterns.
+    Split batch payload blocks into chunks that each fit a single request.
 
     Args:
-        file_path: Relative file path
-        courses: Dictionary of course configurations
+        payload_blocks: Payload entries for every block, in order
+        max_chars: Approximate character budget per chunk (block text only)
+
+    Returns:
+        Consecutive, non-empty chunks of payload blocks
+    """
+    chunks: List[List[Dict]] = []
+    current: List[Dict] = []
+    current_chars = 0
+
+    for payload_block in payload_blocks:
+        size = len(payload_block["body"]) + len(payload_block["neighbor_context"])
+        if current and current_chars + size > max_chars:
+            chunks.append(current)
+            current, current_chars = [], 0
+        current.append(payload_block)
+        current_chars += size
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _request_batch_chunks(
+    payload_blocks: List[Dict],
+    guidance: str,
+    llm_client: LLMClient,
+    config,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict:
+    """
+    Run batch selection over chunks of blocks concurrently and merge the results.
+
+    Each chunk is sent as its own batch request with chunk-local block
+    indices and a share of the daily limit proportional to its size. At most
+    ``config.llm.max_concurrency`` requests are in flight at once.
+
+    When the client has a response cache, each block's outcome (selected
+    with its cards, or skipped) is cached as soon as its chunk returns, and
+    blocks with a cached outcome are not sent again. A run interrupted
+    part-way therefore only pays for the chunks that had not finished.
+    Cache writes run in worker threads so they overlap with requests still
+    in flight.
+
+    Args:
+        payload_blocks: Payload entries for every block, in order
+        guidance: Selection guidance for the system prompt
+        llm_client: LLM client
+        config: App config
+        on_progress: Called with (finished chunks, total chunks) as each
+            chunk's response arrives
+
+    Returns:
+        Merged response with selected_blocks, skipped_blocks and summary,
+        using block indices over the whole batch
+
+    Raises:
+        LLMError: If any chunk's request fails
+    """
+    total_blocks = len(payload_blocks)
+    cache = llm_client.cache
+    prompt_key = _batch_prompt_key(guidance, config)
+
+    # Outcome entries per batch index, as (response key, entry)
+    outcomes: Dict[int, List[tuple]] = defaultdict(list)
+    block_keys: Dict[int, str] = {}
+    to_request = []
+    for payload_block in payload_blocks:
+        if cache is not None:
+            key = _block_cache_key(llm_client.model, prompt_key, payload_block)
+            block_keys[payload_block["index"]] = key
+            cached = cache.get(key)
+            if cached is not None:
+                try:
+                    outcomes[payload_block["index"]].extend(
+                        (outcome_key, entry) for outcome_key, entry in json_utils.loads(cached)
+                    )
+                    continue
+                except (ValueError, TypeError):
+                    pass
+        to_request.append(payload_block)
+
+    if config.llm.chunking.mode == "off" or not to_request:
+        chunks = [to_request] if to_request else []
+    else:
+        chunks = _chunk_batch_blocks(to_request, config.llm.chunking.max_chars)
+
+    semaphore = asyncio.Semaphore(config.llm.max_concurrency)
+    finished = 0
+
+    async def request_chunk(chunk: List[Dict]) -> Dict:
+        nonlocal finished
+        daily_limit = max(1, -(-config.daily_new_limit * len(chunk) // total_blocks))
+        priorities = {}
+        blocks = []
+        for local_index, payload_block in enumerate(chunk):
+            blocks.append({**payload_block, "index": local_index})
+            priorities[payload_block["course"]] = payload_block["priority"]
+
+        batch_payload = {
+            "selection_guidance": guidance,
+            "blocks": blocks,
+            "priorities": priorities,
+            "daily_limit": daily_limit,
+            "constraints": {
+                "max_cards_per_block": config.llm.max_cards_per_block,
+                "paraphrase_strength": config.llm.paraphrase_strength,
+            }
+        }
+        async with semaphore:
+            response = await llm_client.generate_cards_batch_async(
+                BATCH_CARDS_SYSTEM_PROMPT, batch_payload
+            )
+
+        # Translate chunk-local indices back to positions in the whole batch
+        chunk_outcomes: Dict[int, List[tuple]] = defaultdict(list)
+        for outcome_key in ("selected_blocks", "skipped_blocks"):
+            for entry in response.get(outcome_key, []):
+                block_idx = entry.get("block_index") if isinstance(entry, dict) else None
+                if isinstance(block_idx, int) and 0 <= block_idx < len(chunk):
+                    entry = {k: v for k, v in entry.items() if k != "block_index"}
+                    chunk_outcomes[chunk[block_idx]["index"]].append((outcome_key, entry))
+
+        for index, entries in chunk_outcomes.items():
+            outcomes[index].extend(entries)
+        if cache is not None:
+            await asyncio.to_thread(_cache_block_outcomes, cache, block_keys, chunk_outcomes)
+
+        finished += 1
+        if on_progress is not None:
+            on_progress(finished, len(chunks))
+        return response
+
+    try:
+        responses = await asyncio.gather(*(request_chunk(chunk) for chunk in chunks))
+    finally:
+        # The SDK client is bound to this call's event loop
+        await llm_client.aclose()
+
+    merged = {"selected_blocks": [], "skipped_blocks": [], "summary": {}}
+    for index in sorted(outcomes):
+        for outcome_key, entry in outcomes[index]:
+            merged[outcome_key].append({**entry, "block_index": index})
+
+    summaries = [response["summary"] for response in responses if response.get("summary")]
+    if summaries:
+        merged["summary"] = {
+            "total_blocks": total_blocks,
+            "selected_count": len(merged["selected_blocks"]),
+            "total_cards": sum(len(s.get("cards", [])) for s in merged["selected_blocks"]),
+            "daily_limit": config.daily_new_limit,
+            "quality_threshold_met": all(s.get("quality_threshold_met") for s in summaries),
+        }
+    return merged
+
+
+def _cache_block_outcomes(
+    cache: ResponseCache, block_keys: Dict[int, str], chunk_outcomes: Dict[int, List[tuple]]
+) -> None:
+    """Store each block's batch outcome under its cache key."""
+    for index, entries in chunk_outcomes.items():
+        cache.set(block_keys[index], json_utils.dumps(entries).decode("utf-8"))
+
+
+def _block_cache_key(model: str, prompt_key: str, payload_block: Dict) -> str:
+    """Cache key for one block's batch outcome; independent of its batch position."""
+    block = {k: v for k, v in payload_block.items() if k != "index"}
+    return compute_request_key(model, prompt_key, json_utils.dumps(block).decode("utf-8"))
+
+
+def _report_invalid_notes(invalid: List[tuple], stats: Dict) -> None:
+    """
+    Print one table of notes rejected by validation and record warnings.
+
+    Args:
+        invalid: (note action, reason) pairs
+        stats: Processing statistics to append warnings to
+    """
+    if not invalid:
+        return
+
+    table = Table(title=f"Skipped {len(invalid)} invalid note(s)", title_style="yellow")
+    table.add_column("Source", style="cyan", no_wrap=True)
+    table.add_column("Reason", style="yellow")
+    table.add_column("Front")
+    table.add_column("Back")
+
+    for na, error_msg in invalid:
+        block = na["block"]
+        fields = na["note"].fields
+        table.add_row(
+            f"{block.file_path}:{block.line_number}",
+            error_msg,
+            fields.get("Front", "")[:50],
+            fields.get("Back", "")[:50],
+        )
+        stats["warnings"].append(
+            f"Skipped invalid note ({error_msg}): {block.file_path}:{block.line_number}"
+        )
+
+    console.print(table)
+
+
+def _send_field_updates(
+    client: SyncAnkiConnectClient,
+    updates: List[tuple],
+    state: StateManager,
+    stats: Dict,
+    now: str,
+) -> None:
+    """
+    Send field updates in chunked ``multi`` requests and record the accepted ones.
+
+    A failed update is reported as a warning and left out of state, so the
+    next sync sends it again; the others may already be applied in Anki and
+    are recorded. Updated notes then get the revision tag in one request.
+
+    Args:
+        client: AnkiConnect client
+        updates: (note, Anki note ID, fields hash) triples
+        state: State manager
+        stats: Processing statistics to append warnings to
+        now: ISO timestamp to record
+    """
+    if not updates:
+        return
+
+    outcomes = client.multi_settled([
+        build_action("updateNoteFields", note={"id": anki_note_id, "fields": note.fields})
+        for note, anki_note_id, _ in updates
+    ])
+
+    updated_ids = []
+    for (note, anki_note_id, fields_hash), outcome in zip(updates, outcomes):
+        if isinstance(outcome, AnkiConnectError):
+            stats["warnings"].append(f"Failed to update note {note.guid[:8]}: {outcome}")
+            continue
+        state.record_note(
+            note.guid, anki_note_id, note.deck_name, note.content_hash, fields_hash, now=now
+        )
+        updated_ids.append(anki_note_id)
+
+    if updated_ids:
+        try:
+            client.add_tags(updated_ids, create_revision_tag())
+        except AnkiConnectError as e:
+            stats["warnings"].append(f"Could not tag updated notes: {e}")
+
+
+def _report_sync_summary(duplicate_guids: List[str], injected_counts: List[tuple]) -> None:
+    """
+    Print what the sync loop skipped and wrote back to source files.
+
+    Collected during the loop and rendered once, so large syncs don't pay
+    for a terminal write per note.
+
+    Args:
+        duplicate_guids: GUIDs of new notes skipped as already seen or queued
+        injected_counts: (file path, number of GUID comments injected) pairs
+    """
+    if duplicate_guids:
+        shown = ", ".join(guid[:16] for guid in duplicate_guids[:5])
+        more = f" (+{len(duplicate_guids) - 5} more)" if len(duplicate_guids) > 5 else ""
+        console.print(
+            f"[dim]  Skipped {len(duplicate_guids)} duplicate GUID(s): {shown}{more}[/dim]"
+        )
+
+    if not injected_counts:
+        return
+
+    table = Table(title="Injected GUID comments", title_style="dim")
+    table.add_column("File", style="cyan")
+    table.add_column("GUIDs", justify="right")
+    for file_path, injected in injected_counts:
+        table.add_row(file_path, str(injected))
+
+    console.print(table)
+
+
+def _extract_mp_context() -> multiprocessing.context.BaseContext:
+    """
+    Start method for the extraction pool.
+
+    The pool starts while other threads (Rich's refresh thread among them)
+    are running, and forking a multi-threaded process can deadlock. Workers
+    come from a forkserver where available, and are spawned otherwise.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _extract_sources(
+    contents: List[str],
+    envs_to_extract: Sequence[str],
+    extract_pool: Optional[Executor] = None,
+) -> Iterator[Union[List[ExtractedEnvironment], Exception]]:
+    """
+    Extract environments from source texts, in order.
+
+    With a pool, texts are sent to the workers eight at a time; results are
+    yielded as they arrive, so callers can start on the first file early.
+
+    Args:
+        contents: Source texts
+        envs_to_extract: Environment names to extract
+        extract_pool: Process pool to run extraction in (default: this process)
 
     Returns:
-        Course name or None if no match
+        Iterator of environment lists, or the exception a text raised
+    """
+    envs = list(envs_to_extract)
+    if extract_pool is None:
+        return (_extract_or_error(content, envs) for content in contents)
+    return extract_pool.map(_extract_or_error, contents, repeat(envs), chunksize=8)
+
+
+def _extract_or_error(
+    content: str, envs_to_extract: Sequence[str]
+) -> Union[List[ExtractedEnvironment], Exception]:
+    """Extract environments, returning any error so one bad file does not end the batch."""
+    try:
+        return extract_environments(content, envs_to_extract)
+    except Exception as e:
+        return e
+
+
+def _read_source(full_path: Path) -> Optional[str]:
     """
-    # Import the fixed pattern matching from git_utils
-    from .git_utils import _filter_by_patterns
+    Read a LaTeX source file.
 
-    for course_name, course_config in courses.items():
-        # Use the fixed glob matching that supports **
-        matched = _filter_by_patterns([file_path], course_config.paths)
-        if matched:
-            return course_name
+    The whole file is decoded in one pass rather than through a text stream,
+    and line endings are normalized to ``\\n`` as text-mode reads would.
+
+    Args:
+        full_path: Absolute path to the file
+
+    Returns:
+        File content, or None if the file does not exist
+
+    Raises:
+        UnicodeDecodeError: If the file is not valid UTF-8
+    """
+    try:
+        data = full_path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+    content = data.decode("utf-8")
+
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def _course_matcher(courses: Dict) -> Callable[[str], Optional[str]]:
+    """
+    Build a function that matches a file path to a course by path patterns.
+
+    All courses' patterns are compiled into one regex, so each file costs a
+    single match no matter how many courses and patterns there are. Courses
+    are tried in configuration order.
+
+    Args:
+        courses: Dictionary of course configurations
+
+    Returns:
+        Function taking a relative file path and returning the course name,
+        or None if no course matches
+    """
+    names = list(courses)
+    fullmatch = _compile_pattern_groups(
+        tuple(tuple(course_config.paths) for course_config in courses.values())
+    ).fullmatch
 
-    return None
+    def match(file_path: str) -> Optional[str]:
+        matched = fullmatch(file_path.lstrip("./").encode("utf-8"))
+        return names[int(matched.lastgroup[1:])] if matched else None
 
+    return match
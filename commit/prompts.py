@@ -1,14 +1,22 @@
 """System prompts and formatting for LLM interactions."""
 
+import re
 from typing import Dict, Any, Tuple
 
+from . import json_utils
 
-# Card generation system prompt template
+
+# System prompts carry no per-request values, so every request starts with
+# the same bytes and providers can reuse the cached prefix; settings such as
+# max_cards travel in the user payload. format() only collapses the doubled
+# braces of the examples.
+
+# Card generation system prompt
 CARDS_SYSTEM_PROMPT = """You are a pedagogy-focused teaching assistant specializing in mathematics and physics. Your task is to convert LaTeX content into high-quality Anki flashcards that promote active recall and deep understanding.
 
 Guidelines:
-- Create up to {max_cards} flashcards per block
-- Paraphrase at strength {paraphrase_strength} (where 0 = stay close to source wording, 1 = strongly rephrase while keeping meaning)
+- Create up to "max_cards" flashcards per block (given in the input)
+- Paraphrase at the input's "paraphrase_strength" (where 0 = stay close to source wording, 1 = strongly rephrase while keeping meaning)
 - Keep mathematical notation faithful to the source
 - Make card fronts compact and focused (one concept per card)
 - Card backs should be complete but concise
@@ -69,7 +77,7 @@ LATEX RENDERING EXAMPLES (what Anki will display):
 - Write: "Recall \\\\[\\\\int_0^1 x dx = \\\\frac{{1}}{{2}}\\\\]" → Anki shows centered equation
 - WRONG: "What is x^2" → Shows literal "x^2" (not superscript)
 - RIGHT: "What is \\\\(x^2\\\\)" → Shows "x²" (rendered math)
-"""
+""".format()
 
 # Batch card generation system prompt (for processing multiple blocks at once)
 BATCH_CARDS_SYSTEM_PROMPT = """You are a pedagogy-focused teaching assistant specializing in mathematics and physics. Your task is to intelligently select which LaTeX blocks deserve flashcards based on their educational value and course priorities.
@@ -90,7 +98,7 @@ Your job is to:
 4. Select blocks for flashcard generation based on the guidance below
 5. Stay UNDER the daily limit (this is a quality threshold, not a target)
 
-SELECTION GUIDANCE: {selection_guidance}
+SELECTION GUIDANCE: follow the "selection_guidance" given in the input.
 
 Selection Criteria:
 - Core DEFINITIONS and THEOREMS (HIGH priority)
@@ -108,8 +116,8 @@ IMPORTANT:
 - **Always refer to blocks by their correct environment type** (e.g., "Important EXAMPLE..." not "Core definition..." for an example block)
 
 Guidelines per selected block:
-- Create up to {{max_cards_per_block}} flashcards
-- Paraphrase at strength {{paraphrase_strength}} (0 = literal, 1 = strongly rephrased)
+- Create up to "constraints.max_cards_per_block" flashcards (given in the input)
+- Paraphrase at the input's "constraints.paraphrase_strength" (0 = literal, 1 = strongly rephrased)
 - Keep mathematical notation faithful
 - Make card fronts compact and focused
 - Use "Basic" for Q&A, "Cloze" for fill-in-the-blank
@@ -138,10 +146,10 @@ Output Format (STRICT JSON only, no other text):
     }}
   ],
   "summary": {{
-    "total_blocks": {total_blocks},
+    "total_blocks": 4,
     "selected_count": 2,
     "total_cards": 5,
-    "daily_limit": {daily_limit},
+    "daily_limit": 3,
     "quality_threshold_met": true
   }}
 }}
@@ -152,8 +160,19 @@ CRITICAL JSON + LATEX RULES (same as before):
 - Use \\\\(...\\\\) for inline math, \\\\[...\\\\] for display math (Anki MathJax format)
 - For cloze deletions: use {{{{{{c1::text}}}}}} (6 braces for literal 3 braces in JSON)
 - Test mentally: your output must be parseable by Python's json.loads()
+- In "summary", "total_blocks" is the number of blocks received and "daily_limit" repeats the input's "daily_limit"
 
 Remember: Quality over quantity. If only 10 out of 50 blocks are truly valuable, generate cards for only those 10.
+""".format()
+
+# Appended to CARDS_SYSTEM_PROMPT when several blocks share one request
+MULTI_BLOCK_INSTRUCTIONS = """
+
+MULTIPLE BLOCKS:
+The input contains a "blocks" list. Each block has a "block_id" and the same fields as a single block.
+Generate cards for EVERY block independently, then output ONE JSON object (STRICT JSON only) of the form:
+{"results": [{"block_id": 0, "cards": [...]}, {"block_id": 1, "cards": [...]}]}
+Each "cards" list follows the card format above. Include an entry for every block_id, using an empty list if a block deserves no cards.
 """
 
 # Chat mentor system prompt
@@ -188,7 +207,10 @@ When you identify valuable insights or key concepts, you may propose Anki flashc
 The student can choose to add these cards to their collection.
 
 Current context: You have access to recent changes in the student's LaTeX notes. Use this to ask relevant, timely questions.
-"""
+""".format()
+
+# Longest diff included in the first chat message
+MAX_CHAT_DIFF_CHARS = 8000
 
 
 def format_cards_prompt(
@@ -205,13 +227,8 @@ def format_cards_prompt(
     Returns:
         Tuple of (system_prompt, user_payload)
     """
-    # Format system prompt with config values
-    system_prompt = CARDS_SYSTEM_PROMPT.format(
-        max_cards=config.max_cards_per_block,
-        paraphrase_strength=config.paraphrase_strength,
-    )
-
-    # Build user payload
+    # Build user payload; the system prompt is the same for every request
+    system_prompt = CARDS_SYSTEM_PROMPT
     user_payload = {
         "env": block.get("env", ""),
         "title": block.get("title"),
@@ -220,6 +237,7 @@ def format_cards_prompt(
         "neighbor_context": block.get("neighbor_context", ""),
         "allow_generated": config.enable_generated,
         "max_cards": config.max_cards_per_block,
+        "paraphrase_strength": config.paraphrase_strength,
     }
 
     # Add course if available
@@ -237,6 +255,11 @@ def format_chat_prompt(
     """
     Format prompts for chat mentor mode.
 
+    The system prompt is always CHAT_SYSTEM_PROMPT, unchanged, and everything
+    that varies (the diff) goes in the user message after it. Keeping the
+    static part first lets providers reuse the cached prompt prefix on every
+    turn.
+
     Args:
         config: ChatConfig object
         diff_context: Git diff or file context
@@ -252,7 +275,7 @@ def format_chat_prompt(
         initial_message = f"""Here are my recent changes:
 
 ```latex
-{diff_context[:8000]}  # Truncate very long diffs
+{_truncate_lines(diff_context, MAX_CHAT_DIFF_CHARS)}
 ```
 
 Based on these changes, what concepts should I review or practice?"""
@@ -262,6 +285,28 @@ Based on these changes, what concepts should I review or practice?"""
     return system_prompt, initial_message
 
 
+# Card proposals in chat replies: fenced JSON blocks, or a bare {"cards": [...]}
+_CHAT_JSON_BLOCK_RE = re.compile(r'```json\s*(\{.*?"cards".*?\})\s*```', re.DOTALL)
+_CHAT_INLINE_JSON_RE = re.compile(r'\{"cards"\s*:\s*\[.*?\]\s*\}', re.DOTALL)
+
+
+def _truncate_lines(text: str, max_chars: int) -> str:
+    """
+    Truncate text to whole lines of at most max_chars characters.
+
+    Args:
+        text: Text to truncate
+        max_chars: Maximum length before the truncation marker
+
+    Returns:
+        The text, or its leading whole lines followed by a truncation marker
+    """
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars + 1)
+    return text[:cut if cut > 0 else max_chars] + "\n... (truncated)"
+
+
 def extract_cards_from_chat(response_text: str) -> list:
     """
     Extract card proposals from chat response.
@@ -277,37 +322,26 @@ def extract_cards_from_chat(response_text: str) -> list:
     Returns:
         List of card dictionaries
     """
-    import json
-    import re
-
     # Look for JSON code blocks
-    json_blocks = re.findall(
-        r'```json\s*(\{.*?"cards".*?\})\s*```',
-        response_text,
-        re.DOTALL
-    )
+    json_blocks = _CHAT_JSON_BLOCK_RE.findall(response_text)
 
     cards = []
     for block in json_blocks:
         try:
-            data = json.loads(block)
+            data = json_utils.loads(block)
             if "cards" in data:
                 cards.extend(data["cards"])
-        except json.JSONDecodeError:
+        except ValueError:
             continue
 
     # Also try direct JSON (without code blocks)
     if not cards:
-        json_match = re.search(
-            r'\{"cards"\s*:\s*\[.*?\]\s*\}',
-            response_text,
-            re.DOTALL
-        )
+        json_match = _CHAT_INLINE_JSON_RE.search(response_text)
         if json_match:
             try:
-                data = json.loads(json_match.group(0))
+                data = json_utils.loads(json_match.group(0))
                 cards.extend(data.get("cards", []))
-            except json.JSONDecodeError:
+            except ValueError:
                 pass
 
     return cards
@@ -1,7 +1,13 @@
 """Security utilities for sanitizing LaTeX content before LLM processing."""
 
 import re
-from typing import List
+from typing import List, Tuple
+
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
 
 
 # Dangerous LaTeX commands that could execute code or read files
@@ -28,6 +34,41 @@ SHELL_ESCAPE_PATTERNS = [
     r"--enable-write18",
 ]
 
+# Precompiled once: a dangerous command with a braced or optional argument,
+# or standing alone, and any shell-escape flag
+_DANGEROUS_COMMAND_RE = re.compile(
+    rf"(?:{'|'.join(DANGEROUS_COMMANDS)})(?:\s*\{{[^}}]*\}}|\s*\[[^\]]*\]|\b)",
+    re.IGNORECASE,
+)
+_SHELL_ESCAPE_RE = re.compile("|".join(SHELL_ESCAPE_PATTERNS), re.IGNORECASE)
+
+# Detection only needs a yes/no scan, which RE2's automaton does in one
+# linear pass when installed; the inline flag keeps the pattern portable
+_DANGEROUS_DETECT_RE = (re2 if RE2_AVAILABLE else re).compile(
+    rf"(?i){_SHELL_ESCAPE_RE.pattern}|(?:{'|'.join(DANGEROUS_COMMANDS)})\b"
+)
+
+
+def _sanitize(content: str) -> Tuple[str, bool]:
+    """
+    Strip dangerous commands, reporting whether any were detected.
+
+    Most notes are clean: one detection scan (RE2 when installed) settles
+    them without running either substitution. Every removable command ends
+    at a word boundary, so a miss here means nothing would be stripped.
+
+    Args:
+        content: Raw LaTeX content
+
+    Returns:
+        Tuple of (sanitized_content, dangerous_detected)
+    """
+    if _DANGEROUS_DETECT_RE.search(content) is None:
+        return content, False
+
+    # Remove shell-escape flags, then dangerous commands with their arguments
+    return _DANGEROUS_COMMAND_RE.sub("", _SHELL_ESCAPE_RE.sub("", content)), True
+
 
 def strip_dangerous_latex(content: str) -> str:
     """
@@ -48,37 +89,7 @@ def strip_dangerous_latex(content: str) -> str:
         >>> strip_dangerous_latex(r"$x^2$ is \\textbf{important}")
         '$x^2$ is \\\\textbf{important}'
     """
-    sanitized = content
-
-    # Remove shell-escape flags
-    for pattern in SHELL_ESCAPE_PATTERNS:
-        sanitized = re.sub(pattern, "", sanitized, flags=re.IGNORECASE)
-
-    # Remove dangerous commands with their arguments
-    for cmd in DANGEROUS_COMMANDS:
-        # Remove command with braced argument: \cmd{...}
-        sanitized = re.sub(
-            rf"{cmd}\s*\{{[^}}]*\}}",
-            "",
-            sanitized,
-            flags=re.IGNORECASE
-        )
-        # Remove command with optional argument: \cmd[...]
-        sanitized = re.sub(
-            rf"{cmd}\s*\[[^\]]*\]",
-            "",
-            sanitized,
-            flags=re.IGNORECASE
-        )
-        # Remove standalone command
-        sanitized = re.sub(
-            rf"{cmd}\b",
-            "",
-            sanitized,
-            flags=re.IGNORECASE
-        )
-
-    return sanitized
+    return _sanitize(content)[0]
 
 
 def is_safe_latex(content: str) -> bool:
@@ -91,20 +102,7 @@ def is_safe_latex(content: str) -> bool:
     Returns:
         True if safe, False if dangerous commands detected
     """
-    content_lower = content.lower()
-
-    # Check for shell escape
-    for pattern in SHELL_ESCAPE_PATTERNS:
-        if pattern.lower() in content_lower:
-            return False
-
-    # Check for dangerous commands
-    for cmd in DANGEROUS_COMMANDS:
-        # Simple check for command name
-        if cmd.lower() in content_lower:
-            return False
-
-    return True
+    return _DANGEROUS_DETECT_RE.search(content) is None
 
 
 def get_safe_subset(content: str, max_length: int = 100000) -> str:
@@ -145,10 +143,9 @@ def validate_latex_for_llm(content: str, max_length: int = 100000) -> tuple[bool
     if len(content) > max_length * 2:  # Way too large
         return False, f"Content too large ({len(content)} chars, max {max_length})"
 
-    # Check for dangerous patterns
-    if not is_safe_latex(content):
-        # Sanitize and warn
-        sanitized = strip_dangerous_latex(content)
+    # Detect and sanitize in one pass; warn if anything was dangerous
+    sanitized, dangerous = _sanitize(content)
+    if dangerous:
         print("Warning: Dangerous LaTeX commands detected and removed")
         return True, sanitized
 
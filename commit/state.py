@@ -1,13 +1,36 @@
 """State management for tracking processed commits and notes."""
 
-import json
+import hashlib
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
+
+from . import json_utils
+
+# Journal lines replayed on load before the snapshot is rewritten in full
+JOURNAL_COMPACT_LINES = 5000
+
+
+def _response_hash(response: dict) -> str:
+    """Content address of an LLM response in the generation archive."""
+    return hashlib.blake2b(json_utils.dumps(response), digest_size=16).hexdigest()
 
 
 class StateManager:
-    """Manages persistent state for Commit."""
+    """
+    Manages persistent state for Commit.
+
+    The state file is a full snapshot. Changes made since it was written are
+    appended to a journal next to it (one JSON line per changed entry), so a
+    save costs the size of the change rather than the size of the state. The
+    journal is replayed on load and folded into the snapshot once it grows
+    past JOURNAL_COMPACT_LINES.
+
+    LLM generation logs hold whole model responses and are only read when
+    history is requested, so they live in a separate append-only archive
+    that is never parsed on the normal load path.
+    """
 
     def __init__(self, state_file: Optional[Path] = None):
         """
@@ -30,6 +53,24 @@ class StateManager:
                     print(f"Warning: Could not migrate state file: {e}")
         
         self.state_file = state_file
+        self.journal_file = state_file.with_suffix(".journal.jsonl")
+        self.llm_file = state_file.with_suffix(".llm.jsonl")
+
+        # Changes not yet saved, and whether the next save must rewrite the snapshot
+        self._pending: List[Dict] = []
+        self._rewrite = False
+        self._journal_lines = 0
+
+        # LLM generations: loaded on first use; unsaved records; archive to drop.
+        # Each distinct response is stored once and referenced by its hash
+        self._llm_generations: Optional[Dict[str, Dict]] = None
+        self._llm_blobs: Dict[str, dict] = {}
+        self._pending_llm: List[Dict] = []
+        self._clear_llm_file = False
+
+        # Creating commit SHA (None if unknown) -> note GUIDs, built on first use
+        self._commit_index: Optional[Dict[Optional[str], Set[str]]] = None
+
         self._state: Dict = self._load()
 
     def _load(self) -> Dict:
@@ -38,47 +79,222 @@ class StateManager:
             return self._default_state()
 
         try:
-            with open(self.state_file, "r", encoding="utf-8") as f:
-                state = json.load(f)
-                # Ensure required keys exist
-                if "note_hashes" not in state:
-                    state["note_hashes"] = {}
-                if "last_processed_sha" not in state:
-                    state["last_processed_sha"] = None
-                if "llm_generations" not in state:
-                    state["llm_generations"] = {}
-                return state
-        except (json.JSONDecodeError, IOError) as e:
+            state = json_utils.loads(self.state_file.read_bytes())
+            # Ensure required keys exist
+            if "note_hashes" not in state:
+                state["note_hashes"] = {}
+            if "last_processed_sha" not in state:
+                state["last_processed_sha"] = None
+            if "llm_generations" not in state:
+                state["llm_generations"] = {}
+            if "llm_blocks" not in state:
+                state["llm_blocks"] = {}
+        except (ValueError, IOError) as e:
             # If file is corrupted, start fresh
             print(f"Warning: Could not load state file: {e}")
             return self._default_state()
 
+        self._replay_journal(state)
+
+        # Older state files kept LLM generations inline; move them to the archive
+        legacy = state.pop("llm_generations")
+        if legacy:
+            for guid, entry in legacy.items():
+                self.record_llm_generation(
+                    guid, entry.get("response"), entry.get("model"),
+                    entry.get("provider"), now=entry.get("timestamp"),
+                )
+            self._rewrite = True
+        return state
+
+    def _replay_journal(self, state: Dict) -> None:
+        """
+        Apply journaled changes written since the snapshot.
+
+        A journal belongs to the snapshot whose journal_id its first line
+        names; a journal left behind by an interrupted compaction is ignored.
+        A torn last line from an interrupted append ends the replay.
+
+        Args:
+            state: Loaded snapshot, updated in place
+        """
+        try:
+            with open(self.journal_file, "rb") as f:
+                lines = f.readlines()
+        except IOError:
+            return
+
+        if not lines:
+            return
+        try:
+            header = json_utils.loads(lines[0])
+        except ValueError:
+            header = {}
+        if not state.get("journal_id") or header.get("journal_id") != state["journal_id"]:
+            self._rewrite = True
+            return
+
+        for line in lines[1:]:
+            try:
+                entry = json_utils.loads(line)
+                section = entry["section"]
+                if section == "last_processed_sha":
+                    state[section] = entry["value"]
+                elif entry["op"] == "set":
+                    state[section][entry["key"]] = entry["value"]
+                else:
+                    state[section].pop(entry["key"], None)
+            except (ValueError, KeyError, TypeError):
+                self._rewrite = True
+                break
+            self._journal_lines += 1
+
     def _default_state(self) -> Dict:
         """Create default state structure."""
         return {
             "last_processed_sha": None,
             "note_hashes": {},  # guid -> {anki_note_id, deck, content_hash, created_at, updated_at}
-            "llm_generations": {},  # guid -> {response, timestamp, model, provider}
+            "llm_blocks": {},  # block guid -> {request_key, notes} from its last LLM run
             "version": "0.2.0",
         }
 
     def save(self) -> None:
-        """Save state to file."""
+        """
+        Save state to file.
+
+        Appends the changes since the last save to the journal, or rewrites
+        the snapshot when the journal is due for compaction or a section was
+        replaced wholesale.
+        """
+        if self._clear_llm_file or self._pending_llm:
+            self._save_llm_generations()
+
+        if not self._rewrite and not self._pending and self.state_file.exists():
+            return
+
         try:
             # Ensure parent directory exists
             self.state_file.parent.mkdir(parents=True, exist_ok=True)
 
-            # Write atomically by writing to temp file first
-            temp_file = self.state_file.with_suffix(".tmp")
-            with open(temp_file, "w", encoding="utf-8") as f:
-                json.dump(self._state, f, indent=2, sort_keys=True)
-
-            # Rename to actual file (atomic on POSIX)
-            temp_file.replace(self.state_file)
+            if (
+                self._rewrite
+                or "journal_id" not in self._state
+                or not self.state_file.exists()
+                or self._journal_lines + len(self._pending) > JOURNAL_COMPACT_LINES
+            ):
+                self._write_snapshot()
+            else:
+                self._append_journal()
 
         except IOError as e:
             raise IOError(f"Failed to save state: {e}") from e
 
+        self._pending = []
+
+    def _save_llm_generations(self) -> None:
+        """Append unsaved LLM generations to the archive."""
+        try:
+            self.llm_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.llm_file, "wb" if self._clear_llm_file else "ab") as f:
+                f.write(b"".join(json_utils.dumps(entry) + b"\n" for entry in self._pending_llm))
+        except IOError as e:
+            raise IOError(f"Failed to save LLM history: {e}") from e
+
+        self._pending_llm = []
+        self._clear_llm_file = False
+
+    def _load_llm_generations(self) -> Dict[str, Dict]:
+        """
+        Read the LLM generation archive on first use.
+
+        The archive holds response blobs (``{"blob": hash, "response": ...}``)
+        and generations that reference them by ``blob_hash``. Generations
+        written before blobs existed carry their response inline and are
+        folded into the blob map as they are read.
+
+        Returns:
+            GUID -> generation info mapping, including unsaved records
+        """
+        if self._llm_generations is not None:
+            return self._llm_generations
+
+        generations: Dict[str, Dict] = {}
+        blobs: Dict[str, dict] = {}
+        lines: List[Dict] = []
+        if not self._clear_llm_file:
+            try:
+                with open(self.llm_file, "rb") as f:
+                    for line in f:
+                        try:
+                            lines.append(json_utils.loads(line))
+                        except ValueError:
+                            continue  # Torn line
+            except IOError:
+                pass
+
+        for entry in lines + self._pending_llm:
+            try:
+                if "blob" in entry:
+                    blobs[entry["blob"]] = entry["response"]
+                    continue
+                entry = dict(entry)
+                guid = entry.pop("guid")
+                if "response" in entry:
+                    response = entry.pop("response")
+                    entry["blob_hash"] = _response_hash(response)
+                    blobs[entry["blob_hash"]] = response
+                if entry["blob_hash"] in blobs:
+                    generations[guid] = entry
+            except (KeyError, TypeError, AttributeError):
+                continue  # Foreign line
+
+        self._llm_generations = generations
+        self._llm_blobs = blobs
+        return generations
+
+    def _write_snapshot(self) -> None:
+        """Rewrite the full snapshot atomically and start a new journal."""
+        # A fresh journal ID orphans the old journal before it is deleted
+        self._state["journal_id"] = uuid.uuid4().hex
+
+        # Write atomically by writing to temp file first
+        temp_file = self.state_file.with_suffix(".tmp")
+        temp_file.write_bytes(json_utils.dumps(self._state))
+
+        # Rename to actual file (atomic on POSIX)
+        temp_file.replace(self.state_file)
+
+        self.journal_file.unlink(missing_ok=True)
+        self._journal_lines = 0
+        self._rewrite = False
+
+    def _append_journal(self) -> None:
+        """Append pending changes to the journal."""
+        lines = [json_utils.dumps(entry) for entry in self._pending]
+        if self._journal_lines == 0:
+            # New journal; tie it to the snapshot it extends
+            lines.insert(0, json_utils.dumps({"journal_id": self._state["journal_id"]}))
+            mode = "wb"
+        else:
+            mode = "ab"
+
+        with open(self.journal_file, mode) as f:
+            f.write(b"\n".join(lines) + b"\n")
+        self._journal_lines += len(self._pending)
+
+    def _log(self, section: str, key: Optional[str], value=None, op: str = "set") -> None:
+        """
+        Queue a change for the journal.
+
+        Args:
+            section: Top-level state key
+            key: Entry key within the section (None for scalar sections)
+            value: New value for "set"
+            op: "set" or "delete"
+        """
+        if not self._rewrite:
+            self._pending.append({"op": op, "section": section, "key": key, "value": value})
+
     def get_last_processed_sha(self) -> Optional[str]:
         """Get the SHA of the last processed commit."""
         return self._state.get("last_processed_sha")
@@ -86,6 +302,7 @@ class StateManager:
     def set_last_processed_sha(self, sha: str) -> None:
         """Set the SHA of the last processed commit."""
         self._state["last_processed_sha"] = sha
+        self._log("last_processed_sha", None, sha)
 
     def is_note_seen(self, guid: str) -> bool:
         """Check if a note with this GUID has been seen before."""
@@ -102,11 +319,24 @@ class StateManager:
         Returns:
             True if note exists but content hash differs, False otherwise
         """
-        if not self.is_note_seen(guid):
-            return False
+        return self.get_note_action(guid, content_hash) == "update"
 
-        stored_hash = self._state["note_hashes"][guid].get("content_hash")
-        return stored_hash != content_hash
+    def get_note_action(self, guid: str, content_hash: str) -> str:
+        """
+        Decide what a sync should do with a note, in a single lookup.
+
+        Args:
+            guid: Note GUID
+            content_hash: Current content hash
+
+        Returns:
+            "create" if the note is not tracked, "update" if its content hash
+            differs from the recorded one, otherwise "skip"
+        """
+        note_info = self._state["note_hashes"].get(guid)
+        if note_info is None:
+            return "create"
+        return "skip" if note_info.get("content_hash") == content_hash else "update"
 
     def record_note(
         self,
@@ -114,6 +344,9 @@ class StateManager:
         anki_note_id: Optional[int],
         deck: str,
         content_hash: str,
+        fields_hash: Optional[str] = None,
+        now: Optional[str] = None,
+        commit_sha: Optional[str] = None,
     ) -> None:
         """
         Record a note in state.
@@ -123,8 +356,14 @@ class StateManager:
             anki_note_id: Anki note ID (None for offline mode)
             deck: Deck name
             content_hash: Content hash
+            fields_hash: Hash of the fields last sent to Anki, if known
+            now: ISO timestamp to record (default: current time); pass one
+                shared value when recording many notes at once
+            commit_sha: Commit being processed; kept for new notes as the
+                commit that created them
         """
-        now = datetime.now().isoformat()
+        if now is None:
+            now = datetime.now().isoformat()
 
         if guid in self._state["note_hashes"]:
             # Update existing
@@ -143,6 +382,15 @@ class StateManager:
                 "created_at": now,
                 "updated_at": now,
             }
+            if commit_sha is not None:
+                self._state["note_hashes"][guid]["commit_sha"] = commit_sha
+            if self._commit_index is not None:
+                self._commit_index.setdefault(commit_sha, set()).add(guid)
+
+        if fields_hash is not None:
+            self._state["note_hashes"][guid]["fields_hash"] = fields_hash
+
+        self._log("note_hashes", guid, self._state["note_hashes"][guid])
 
     def get_note_info(self, guid: str) -> Optional[Dict]:
         """
@@ -161,9 +409,55 @@ class StateManager:
         note_info = self.get_note_info(guid)
         return note_info.get("anki_note_id") if note_info else None
 
+    def get_content_hashes(self) -> Dict[str, Optional[str]]:
+        """Get a GUID -> content hash mapping for every tracked note."""
+        return {
+            guid: info.get("content_hash")
+            for guid, info in self._state["note_hashes"].items()
+        }
+
+    def get_fields_hash(self, guid: str) -> Optional[str]:
+        """Get the hash of the fields last sent to Anki for a GUID."""
+        note_info = self.get_note_info(guid)
+        return note_info.get("fields_hash") if note_info else None
+
     def clear(self) -> None:
         """Clear all state (useful for testing/debugging)."""
         self._state = self._default_state()
+        self._commit_index = None
+        self._mark_rewrite()
+        self._drop_llm_generations()
+
+    def replace_note_hashes(self, note_hashes: Dict[str, Dict]) -> None:
+        """
+        Replace every tracked note at once.
+
+        Args:
+            note_hashes: GUID -> note info mapping
+        """
+        self._state["note_hashes"] = note_hashes
+        self._commit_index = None
+        self._mark_rewrite()
+
+    def _mark_rewrite(self) -> None:
+        """Make the next save rewrite the snapshot instead of journaling."""
+        self._rewrite = True
+        self._pending = []
+
+    def export(self, pretty: bool = False) -> bytes:
+        """
+        Encode the current state, including unsaved changes, as JSON.
+
+        The state file itself is written compactly; use this to get a
+        readable copy for debugging.
+
+        Args:
+            pretty: Indent and sort keys
+
+        Returns:
+            Encoded state
+        """
+        return json_utils.dumps(self._state, pretty=pretty)
 
     def get_stats(self) -> Dict:
         """Get statistics about tracked notes."""
@@ -178,7 +472,17 @@ class StateManager:
         """Delete the state file from disk."""
         if self.state_file.exists():
             self.state_file.unlink()
+        self.journal_file.unlink(missing_ok=True)
+        self.llm_file.unlink(missing_ok=True)
         self._state = self._default_state()
+        self._commit_index = None
+        self._pending = []
+        self._llm_generations = None
+        self._llm_blobs = {}
+        self._pending_llm = []
+        self._clear_llm_file = False
+        self._journal_lines = 0
+        self._rewrite = False
 
     def record_llm_generation(
         self,
@@ -186,73 +490,137 @@ class StateManager:
         response: dict,
         model: str,
         provider: str,
+        now: Optional[str] = None,
     ) -> None:
         """
         Record an LLM generation for audit logging.
 
+        The response is stored once per distinct content; reading the
+        archive to learn which responses are already stored happens on the
+        first record.
+
         Args:
             guid: Note GUID
             response: Raw LLM JSON response
             model: Model name used
             provider: Provider name
+            now: ISO timestamp to record (default: current time)
         """
-        from datetime import datetime
-
-        self._state["llm_generations"][guid] = {
-            "response": response,
-            "timestamp": datetime.now().isoformat(),
+        generations = self._load_llm_generations()
+        blob_hash = _response_hash(response)
+        if blob_hash not in self._llm_blobs:
+            self._llm_blobs[blob_hash] = response
+            self._pending_llm.append({"blob": blob_hash, "response": response})
+
+        entry = {
+            "blob_hash": blob_hash,
+            "timestamp": now or datetime.now().isoformat(),
             "model": model,
             "provider": provider,
         }
+        self._pending_llm.append({"guid": guid, **entry})
+        generations[guid] = entry
 
     def get_llm_history(self, guid: str) -> Optional[Dict]:
         """
         Get LLM generation history for a GUID.
 
+        Reads the generation archive the first time it is called.
+
         Args:
             guid: Note GUID
 
         Returns:
             LLM generation info or None if not found
         """
-        return self._state["llm_generations"].get(guid)
+        entry = self._load_llm_generations().get(guid)
+        if entry is None:
+            return None
+        info = {"response": self._llm_blobs[entry["blob_hash"]]}
+        info.update((k, v) for k, v in entry.items() if k != "blob_hash")
+        return info
+
+    def record_llm_block(self, guid: str, request_key: str, note_guids: List[str]) -> None:
+        """
+        Record the notes an LLM run produced for a block.
+
+        Args:
+            guid: Block GUID
+            request_key: Key of the block's content and the prompt settings
+                it was sent with
+            note_guids: GUIDs of the notes generated from the block
+        """
+        entry = {"request_key": request_key, "notes": list(note_guids)}
+        self._state["llm_blocks"][guid] = entry
+        self._log("llm_blocks", guid, entry)
+
+    def is_llm_block_current(self, guid: str, request_key: str) -> bool:
+        """
+        Check whether a block's last LLM run still stands.
+
+        It does if the block was sent with the same content and prompt
+        settings and every note generated from it is still tracked, so
+        notes removed by undo or reconcile are generated again.
+
+        Args:
+            guid: Block GUID
+            request_key: Key of the block's content and current prompt settings
+
+        Returns:
+            True if the block need not be sent to the LLM again
+        """
+        entry = self._state["llm_blocks"].get(guid)
+        if not isinstance(entry, dict) or entry.get("request_key") != request_key:
+            return False  # Never sent, settings changed, or an older entry format
+        notes = entry.get("notes") or []
+        note_hashes = self._state["note_hashes"]
+        return bool(notes) and all(note_guid in note_hashes for note_guid in notes)
 
     def clear_llm_history(self) -> None:
         """Clear all LLM generation history."""
-        self._state["llm_generations"] = {}
+        self._state["llm_blocks"] = {}
+        self._mark_rewrite()
+        self._drop_llm_generations()
+
+    def _drop_llm_generations(self) -> None:
+        """Forget all LLM generations; the archive is emptied on the next save."""
+        self._llm_generations = {}
+        self._llm_blobs = {}
+        self._pending_llm = []
+        self._clear_llm_file = True
     
     def get_notes_for_commit(self, sha: str) -> List[str]:
         """
-        Get all note GUIDs that were processed in a specific commit.
-        
-        Uses the llm_generations log to find batch operations for this SHA,
-        or searches through note metadata.
-        
+        Get all note GUIDs that were created while processing a commit.
+
+        Notes recorded before creating commits were tracked have no known
+        commit and are included, since they may belong to it.
+
         Args:
             sha: Commit SHA (full or short)
-        
+
         Returns:
             List of note GUIDs from this commit
         """
-        guids = []
-        
-        # Check if there's a batch generation for this SHA
-        batch_key = f"batch_{sha}"
-        if batch_key in self._state.get("llm_generations", {}):
-            # This was a batch-processed commit
-            # We need to find notes from this commit another way
-            # since llm_generations stores the batch response, not individual GUIDs
-            pass
-        
-        # Search through all notes to find ones without a tracked creation commit
-        # This is a limitation - we don't currently track which commit created each note
-        # For now, we'll use a heuristic: notes added after the previous SHA
-        # but this isn't perfect
-        
-        # Return all current notes as a fallback
-        # TODO: Improve by adding commit_sha field to note metadata
-        return list(self._state.get("note_hashes", {}).keys())
-    
+        index = self._get_commit_index()
+        guids = set(index.get(None, ()))
+        if sha in index:
+            guids |= index[sha]
+        else:
+            for commit_sha, commit_guids in index.items():
+                if commit_sha and commit_sha.startswith(sha):
+                    guids |= commit_guids
+        return list(guids)
+
+    def _get_commit_index(self) -> Dict[Optional[str], Set[str]]:
+        """Build the commit SHA -> GUIDs index from note metadata on first use."""
+        if self._commit_index is None:
+            index: Dict[Optional[str], Set[str]] = {}
+            for guid, info in self._state["note_hashes"].items():
+                index.setdefault(info.get("commit_sha"), set()).add(guid)
+            self._commit_index = index
+        return self._commit_index
+
     def remove_notes_by_guids(self, guids: List[str]) -> int:
         """
         Remove multiple notes from state by their GUIDs.
@@ -268,7 +636,10 @@ class StateManager:
         
         for guid in guids:
             if guid in note_hashes:
-                del note_hashes[guid]
+                info = note_hashes.pop(guid)
+                if self._commit_index is not None:
+                    self._commit_index.get(info.get("commit_sha"), set()).discard(guid)
+                self._log("note_hashes", guid, op="delete")
                 removed += 1
         
         return removed
@@ -2,7 +2,7 @@
 
 import re
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 @dataclass
@@ -270,6 +270,10 @@ def get_first_sentence(text: str, max_length: int = 100) -> str:
     return truncated + "..."
 
 
+# Any GUID comment (8-40 chars); the groups split the comment prefix from the GUID
+_GUID_COMMENT_RE = re.compile(r'(%\s*(?:anki-tex-)?guid:\s*)([a-f0-9]{8,40})', re.IGNORECASE)
+
+
 def inject_guid_comment(file_path: str, line_number: int, full_guid: str) -> bool:
     """
     Inject or update a GUID comment in a LaTeX file.
@@ -290,10 +294,33 @@ def inject_guid_comment(file_path: str, line_number: int, full_guid: str) -> boo
     Raises:
         IOError: If file cannot be read or written
     """
-    from .hashing import short_hash
+    return bool(inject_guid_comments(file_path, {line_number: full_guid}))
+
+
+def inject_guid_comments(
+    file_path: str, guids_by_line: Dict[int, str], update_existing: bool = True
+) -> int:
+    """
+    Inject GUID comments for several environments in one file.
+    
+    The file is read and written at most once. Comments are applied from the
+    bottom of the file up, so inserting one never shifts the line numbers of
+    environments still to be handled.
     
-    # Use shortened version for readability in LaTeX source
-    short_guid = short_hash(full_guid, length=12)
+    Args:
+        file_path: Path to the LaTeX file
+        guids_by_line: Full GUID per environment start line (1-indexed)
+        update_existing: If False, environments that already have a GUID
+            comment in their context window are left untouched
+    
+    Returns:
+        Number of comments inserted or updated
+    
+    Raises:
+        IOError: If file cannot be read or written
+        ValueError: If a line number is outside the file
+    """
+    from .hashing import short_hash
     from pathlib import Path
     
     path = Path(file_path)
@@ -304,46 +331,48 @@ def inject_guid_comment(file_path: str, line_number: int, full_guid: str) -> boo
     with open(path, 'r', encoding='utf-8') as f:
         lines = f.readlines()
     
-    # Convert to 0-indexed
-    target_idx = line_number - 1
+    for line_number in guids_by_line:
+        if not 0 < line_number <= len(lines):
+            raise ValueError(f"Line {line_number} out of range (file has {len(lines)} lines)")
     
-    if target_idx < 0 or target_idx >= len(lines):
-        raise ValueError(f"Line {line_number} out of range (file has {len(lines)} lines)")
+    modified = 0
+    for line_number in sorted(guids_by_line, reverse=True):
+        # Use shortened version for readability in LaTeX source
+        short_guid = short_hash(guids_by_line[line_number], length=12)
+        if _apply_guid_comment(lines, line_number - 1, short_guid, update_existing):
+            modified += 1
     
+    # Write back
+    if modified:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+    
+    return modified
+
+
+def _apply_guid_comment(
+    lines: List[str], target_idx: int, short_guid: str, update_existing: bool
+) -> bool:
+    """Insert or update the GUID comment above lines[target_idx] in place."""
     # Check if GUID already exists in context window (up to 20 lines before)
     context_start = max(0, target_idx - 20)
-    context_lines = lines[context_start:target_idx]
-    
-    # Match any GUID length (8-40 chars) for finding existing comments
-    guid_pattern = re.compile(r'%\s*(?:anki-tex-)?guid:\s*[a-f0-9]{8,40}', re.IGNORECASE)
-    # Pattern for updating (captures comment prefix, replaces GUID)
-    guid_comment_pattern = re.compile(r'(%\s*(?:anki-tex-)?guid:\s*)([a-f0-9]{8,40})', re.IGNORECASE)
-    
-    modified = False
     
     # Check if GUID exists and update it
-    for i in range(len(context_lines) - 1, -1, -1):
-        line = context_lines[i]
-        if guid_pattern.search(line):
+    for actual_idx in range(target_idx - 1, context_start - 1, -1):
+        line = lines[actual_idx]
+        if _GUID_COMMENT_RE.search(line):
+            if not update_existing:
+                return False
             # GUID exists, update it with shortened version
-            new_line = guid_comment_pattern.sub(rf'\1{short_guid}', line.rstrip('\n'))
-            actual_idx = context_start + i
-            if lines[actual_idx].rstrip('\n') != new_line:
+            new_line = _GUID_COMMENT_RE.sub(rf'\g<1>{short_guid}', line.rstrip('\n'))
+            if line.rstrip('\n') != new_line:
                 lines[actual_idx] = new_line + '\n'
-                modified = True
-            return modified
+                return True
+            return False
     
     # No GUID found, insert new comment right before \begin
-    comment = f"% anki-tex-guid: {short_guid}\n"
-    lines.insert(target_idx, comment)
-    modified = True
-    
-    # Write back
-    if modified:
-        with open(path, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
-    
-    return modified
+    lines.insert(target_idx, f"% anki-tex-guid: {short_guid}\n")
+    return True
 
 
 def extract_neighbor_context(
@@ -89,10 +89,7 @@ $d: M \times M \to \mathbb{R}$ satisfying:
     }
     
     # Format prompt
-    system_prompt = CARDS_SYSTEM_PROMPT.format(
-        max_cards=3,
-        paraphrase_strength=0.6
-    )
+    system_prompt = CARDS_SYSTEM_PROMPT
     
     user_payload = {
         "env": test_block["env"],
@@ -0,0 +1,278 @@
+"""Tests for anki_connect module."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+import respx
+
+from commit.anki_connect import (
+    BATCH_SIZE,
+    AnkiConnectClient,
+    AnkiConnectError,
+    SyncAnkiConnectClient,
+    build_action,
+)
+from commit.hashing import compute_fields_hash
+
+ANKI_URL = "http://127.0.0.1:8765"
+
+
+class TestConnectionReuse:
+    """Tests for the shared HTTP client."""
+
+    def test_client_reused_across_calls(self):
+        """Test that consecutive invocations share one AsyncClient."""
+        with respx.mock:
+            respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={"result": 6, "error": None})
+            )
+            client = SyncAnkiConnectClient()
+
+            client.check_connection()
+            first = client.client._client
+            client.check_connection()
+
+            assert first is not None
+            assert client.client._client is first
+            client.close()
+
+    def test_close_releases_client(self):
+        """Test that closing drops the shared client."""
+        with respx.mock:
+            respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={"result": 6, "error": None})
+            )
+            with SyncAnkiConnectClient() as client:
+                client.check_connection()
+
+            assert client.client._client is None
+
+    def test_response_parsed_from_raw_bytes(self):
+        """Test that UTF-8 response bodies are decoded straight from bytes."""
+        body = '{"result": [{"fields": {"Front": {"value": "\u00e6\u00f8\u00e5 \u2200x"}}}], "error": null}'
+        with respx.mock:
+            respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, content=body.encode("utf-8"))
+            )
+            with SyncAnkiConnectClient() as client:
+                infos = client.notes_info([1])
+
+        assert infos[0]["fields"]["Front"]["value"] == "æøå ∀x"
+
+    def test_api_error_not_rewrapped(self):
+        """Test that AnkiConnect errors propagate with their original message."""
+        with respx.mock:
+            respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={"result": None, "error": "boom"})
+            )
+            with SyncAnkiConnectClient() as client:
+                with pytest.raises(AnkiConnectError, match="^AnkiConnect error: boom$"):
+                    client.find_notes("deck:x")
+
+
+class TestMulti:
+    """Tests for multi-action batching."""
+
+    def test_multi_unwraps_results(self):
+        """Test that multi returns each action's result in order."""
+        with respx.mock:
+            route = respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={
+                    "result": [
+                        {"result": None, "error": None},
+                        {"result": [1, 2], "error": None},
+                    ],
+                    "error": None,
+                })
+            )
+            with SyncAnkiConnectClient() as client:
+                results = client.multi([
+                    build_action("addTags", notes=[1], tags="x"),
+                    build_action("findNotes", query="tag:x"),
+                ])
+
+            assert results == [None, [1, 2]]
+            assert route.call_count == 1
+
+    def test_short_response_raises(self):
+        """Test that a multi response without a result per action is an error."""
+        with respx.mock:
+            respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={"result": None, "error": None})
+            )
+            with SyncAnkiConnectClient() as client:
+                with pytest.raises(AnkiConnectError, match="0 results for 2 actions"):
+                    client.multi([build_action("version"), build_action("version")])
+
+    def test_queue_and_flush(self):
+        """Test that queued actions resolve from a single multi request."""
+        async def run():
+            async with AnkiConnectClient() as client:
+                first = client.queue_action("findNotes", query="a")
+                second = client.queue_action("findNotes", query="b")
+                await client.flush()
+                return await first, second
+
+        with respx.mock:
+            route = respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={
+                    "result": [
+                        {"result": [1], "error": None},
+                        {"result": None, "error": "bad query"},
+                    ],
+                    "error": None,
+                })
+            )
+            first_result, second = asyncio.run(run())
+
+        assert route.call_count == 1
+        assert first_result == [1]
+        assert isinstance(second.exception(), AnkiConnectError)
+
+    @pytest.mark.parametrize("response", [
+        httpx.Response(200, json={"result": None, "error": None}),
+        httpx.Response(200, json={"result": [{"result": 1, "error": None}], "error": None}),
+        httpx.Response(500),
+    ])
+    def test_flush_failure_rejects_every_future(self, response):
+        """Test that a failed or short multi response leaves no future pending."""
+        async def run():
+            async with AnkiConnectClient() as client:
+                futures = [client.queue_action("version") for _ in range(2)]
+                with pytest.raises(AnkiConnectError):
+                    await client.flush()
+                return futures, client._queue
+
+        with respx.mock:
+            respx.post(ANKI_URL).mock(return_value=response)
+            futures, queue = asyncio.run(run())
+
+        assert queue == []
+        assert all(isinstance(f.exception(), AnkiConnectError) for f in futures)
+
+    def test_multi_settled_reports_errors_per_action(self):
+        """Test that chunks are sent separately and failures fill only their own slots."""
+        def respond(request):
+            actions = json.loads(request.content)["params"]["actions"]
+            if actions[0]["params"]["query"] == "fail":
+                return httpx.Response(500)
+            return httpx.Response(200, json={
+                "result": [
+                    {"result": None, "error": "bad"} if a["params"]["query"] == "bad"
+                    else {"result": [1], "error": None}
+                    for a in actions
+                ],
+                "error": None,
+            })
+
+        queries = ["ok", "bad"] + ["ok"] * (BATCH_SIZE - 2) + ["fail", "ok"]
+        with respx.mock:
+            route = respx.post(ANKI_URL).mock(side_effect=respond)
+            with SyncAnkiConnectClient() as client:
+                outcomes = client.multi_settled(
+                    [build_action("findNotes", query=q) for q in queries]
+                )
+
+        assert route.call_count == 2
+        assert outcomes[0] == [1]
+        assert isinstance(outcomes[1], AnkiConnectError)
+        assert outcomes[2:BATCH_SIZE] == [[1]] * (BATCH_SIZE - 2)
+        assert all(isinstance(o, AnkiConnectError) for o in outcomes[BATCH_SIZE:])
+
+class TestInvokeMany:
+    """Tests for concurrent fan-out."""
+
+    def test_find_notes_by_guid_merges_prefixes(self):
+        """Test that lookups for several prefixes are merged and deduplicated."""
+        def respond(request):
+            query = json.loads(request.content)["params"]["query"]
+            ids = {"tag:guid:aaa*": [1, 2], "tag:guid:bbb*": [2, 3]}[query]
+            return httpx.Response(200, json={"result": ids, "error": None})
+
+        async def run():
+            async with AnkiConnectClient() as client:
+                return await client.find_notes_by_guid(["aaa", "bbb"], max_workers=2)
+
+        with respx.mock:
+            respx.post(ANKI_URL).mock(side_effect=respond)
+            assert asyncio.run(run()) == [1, 2, 3]
+
+
+class TestUpdateNoteFields:
+    """Tests for fields-hash short-circuiting."""
+
+    def test_unchanged_fields_skip_request(self):
+        """Test that a matching known hash skips the HTTP call."""
+        fields = {"Front": "Q", "Back": "A"}
+        with respx.mock:
+            route = respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={"result": None, "error": None})
+            )
+            with SyncAnkiConnectClient() as client:
+                skipped = client.update_note_fields(1, fields, compute_fields_hash(fields))
+                sent = client.update_note_fields(1, fields, "stale")
+
+        assert skipped is False
+        assert sent is True
+        assert route.call_count == 1
+
+
+class TestSyncEventLoop:
+    """Tests for the sync wrapper's cached event loop."""
+
+    def test_loop_reused_until_close(self):
+        """Test that calls share one loop and close() shuts it down."""
+        with respx.mock:
+            respx.post(ANKI_URL).mock(
+                return_value=httpx.Response(200, json={"result": 6, "error": None})
+            )
+            client = SyncAnkiConnectClient()
+            client.check_connection()
+            loop = client._loop
+            client.check_connection()
+
+            assert client._loop is loop
+            client.close()
+            assert loop.is_closed()
+            assert client._loop is None
+
+
+class TestBatching:
+    """Tests for splitting large requests into chunks."""
+
+    def test_notes_info_chunks_preserve_order(self):
+        """Test that large notesInfo lookups are chunked and reassembled in order."""
+        def respond(request):
+            ids = json.loads(request.content)["params"]["notes"]
+            return httpx.Response(
+                200, json={"result": [{"noteId": i} for i in ids], "error": None}
+            )
+
+        note_ids = list(range(BATCH_SIZE * 2 + 5))
+        with respx.mock:
+            route = respx.post(ANKI_URL).mock(side_effect=respond)
+            with SyncAnkiConnectClient() as client:
+                infos = client.notes_info(note_ids)
+
+        assert [info["noteId"] for info in infos] == note_ids
+        assert route.call_count == 3
+
+    def test_add_notes_missing_chunk_keeps_alignment(self):
+        """Test that a chunk returning None yields None slots without shifting later IDs."""
+        def respond(request):
+            notes = json.loads(request.content)["params"]["notes"]
+            if notes[0]["id"] == 0:
+                return httpx.Response(200, json={"result": None, "error": None})
+            return httpx.Response(
+                200, json={"result": [n["id"] for n in notes], "error": None}
+            )
+
+        notes = [{"id": i} for i in range(BATCH_SIZE + 5)]
+        with respx.mock:
+            respx.post(ANKI_URL).mock(side_effect=respond)
+            with SyncAnkiConnectClient() as client:
+                note_ids = client.add_notes(notes)
+
+        assert note_ids == [None] * BATCH_SIZE + list(range(BATCH_SIZE, BATCH_SIZE + 5))
@@ -0,0 +1,30 @@
+"""Tests for config module."""
+
+import pytest
+from pydantic import ValidationError
+
+from commit.config import AppConfig
+
+
+class TestRenderTags:
+    """Tests for precompiled tag templates."""
+
+    def test_default_templates(self):
+        """Test rendering the default tag templates."""
+        config = AppConfig(courses={})
+
+        tags = config.render_tags(sha="abc123", file="math_ch1_tex")
+
+        assert tags == ["auto", "from-tex", "commit:abc123", "file:math_ch1_tex"]
+
+    def test_missing_value(self):
+        """Test that an unknown placeholder raises KeyError."""
+        config = AppConfig(courses={}, tags=["course:{course}"])
+
+        with pytest.raises(KeyError):
+            config.render_tags(sha="abc123")
+
+    def test_invalid_template_rejected(self):
+        """Test that malformed templates fail at config load."""
+        with pytest.raises(ValidationError):
+            AppConfig(courses={}, tags=["commit:{sha"])
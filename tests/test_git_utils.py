@@ -3,8 +3,13 @@
 import pytest
 from pathlib import Path
 
+from git import Repo
+
 from commit.git_utils import (
     GitError,
+    get_changed_files,
+    get_file_at_commit,
+    get_file_bytes_at_commit,
     get_repo,
     _filter_by_patterns,
 )
@@ -62,6 +67,33 @@ class TestFilterByPatterns:
 
         assert len(result) == 2  # All files returned when no patterns
 
+    def test_doublestar_in_middle(self):
+        """Test ** between path segments matches zero or more directories."""
+        files = ["a/b.tex", "a/x/b.tex", "a/x/y/b.tex", "a/x/c.tex"]
+        patterns = ["a/**/b.tex"]
+
+        result = _filter_by_patterns(files, patterns)
+
+        assert result == ["a/b.tex", "a/x/b.tex", "a/x/y/b.tex"]
+
+    def test_question_mark_matches_non_ascii_character(self):
+        """Test that ? matches one whole non-ASCII character."""
+        files = ["æ.tex", "ab.tex", "notes/ø.tex"]
+        patterns = ["?.tex", "notes/?.tex"]
+
+        result = _filter_by_patterns(files, patterns)
+
+        assert result == ["æ.tex", "notes/ø.tex"]
+
+    def test_regex_characters_are_literal(self):
+        """Test that regex metacharacters in patterns match literally."""
+        files = ["c++(1).tex", "cc(1).tex", "notes{1}.tex"]
+        patterns = ["c++(1).tex", "notes{1}.tex"]
+
+        result = _filter_by_patterns(files, patterns)
+
+        assert result == ["c++(1).tex", "notes{1}.tex"]
+
 
 class TestGetRepo:
     """Tests for get_repo function."""
@@ -72,17 +104,101 @@ class TestGetRepo:
             get_repo(Path("/nonexistent/path"))
 
 
-# Note: Testing actual Git operations would require setting up test repositories.
-# For a full test suite, you'd want to use pytest fixtures to create temporary
-# Git repos with test commits. Example:
-#
-# @pytest.fixture
-# def test_repo(tmp_path):
-#     repo = Repo.init(tmp_path)
-#     # Create test files and commits
-#     return tmp_path
-#
-# def test_get_changed_files(test_repo):
-#     # Test with actual repo
-#     pass
+@pytest.fixture
+def test_repo(tmp_path):
+    """Create a temporary Git repository with two commits."""
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as cw:
+        cw.set_value("user", "name", "Test")
+        cw.set_value("user", "email", "test@example.com")
+
+    (tmp_path / "math").mkdir()
+    (tmp_path / "math" / "ch1.tex").write_text("one\n")
+    (tmp_path / "math" / "old.tex").write_text("old\n")
+    (tmp_path / "README.md").write_text("readme\n")
+    repo.index.add(["math/ch1.tex", "math/old.tex", "README.md"])
+    repo.index.commit("initial")
+
+    (tmp_path / "math" / "ch1.tex").write_text("one changed\n")
+    (tmp_path / "math" / "ch2.tex").write_text("two\n")
+    repo.index.add(["math/ch1.tex", "math/ch2.tex"])
+    repo.index.remove(["math/old.tex"], working_tree=True)
+    repo.index.commit("second")
+
+    return tmp_path
+
+
+class TestGetChangedFiles:
+    """Tests for get_changed_files against a real repository."""
 
+    def test_head_commit_diff(self, test_repo):
+        """Test that HEAD changes exclude deleted and non-.tex files."""
+        result = get_changed_files(test_repo)
+
+        assert sorted(result) == ["math/ch1.tex", "math/ch2.tex"]
+
+    def test_since_sha_diff(self, test_repo):
+        """Test diffing from an earlier commit to HEAD."""
+        repo = Repo(test_repo)
+        initial = repo.head.commit.parents[0].hexsha
+
+        assert sorted(get_changed_files(test_repo, since_sha=initial)) == [
+            "math/ch1.tex",
+            "math/ch2.tex",
+        ]
+
+    def test_same_commit_is_empty(self, test_repo):
+        """Test that diffing HEAD against itself returns nothing."""
+        head = Repo(test_repo).head.commit.hexsha
+
+        assert get_changed_files(test_repo, since_sha=head) == []
+
+    def test_path_patterns_as_pathspecs(self, test_repo):
+        """Test that glob patterns are applied by git."""
+        (test_repo / "other").mkdir()
+        (test_repo / "other" / "x.tex").write_text("x\n")
+        repo = Repo(test_repo)
+        repo.index.add(["other/x.tex"])
+        repo.index.commit("third")
+
+        initial = repo.head.commit.parents[0].parents[0].hexsha
+        result = get_changed_files(test_repo, since_sha=initial, path_patterns=["math/**/*.tex"])
+
+        assert sorted(result) == ["math/ch1.tex", "math/ch2.tex"]
+
+    def test_path_patterns_regex_fallback(self, test_repo):
+        """Test that patterns git cannot express fall back to regex filtering."""
+        result = get_changed_files(test_repo, path_patterns=["math/ch[12].tex"])
+
+        assert result == []  # brackets are literal in our glob syntax
+
+    def test_literal_pattern_not_directory_prefix(self, test_repo):
+        """Test that a pattern without wildcards matches only that exact path."""
+        assert get_changed_files(test_repo, path_patterns=["math"]) == []
+        assert get_changed_files(test_repo, path_patterns=["math/ch1.tex"]) == ["math/ch1.tex"]
+
+    def test_initial_commit_lists_all_files(self, tmp_path):
+        """Test that a repository's first commit lists every tracked file."""
+        repo = Repo.init(tmp_path)
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "a.tex").write_text("a\n")
+        (tmp_path / "b.tex").write_text("b\n")
+        repo.index.add(["sub/a.tex", "b.tex"])
+        repo.index.commit("initial")
+
+        assert sorted(get_changed_files(tmp_path)) == ["b.tex", "sub/a.tex"]
+
+
+class TestGetFileAtCommit:
+    """Tests for reading file contents at a commit."""
+
+    def test_text_and_bytes(self, test_repo):
+        """Test decoded and raw reads of the same blob."""
+        assert get_file_at_commit(test_repo, "math/ch1.tex") == "one changed\n"
+        assert get_file_bytes_at_commit(test_repo, "math/ch1.tex") == b"one changed\n"
+        assert get_file_at_commit(test_repo, "math/ch1.tex", binary=True) == b"one changed\n"
+
+    def test_missing_file(self, test_repo):
+        """Test that a path absent from the commit raises GitError."""
+        with pytest.raises(GitError):
+            get_file_bytes_at_commit(test_repo, "math/old.tex")
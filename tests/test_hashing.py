@@ -3,10 +3,13 @@
 import pytest
 
 from commit.hashing import (
+    build_guid_prefix_index,
     compute_guid,
     compute_content_hash,
+    compute_fields_hash,
     short_hash,
     compute_block_signature,
+    match_short_guid_to_full,
 )
 
 
@@ -79,6 +82,25 @@ class TestComputeContentHash:
         assert hash1 != hash2
 
 
+class TestComputeFieldsHash:
+    """Tests for compute_fields_hash function."""
+
+    def test_order_independent(self):
+        """Test that field order does not affect the hash."""
+        hash1 = compute_fields_hash({"Front": "Q", "Back": "A"})
+        hash2 = compute_fields_hash({"Back": "A", "Front": "Q"})
+
+        assert hash1 == hash2
+
+    def test_field_boundaries(self):
+        """Test that moving text between fields changes the hash."""
+        hash1 = compute_fields_hash({"Front": "AB", "Back": ""})
+        hash2 = compute_fields_hash({"Front": "A", "Back": "B"})
+
+        assert hash1 != hash2
+        assert len(hash1) == 32
+
+
 class TestShortHash:
     """Tests for short_hash function."""
 
@@ -121,3 +143,19 @@ class TestComputeBlockSignature:
         assert "lemma[Main Lemma]" in sig
         assert "@file.tex:5" in sig
 
+
+
+class TestGuidPrefixIndex:
+    """Tests for short-GUID lookup through the prefix index."""
+
+    def test_candidates_match_full_scan(self):
+        """Test that matching against indexed candidates equals scanning all GUIDs."""
+        guids = [compute_guid("definition", str(i), "a.tex") for i in range(200)]
+        guids.append(guids[0][:12] + "0" * 28)  # Collides with guids[0] on 12 chars
+        index = build_guid_prefix_index(guids)
+
+        for short in (guids[0][:12], guids[1][:12], guids[2][:8], "ffffffffffff"):
+            candidates = index.get(short[:8], [])
+            assert match_short_guid_to_full(short, candidates) == match_short_guid_to_full(
+                short, guids
+            )
@@ -0,0 +1,37 @@
+"""Tests for llm_cache module."""
+
+from commit.llm_cache import ResponseCache, compute_request_key
+from tests.test_llm_client import FakeClient
+
+
+class TestResponseCache:
+    """Tests for the exact-match response cache."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that stored responses are returned and misses give None."""
+        cache = ResponseCache(tmp_path)
+        key = compute_request_key("m", "sys", "user")
+
+        assert cache.get(key) is None
+        cache.set(key, '{"cards": []}')
+        assert cache.get(key) == '{"cards": []}'
+
+    def test_key_depends_on_all_parts(self):
+        """Test that model, prompt and payload all change the key."""
+        base = compute_request_key("m", "sys", "user")
+
+        assert base != compute_request_key("m2", "sys", "user")
+        assert base != compute_request_key("m", "sys2", "user")
+        assert base != compute_request_key("m", "sys", "user2")
+        assert base != compute_request_key("ms", "ys", "user")
+
+    def test_client_hit_skips_api(self, tmp_path):
+        """Test that a repeated generate_cards call is served from the cache."""
+        client = FakeClient(['{"cards": [{"front": "Q"}]}'])
+        client.cache = ResponseCache(tmp_path)
+
+        first = client.generate_cards("SYS", {"body": "x"})
+        second = client.generate_cards("SYS", {"body": "x"})
+
+        assert first == second == [{"front": "Q"}]
+        assert len(client.calls) == 1
@@ -0,0 +1,345 @@
+"""Tests for llm_client module."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from commit import llm_client
+from commit.llm_client import (
+    LLMClient,
+    LLMError,
+    _find_json_object,
+    _get_http_client,
+    _parse_json_stream,
+    _strip_code_fence,
+    _validate_cards,
+)
+
+
+class FakeClient(LLMClient):
+    """LLM client that returns canned responses instead of calling an API."""
+
+    def __init__(self, responses):
+        super().__init__(model="fake")
+        self.responses = list(responses)
+        self.calls = []
+
+    def _call_api(self, system_prompt: str, user_content: str) -> str:
+        self.calls.append((system_prompt, user_content))
+        return self.responses.pop(0)
+
+
+class TestGenerateCardsMulti:
+    """Tests for packing several blocks into one request."""
+
+    def test_results_mapped_by_block_id(self):
+        """Test that cards are returned in payload order, keyed by block_id."""
+        response = json.dumps({"results": [
+            {"block_id": 1, "cards": [{"front": "B?"}]},
+            {"block_id": 0, "cards": [{"front": "A?"}]},
+        ]})
+        client = FakeClient([response])
+
+        result = client.generate_cards_multi("SYS", [{"body": "a"}, {"body": "b"}])
+
+        assert result == [[{"front": "A?"}], [{"front": "B?"}]]
+        assert len(client.calls) == 1
+        sent = json.loads(client.calls[0][1])
+        assert [b["block_id"] for b in sent["blocks"]] == [0, 1]
+
+    def test_missing_and_unparseable(self):
+        """Test that missing blocks and bad output yield empty lists."""
+        client = FakeClient([
+            '```json\n{"results": [{"block_id": 0, "cards": []}]}\n```',
+            "not json at all",
+        ])
+
+        assert client.generate_cards_multi("SYS", [{}, {}]) == [[], []]
+        assert client.generate_cards_multi("SYS", [{}]) == [[]]
+
+
+class TestAsyncBatch:
+    """Tests for the submit/poll batch flow."""
+
+    def test_generate_cards_async_batch(self):
+        """Test polling until the batch finishes and parsing each result."""
+        class BatchClient(FakeClient):
+            def submit_batch(self, system_prompt, payloads):
+                self.submitted = payloads
+                return "batch-1"
+
+            def poll_batch(self, batch_id):
+                return self.responses.pop(0)
+
+        client = BatchClient([
+            None,
+            {"a": '{"cards": [{"front": "Q?"}]}'},
+        ])
+
+        result = client.generate_cards_async_batch(
+            "SYS", {"a": {"body": "x"}, "b": {"body": "y"}}, poll_interval=0
+        )
+
+        assert result == {"a": [{"front": "Q?"}], "b": []}
+
+
+class TestFindJsonObject:
+    """Tests for extracting a JSON object from surrounding text."""
+
+    def test_braces_inside_strings_ignored(self):
+        """Test that braces and escaped quotes in strings do not end the object."""
+        text = 'Here you go:\n```json\n{"cards": [{"front": "\\\\frac{a}{b} \\" }"}]}\n```\nDone {'
+
+        assert json.loads(_find_json_object(text)) == {
+            "cards": [{"front": '\\frac{a}{b} " }'}]
+        }
+
+    def test_unbalanced_returns_none(self):
+        """Test that truncated output yields None."""
+        assert _find_json_object('{"cards": [') is None
+        assert _find_json_object("no json here") is None
+
+    def test_parse_json_response_with_prose(self):
+        """Test that card parsing recovers JSON wrapped in prose."""
+        client = FakeClient([])
+
+        cards = client._parse_json_response('Sure! {"cards": [{"front": "Q"}]} Hope this helps.')
+
+        assert cards == [{"front": "Q"}]
+
+
+class TestSharedHttpClient:
+    """Tests for the pooled HTTP client shared by SDK clients."""
+
+    def test_client_is_shared(self):
+        """Test that every caller gets the same connection pool."""
+        assert _get_http_client() is _get_http_client()
+
+
+class TestGenerateCardsConcurrent:
+    """Tests for concurrent card generation."""
+
+    def test_order_preserved_and_concurrency_bounded(self):
+        """Test that results follow payload order and the semaphore caps in-flight calls."""
+        class SlowClient(FakeClient):
+            in_flight = 0
+            peak = 0
+
+            async def _call_api_async(self, system_prompt, user_content):
+                SlowClient.in_flight += 1
+                SlowClient.peak = max(SlowClient.peak, SlowClient.in_flight)
+                index = json.loads(user_content)["i"]
+                await asyncio.sleep(0.01 * (5 - index))
+                SlowClient.in_flight -= 1
+                return json.dumps({"cards": [{"front": str(index)}]})
+
+        client = SlowClient([])
+        payloads = [{"i": i} for i in range(5)]
+
+        results = asyncio.run(
+            client.generate_cards_concurrent("SYS", payloads, max_concurrency=2)
+        )
+
+        assert [cards[0]["front"] for cards in results] == ["0", "1", "2", "3", "4"]
+        assert SlowClient.peak == 2
+
+    def test_sync_client_falls_back_to_thread(self):
+        """Test that clients without an async SDK still work."""
+        client = FakeClient(['{"cards": [{"front": "Q"}]}'])
+
+        results = asyncio.run(client.generate_cards_concurrent("SYS", [{}]))
+
+        assert results == [[{"front": "Q"}]]
+
+    def test_duplicate_requests_coalesced(self):
+        """Test that identical in-flight requests share a single API call."""
+        class CountingClient(FakeClient):
+            async def _call_api_async(self, system_prompt, user_content):
+                self.calls.append(user_content)
+                await asyncio.sleep(0.01)
+                return '{"cards": [{"front": "Q"}]}'
+
+        client = CountingClient([])
+
+        results = asyncio.run(
+            client.generate_cards_concurrent("SYS", [{"b": 1}, {"b": 1}, {"b": 2}])
+        )
+
+        assert results == [[{"front": "Q"}]] * 3
+        assert len(client.calls) == 2
+        assert client._inflight == {}
+
+
+    def test_async_client_closed_per_run(self):
+        """Test that each run closes the SDK client it opened on its event loop."""
+        class SdkClient:
+            def __init__(self):
+                self.closed = False
+
+            async def close(self):
+                self.closed = True
+
+        class AsyncSdkClient(FakeClient):
+            created = []
+
+            def _create_async_client(self):
+                self.created.append(SdkClient())
+                return self.created[-1]
+
+            async def _call_api_async(self, system_prompt, user_content):
+                self._get_async_client()
+                return '{"cards": []}'
+
+        client = AsyncSdkClient([])
+        for _ in range(2):
+            asyncio.run(client.generate_cards_concurrent("SYS", [{"b": 1}, {"b": 2}]))
+
+        assert len(AsyncSdkClient.created) == 2
+        assert all(sdk.closed for sdk in AsyncSdkClient.created)
+        assert client._async_client is None
+
+class TestRetries:
+    """Tests for the shared retry policy."""
+
+    class StatusError(Exception):
+        def __init__(self, status_code, headers=None):
+            super().__init__(f"HTTP {status_code}")
+            self.status_code = status_code
+            self.response = httpx.Response(status_code, headers=headers or {})
+
+    def test_transient_errors_retried_with_retry_after(self, monkeypatch):
+        """Test that 429s are retried and Retry-After sets the wait."""
+        sleeps = []
+        monkeypatch.setattr(llm_client.time, "sleep", sleeps.append)
+        outcomes = [self.StatusError(429, {"retry-after": "7"}), "ok"]
+
+        def call():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        assert llm_client._with_retries(call, "Test") == "ok"
+        assert sleeps == [7.0]
+
+    def test_client_errors_not_retried(self, monkeypatch):
+        """Test that auth/bad-request errors fail immediately."""
+        monkeypatch.setattr(llm_client.time, "sleep", lambda _: pytest.fail("slept"))
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise self.StatusError(401)
+
+        with pytest.raises(LLMError, match="Test API error"):
+            llm_client._with_retries(call, "Test")
+        assert len(calls) == 1
+
+    def test_timeout_detected_by_name(self):
+        """Test that SDK errors without a status are classified by name."""
+        class APITimeoutError(Exception):
+            pass
+
+        assert llm_client._is_transient(APITimeoutError())
+        assert not llm_client._is_transient(ValueError())
+
+
+class TestStreaming:
+    """Tests for incremental card parsing."""
+
+    def test_cards_yielded_across_chunk_boundaries(self):
+        """Test that cards split over chunks, with braces in strings, decode."""
+        text = '```json\n{"cards": [{"front": "\\\\frac{a}{b}", "tags": ["x"]}, {"front": "say \\"}\\""}]}\n```'
+        chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+
+        cards = list(_parse_json_stream(chunks))
+
+        assert cards == [
+            {"front": "\\frac{a}{b}", "tags": ["x"]},
+            {"front": 'say "}"'},
+        ]
+
+    def test_first_card_before_stream_ends(self):
+        """Test that a card is yielded before later chunks are consumed."""
+        consumed = []
+
+        def chunks():
+            for piece in ['{"cards": [{"front": "A"}', ', {"front": "B"}', ']}']:
+                consumed.append(piece)
+                yield piece
+
+        stream = _parse_json_stream(chunks())
+
+        assert next(stream) == {"front": "A"}
+        assert len(consumed) == 1
+
+    def test_generate_cards_stream_default(self):
+        """Test that non-streaming clients yield parsed cards."""
+        client = FakeClient(['{"cards": [{"front": "Q"}]}'])
+
+        assert list(client.generate_cards_stream("SYS", {})) == [{"front": "Q"}]
+
+
+class TestJsonMode:
+    """Tests for parsing responses from JSON-mode providers."""
+
+    def test_recovery_skipped_in_json_mode(self):
+        """Test that JSON-mode clients do not scan malformed output for objects."""
+        client = FakeClient([])
+        text = 'Sure! {"cards": [{"front": "Q"}]}'
+
+        assert client._parse_json_response(text) == [{"front": "Q"}]
+        client.json_mode = True
+        assert client._parse_json_response(text) == []
+
+
+class TestStripCodeFence:
+    """Tests for literal code-fence extraction."""
+
+    def test_fence_contents(self):
+        """Test that the language tag and surrounding prose are dropped."""
+        text = 'Here:\n```json\n{"cards": []}\n```\nThanks'
+
+        assert _strip_code_fence(text) == '{"cards": []}'
+        assert _strip_code_fence("```\n{}\n```") == "{}"
+
+    def test_unclosed_fence(self):
+        """Test that a missing closing fence yields None."""
+        assert _strip_code_fence('```json\n{"cards": [') is None
+        assert _strip_code_fence("no fence") is None
+
+
+class TestImportSdk:
+    """Tests for lazy SDK imports."""
+
+    def test_missing_package(self):
+        """Test that a missing SDK raises LLMError with install instructions."""
+        with pytest.raises(LLMError, match="pip install no-such-sdk"):
+            llm_client._import_sdk("no_such_sdk_module", "no-such-sdk")
+
+    def test_module_reused(self):
+        """Test that repeated imports return the cached module."""
+        assert llm_client._import_sdk("json", "json") is json
+
+
+class TestValidateCards:
+    """Tests for card schema validation."""
+
+    def test_malformed_cards_dropped(self):
+        """Test that cards without a front or with bad types are skipped."""
+        cards = [
+            {"front": "Q", "back": None, "extra": 1},
+            {"back": "A"},
+            {"front": "Q", "tags": "not-a-list"},
+            "not a card",
+        ]
+
+        assert _validate_cards(cards) == [{"front": "Q", "back": "", "extra": 1}]
+
+    def test_non_list_cards(self):
+        """Test that a non-list cards value yields no cards."""
+        client = FakeClient([])
+
+        assert client._parse_json_response('{"cards": {"front": "Q"}}') == []
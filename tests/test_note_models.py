@@ -0,0 +1,187 @@
+"""Tests for note_models module."""
+
+import json
+import sys
+from datetime import date
+
+import pytest
+
+from commit.json_utils import dumps
+from commit.note_models import (
+    AnkiNote,
+    ExtractedBlock,
+    NoteMapper,
+    UnchangedNote,
+    create_revision_tag,
+)
+from commit.tex_parser import ExtractedEnvironment, extract_environments
+
+
+def make_block(content: str, env: str = "definition") -> ExtractedBlock:
+    """Extract the first block of the given environment from LaTeX source."""
+    environment = extract_environments(content, [env])[0]
+    return ExtractedBlock.from_environment(environment, "math/ch1.tex")
+
+
+class TestMapBlock:
+    """Tests for NoteMapper.map_block."""
+
+    def test_definition_note(self):
+        """Test mapping a titled definition to a Basic note."""
+        block = make_block(
+            "\\begin{definition}[Metric Space]\nA set with a distance.\n\\end{definition}\n"
+        )
+
+        note = NoteMapper("math", "abcdef123456").map_block(block, "Math")
+
+        assert note.model_name == "Basic"
+        assert note.deck_name == "Math"
+        assert note.fields["Front"] == "Definition: Metric Space"
+        assert "A set with a distance." in note.fields["Back"]
+        assert note.content_hash == block.content_hash
+        assert "commit:abcdef12" in note.tags
+        assert "file:math_ch1_tex" in note.tags
+
+    def test_empty_body_placeholder(self):
+        """Test that an empty body yields placeholder fields without formatting."""
+        block = make_block("\\begin{theorem}[Lonely]\n  \n\\end{theorem}\n", "theorem")
+
+        note = NoteMapper("math", "abc").map_block(block, "Math")
+
+        assert note.fields["Front"] == "Theorem: Lonely"
+        assert note.fields["Back"].startswith("[Empty back - check source at math/ch1.tex:")
+        assert "env:theorem" in note.tags
+
+    @pytest.mark.skipif(sys.version_info < (3, 10), reason="dataclass slots need 3.10+")
+    def test_note_is_slotted(self):
+        """Test that notes carry no per-instance __dict__."""
+        block = make_block("\\begin{definition}\nA set.\n\\end{definition}\n")
+
+        note = NoteMapper("math", "abc").map_block(block, "Math")
+
+        assert not hasattr(note, "__dict__")
+
+
+class TestMapBlocks:
+    """Tests for NoteMapper.map_blocks."""
+
+    def test_unchanged_blocks_skipped(self):
+        """Test that blocks matching their prior hash yield UnchangedNote."""
+        same = make_block("\\begin{definition}\nA set.\n\\end{definition}\n")
+        changed = make_block("\\begin{theorem}\nAll sets.\n\\end{theorem}\n", env="theorem")
+        prior = {same.guid: same.content_hash, changed.guid: "stale"}
+
+        results = list(NoteMapper("math", "abc").map_blocks([same, changed], "Math", prior))
+
+        assert results[0] == UnchangedNote(same.guid)
+        assert isinstance(results[1], AnkiNote)
+        assert results[1].fields["Front"] == "Theorem: All sets."
+
+
+class TestExtractedBlock:
+    """Tests for lazily computed block hashes."""
+
+    def test_hashes_computed_on_access(self):
+        """Test that hashes match the eager computation and are cached."""
+        from commit.hashing import compute_content_hash, compute_guid
+        from commit.tex_parser import normalize_tex
+
+        block = make_block("\\begin{definition}\nA  set.\n\\end{definition}\n")
+        assert block._content_hash is None
+
+        normalized = normalize_tex(block.body)
+        assert block.content_hash == compute_content_hash(normalized)
+        assert block.guid == compute_guid("definition", normalized, "math/ch1.tex")
+        assert block._content_hash is not None
+
+    def test_sanitized_text_cached(self):
+        """Test that sanitized body and context are computed once and reused."""
+        environment = ExtractedEnvironment(
+            env="definition", title=None, body="A set. \\input{secret}", start_line=2,
+            end_line=4, raw_text="",
+        )
+        block = ExtractedBlock.from_environment(
+            environment, "math/ch1.tex", neighbor_context="\\write18{ls} before"
+        )
+
+        assert block.sanitized_body == "A set. "
+        assert block.sanitized_context == " before"
+        assert block.sanitized_body is block.sanitized_body
+
+    def test_persistent_guid_kept(self):
+        """Test that a GUID from a LaTeX comment is used as-is."""
+        environment = ExtractedEnvironment(
+            env="definition", title=None, body="A set.", start_line=2,
+            end_line=4, raw_text="", guid="abcdef123456",
+        )
+        block = ExtractedBlock.from_environment(environment, "math/ch1.tex")
+
+        assert block.guid == "abcdef123456"
+
+    def test_matched_guid_overrides_comment(self):
+        """Test that a GUID passed at construction wins over the short comment GUID."""
+        environment = ExtractedEnvironment(
+            env="definition", title=None, body="A set.", start_line=2,
+            end_line=4, raw_text="", guid="abcdef123456",
+        )
+        block = ExtractedBlock.from_environment(
+            environment, "math/ch1.tex", guid="abcdef123456" + "0" * 28
+        )
+
+        assert block.guid == "abcdef123456" + "0" * 28
+
+    def test_frozen_and_deduplicated_by_guid(self):
+        """Test that blocks are immutable and equal blocks collapse in a set."""
+        first = make_block("\\begin{definition}\nA set.\n\\end{definition}\n")
+        second = make_block("\\begin{definition}\nA   set.\n\\end{definition}\n")
+        other = make_block("\\begin{definition}\nA group.\n\\end{definition}\n")
+
+        with pytest.raises(AttributeError):
+            first.body = "changed"
+        assert len({first, second, other}) == 2
+
+
+class TestMapBlocksParallel:
+    """Tests for process-pool mapping."""
+
+    def test_matches_serial_mapping(self):
+        """Test that pooled mapping returns the same notes in order."""
+        blocks = [
+            make_block(f"\\begin{{theorem}}\nStatement {i}.\n\\end{{theorem}}\n", env="theorem")
+            for i in range(6)
+        ]
+        mapper = NoteMapper("math", "abc")
+
+        parallel = mapper.map_blocks_parallel(blocks, "Math", workers=2, min_parallel=0)
+
+        assert parallel == [mapper.map_block(block, "Math") for block in blocks]
+
+
+class TestAnkiConnectFormat:
+    """Tests for AnkiNote.to_anki_connect_format."""
+
+    def test_payload_serializes(self):
+        """Test that the shared options and media values encode as expected."""
+        note = AnkiNote("g", "Math", "Basic", {"Front": "Q", "Back": "A"}, "h", ["auto"])
+
+        payload = json.loads(dumps(note.to_anki_connect_format()))
+
+        assert payload == {
+            "deckName": "Math",
+            "modelName": "Basic",
+            "fields": {"Front": "Q", "Back": "A"},
+            "options": {"allowDuplicate": True, "duplicateScope": "deck"},
+            "tags": ["auto"],
+            "audio": [],
+            "video": [],
+            "picture": [],
+        }
+
+
+class TestCreateRevisionTag:
+    """Tests for create_revision_tag."""
+
+    def test_format(self):
+        """Test the rev:YYYYMMDD format for an explicit and the current date."""
+        assert create_revision_tag(date(2024, 3, 5)) == "rev:20240305"
+        assert create_revision_tag() == f"rev:{date.today():%Y%m%d}"
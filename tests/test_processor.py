@@ -0,0 +1,381 @@
+"""Tests for processor module."""
+
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from commit.anki_connect import AnkiConnectError
+from commit.config import AppConfig
+from commit.llm_cache import ResponseCache
+from commit.llm_client import LLMClient, LLMError
+from commit.state import StateManager
+from commit.tex_parser import ExtractedEnvironment, extract_environments
+from commit.note_models import AnkiNote, ExtractedBlock
+from commit.processor import (
+    _batch_payload_entry,
+    _chunk_batch_blocks,
+    _course_matcher,
+    _extract_mp_context,
+    _extract_sources,
+    _batch_prompt_key,
+    _generate_cards_batch_with_llm,
+    _llm_block_key,
+    _read_source,
+    _request_batch_chunks,
+    _selection_guidance,
+    _send_field_updates,
+)
+
+
+class BatchClient(LLMClient):
+    """LLM client that selects every block it is sent."""
+
+    def __init__(self, cache=None):
+        super().__init__(model="fake", cache=cache)
+        self.requests = []
+
+    def _call_api(self, system_prompt: str, user_content: str) -> str:
+        payload = json.loads(user_content)
+        self.requests.append(payload)
+        return json.dumps({
+            "selected_blocks": [
+                {"block_index": b["index"], "cards": [{"front": b["body"]}]}
+                for b in payload["blocks"]
+            ],
+            "skipped_blocks": [],
+            "summary": {"total_cards": len(payload["blocks"]), "quality_threshold_met": True},
+        })
+
+
+def make_payload_blocks(count: int, body_size: int = 10):
+    """Build batch payload entries with distinct bodies."""
+    return [
+        {
+            "index": i,
+            "course": "math",
+            "priority": 1,
+            "body": f"{i}".ljust(body_size, "x"),
+            "neighbor_context": "",
+        }
+        for i in range(count)
+    ]
+
+
+class TestReadSource:
+    """Tests for reading source files."""
+
+    def test_newlines_normalized(self, tmp_path):
+        """Test that CRLF and lone CR become LF."""
+        path = tmp_path / "notes.tex"
+        path.write_bytes("\\begin{theorem}\r\næø\r\\end{theorem}\n".encode("utf-8"))
+
+        assert _read_source(path) == "\\begin{theorem}\næø\n\\end{theorem}\n"
+
+    def test_invalid_utf8_raises(self, tmp_path):
+        """Test that undecodable bytes fail the read instead of being replaced."""
+        path = tmp_path / "notes.tex"
+        path.write_bytes(b"\\begin{theorem}\n\xe6\xf8\n\\end{theorem}\n")
+
+        with pytest.raises(UnicodeDecodeError):
+            _read_source(path)
+
+    def test_missing_file(self, tmp_path):
+        """Test that a missing file yields None."""
+        assert _read_source(tmp_path / "missing.tex") is None
+
+
+class TestExtractSources:
+    """Tests for extracting environments from many sources."""
+
+    def test_pool_matches_in_process(self):
+        """Test that extraction in a process pool returns the same environments in order."""
+        contents = [
+            f"\\begin{{theorem}}[T{i}]\nAll sets.\n\\end{{theorem}}\n" for i in range(10)
+        ]
+
+        with ProcessPoolExecutor(2, mp_context=_extract_mp_context()) as pool:
+            pooled = list(_extract_sources(contents, ["theorem"], pool))
+
+        assert pooled == list(_extract_sources(contents, ["theorem"]))
+        assert [envs[0].title for envs in pooled] == [f"T{i}" for i in range(10)]
+
+    def test_error_returned_per_source(self, monkeypatch):
+        """Test that a failing source yields its error without stopping the rest."""
+        from commit import processor
+
+        def extract(content, envs):
+            if content == "bad":
+                raise ValueError("bad source")
+            return [content]
+
+        monkeypatch.setattr(processor, "extract_environments", extract)
+
+        results = list(_extract_sources(["a", "bad", "c"], ["theorem"]))
+
+        assert results[0] == ["a"] and results[2] == ["c"]
+        assert isinstance(results[1], ValueError)
+
+
+class TestCourseMatcher:
+    """Tests for matching files to courses."""
+
+    def test_first_matching_course_wins(self):
+        """Test that courses are tried in order and unmatched files yield None."""
+        config = AppConfig(courses={
+            "pde": {"paths": ["pde/**/*.tex"], "deck": "PDE"},
+            "math": {"paths": ["notes/*.tex", "**/*.tex"], "deck": "Math"},
+            "never": {"paths": ["pde/x.tex"], "deck": "Never"},
+        })
+        match = _course_matcher(config.courses)
+
+        assert match("pde/ch1/waves.tex") == "pde"
+        assert match("./notes/a.tex") == "math"
+        assert match("pde/x.tex") == "pde"
+        assert match("notes/readme.md") is None
+
+
+class TestBatchPayloadEntry:
+    """Tests for describing a block in the batch payload."""
+
+    def test_entry_fields(self):
+        """Test that the entry carries sanitized text and an uppercase description."""
+        environment = ExtractedEnvironment(
+            env="theorem", title=None, body="All sets. \\input{secret}", start_line=3,
+            end_line=5, raw_text="",
+        )
+        block = ExtractedBlock.from_environment(environment, "math/ch1.tex", neighbor_context="ctx")
+        meta = {"block": block, "course": "math", "priority": 2}
+
+        entry = _batch_payload_entry(4, meta, {"theorem": "THEOREM"})
+
+        assert entry["index"] == 4
+        assert entry["priority"] == 2
+        assert entry["env_type"] == "THEOREM"
+        assert entry["description"] == "[THEOREM] (untitled)"
+        assert entry["body"] == "All sets. "
+        assert entry["neighbor_context"] == "ctx"
+        assert (entry["file"], entry["line"]) == ("math/ch1.tex", block.line_number)
+
+
+class TestChunkBatchBlocks:
+    """Tests for splitting batch payloads by size."""
+
+    def test_chunks_respect_budget(self):
+        """Test that chunks stay under the character budget and keep order."""
+        chunks = _chunk_batch_blocks(make_payload_blocks(5), max_chars=25)
+
+        assert [[b["index"] for b in chunk] for chunk in chunks] == [[0, 1], [2, 3], [4]]
+
+    def test_oversized_block_gets_own_chunk(self):
+        """Test that a block larger than the budget is still sent."""
+        chunks = _chunk_batch_blocks(make_payload_blocks(2, body_size=100), max_chars=25)
+
+        assert len(chunks) == 2
+
+
+class TestRequestBatchChunks:
+    """Tests for concurrent batch selection."""
+
+    def test_indices_mapped_back_to_batch(self):
+        """Test that chunk-local block indices are translated to batch indices."""
+        config = AppConfig(
+            courses={}, daily_new_limit=10, llm={"chunking": {"max_chars": 25}}
+        )
+        client = BatchClient()
+        blocks = make_payload_blocks(5)
+
+        progress = []
+        response = asyncio.run(_request_batch_chunks(
+            blocks, "", client, config, on_progress=lambda *p: progress.append(p)
+        ))
+
+        assert [s["block_index"] for s in response["selected_blocks"]] == [0, 1, 2, 3, 4]
+        assert progress == [(1, 3), (2, 3), (3, 3)]
+        assert [s["cards"][0]["front"] for s in response["selected_blocks"]] == [
+            b["body"] for b in blocks
+        ]
+        assert [[b["index"] for b in r["blocks"]] for r in client.requests] == [
+            [0, 1], [0, 1], [0]
+        ]
+        assert [r["daily_limit"] for r in client.requests] == [4, 4, 2]
+        assert response["summary"]["total_cards"] == 5
+
+    def test_async_client_closed_after_run(self):
+        """Test that the LLM client's async resources are released when the run ends."""
+        class ClosingClient(BatchClient):
+            closed = 0
+
+            async def aclose(self):
+                ClosingClient.closed += 1
+
+        config = AppConfig(courses={}, llm={"chunking": {"max_chars": 25}})
+
+        asyncio.run(_request_batch_chunks(make_payload_blocks(3), "", ClosingClient(), config))
+
+        assert ClosingClient.closed == 1
+
+    def test_chunking_off_sends_one_request(self):
+        """Test that disabling chunking keeps a single batch request."""
+        config = AppConfig(
+            courses={}, llm={"chunking": {"mode": "off", "max_chars": 25}}
+        )
+        client = BatchClient()
+
+        asyncio.run(_request_batch_chunks(make_payload_blocks(5), "", client, config))
+
+        assert len(client.requests) == 1
+
+    def test_cached_blocks_not_resent(self, tmp_path):
+        """Test that only blocks without a cached outcome are requested again."""
+        config = AppConfig(courses={}, llm={"chunking": {"max_chars": 25}})
+        cache = ResponseCache(tmp_path)
+        blocks = make_payload_blocks(3)
+        asyncio.run(_request_batch_chunks(blocks, "", BatchClient(cache), config))
+
+        client = BatchClient(cache)
+        changed = blocks[:2] + [{**blocks[2], "body": "changed"}]
+        response = asyncio.run(_request_batch_chunks(changed, "", client, config))
+
+        assert [[b["body"] for b in r["blocks"]] for r in client.requests] == [["changed"]]
+        assert [s["cards"][0]["front"] for s in response["selected_blocks"]] == [
+            blocks[0]["body"], blocks[1]["body"], "changed"
+        ]
+        assert [s["block_index"] for s in response["selected_blocks"]] == [0, 1, 2]
+
+
+class CardClient(LLMClient):
+    """LLM client that selects every block with one valid card each."""
+
+    def __init__(self, fail=False):
+        super().__init__(model="fake")
+        self.fail = fail
+
+    def _call_api(self, system_prompt: str, user_content: str) -> str:
+        if self.fail:
+            raise LLMError("down")
+        payload = json.loads(user_content)
+        return json.dumps({
+            "selected_blocks": [
+                {
+                    "block_index": b["index"],
+                    "reasoning": "[/odd]",
+                    "cards": [{"front": f"What does block {b['body']} say?", "back": "It says so."}],
+                }
+                for b in payload["blocks"]
+            ],
+            "skipped_blocks": [],
+        })
+
+
+def make_blocks_with_meta(count: int):
+    """Build batch metadata for theorem blocks with distinct bodies."""
+    source = "".join(
+        f"\\begin{{theorem}}\nStatement {i}.\n\\end{{theorem}}\n" for i in range(count)
+    )
+    return [
+        {
+            "block": ExtractedBlock.from_environment(env, "math/ch1.tex"),
+            "course": "math",
+            "priority": 1,
+            "deck": "Math",
+        }
+        for env in extract_environments(source, ["theorem"])
+    ]
+
+
+class TestGenerateCardsBatchWithLlm:
+    """Tests for batch card generation."""
+
+    def test_actions_returned_and_blocks_recorded(self, tmp_path):
+        """Test that one create action per card is returned and sent blocks are recorded."""
+        state = StateManager(tmp_path / "state.json")
+        blocks = make_blocks_with_meta(3)
+
+        actions = _generate_cards_batch_with_llm(
+            blocks, CardClient(), AppConfig(courses={}), state, "abc123"
+        )
+
+        assert [a["action"] for a in actions] == ["create"] * 3
+        assert [a["block"] for a in actions] == [m["block"] for m in blocks]
+        assert set(state._state["llm_blocks"]) == {m["block"].guid for m in blocks}
+
+    def test_failed_request_falls_back_to_basic(self, tmp_path):
+        """Test that a failed request maps every block without recording it as sent."""
+        state = StateManager(tmp_path / "state.json")
+        blocks = make_blocks_with_meta(2)
+
+        actions = _generate_cards_batch_with_llm(
+            blocks, CardClient(fail=True), AppConfig(courses={}), state, "abc123"
+        )
+
+        assert [a["note"].fields["Front"] for a in actions] == [
+            "Theorem: Statement 0.", "Theorem: Statement 1."
+        ]
+        assert state._state["llm_blocks"] == {}
+
+    def test_undone_blocks_regenerated(self, tmp_path):
+        """Test that blocks whose notes were undone are sent again."""
+        state = StateManager(tmp_path / "state.json")
+        config = AppConfig(courses={})
+        blocks = make_blocks_with_meta(2)
+        prompt_key = _batch_prompt_key(_selection_guidance(config), config)
+
+        def current():
+            return [
+                state.is_llm_block_current(m["block"].guid, _llm_block_key("fake", prompt_key, m["block"]))
+                for m in blocks
+            ]
+
+        actions = _generate_cards_batch_with_llm(blocks, CardClient(), config, state, "abc123")
+        assert current() == [False, False]  # Nothing synced yet
+
+        for action in actions:
+            note = action["note"]
+            state.record_note(note.guid, 1, "Math", note.content_hash, commit_sha="abc123")
+        assert current() == [True, True]
+
+        state.remove_notes_by_guids(state.get_notes_for_commit("abc123"))
+        assert current() == [False, False]
+
+        again = _generate_cards_batch_with_llm(blocks, CardClient(), config, state, "abc123")
+        assert [a["action"] for a in again] == ["create", "create"]
+
+
+class UpdateClient:
+    """AnkiConnect stand-in that fails updates to selected note IDs."""
+
+    def __init__(self, failing_ids):
+        self.failing_ids = failing_ids
+        self.tagged = []
+
+    def multi_settled(self, actions):
+        return [
+            AnkiConnectError("gone") if a["params"]["note"]["id"] in self.failing_ids else None
+            for a in actions
+        ]
+
+    def add_tags(self, note_ids, tags):
+        self.tagged.extend(note_ids)
+
+
+class TestSendFieldUpdates:
+    """Tests for sending field updates to Anki."""
+
+    def test_failed_update_warned_and_not_recorded(self, tmp_path):
+        """Test that only accepted updates are recorded and tagged."""
+        state = StateManager(tmp_path / "state.json")
+        updates = [
+            (AnkiNote(guid, "Math", "Basic", {"Front": guid}, f"h-{guid}", []), note_id, f"f-{guid}")
+            for guid, note_id in (("aaaa", 1), ("bbbb", 2))
+        ]
+        client = UpdateClient(failing_ids={2})
+        stats = {"warnings": []}
+
+        _send_field_updates(client, updates, state, stats, "t")
+
+        assert state.get_fields_hash("aaaa") == "f-aaaa"
+        assert state.get_note_info("bbbb") is None
+        assert client.tagged == [1]
+        assert stats["warnings"] == ["Failed to update note bbbb: gone"]
@@ -0,0 +1,64 @@
+"""Tests for prompts module."""
+
+from commit.config import LLMConfig
+from commit.prompts import (
+    BATCH_CARDS_SYSTEM_PROMPT,
+    CARDS_SYSTEM_PROMPT,
+    CHAT_SYSTEM_PROMPT,
+    MAX_CHAT_DIFF_CHARS,
+    extract_cards_from_chat,
+    format_cards_prompt,
+    format_chat_prompt,
+)
+
+
+class TestFormatCardsPrompt:
+    """Tests for building card generation prompts."""
+
+    def test_system_prompt_independent_of_settings(self):
+        """Test that settings go in the payload and the system prompt never changes."""
+        first, first_payload = format_cards_prompt(
+            LLMConfig(max_cards_per_block=2, paraphrase_strength=0.1), {"body": "x"}
+        )
+        second, second_payload = format_cards_prompt(
+            LLMConfig(max_cards_per_block=5, paraphrase_strength=0.9), {"body": "x"}
+        )
+
+        assert first == second == CARDS_SYSTEM_PROMPT
+        assert (first_payload["max_cards"], first_payload["paraphrase_strength"]) == (2, 0.1)
+        assert (second_payload["max_cards"], second_payload["paraphrase_strength"]) == (5, 0.9)
+
+    def test_examples_unescaped(self):
+        """Test that the static prompts contain literal JSON braces."""
+        assert '{\n  "cards": [' in CARDS_SYSTEM_PROMPT
+        assert '{\n  "selected_blocks": [' in BATCH_CARDS_SYSTEM_PROMPT
+
+
+class TestFormatChatPrompt:
+    """Tests for building chat prompts."""
+
+    def test_long_diff_truncated_at_line(self):
+        """Test that the diff is cut at a line boundary and the system prompt is fixed."""
+        diff = "\n".join(f"+ line {i}" for i in range(2000))
+
+        system_prompt, message = format_chat_prompt(None, diff)
+
+        assert system_prompt == CHAT_SYSTEM_PROMPT
+        assert '{\n  "cards": [' in CHAT_SYSTEM_PROMPT
+        body = message.split("```latex\n", 1)[1].split("\n```", 1)[0]
+        assert body.endswith("\n... (truncated)")
+        assert all(line.startswith("+ line ") for line in body.splitlines()[:-1])
+        assert len(body) <= MAX_CHAT_DIFF_CHARS + len("\n... (truncated)")
+
+
+class TestExtractCardsFromChat:
+    """Tests for pulling card proposals out of chat replies."""
+
+    def test_fenced_and_inline(self):
+        """Test that fenced blocks are preferred and bare JSON is the fallback."""
+        fenced = 'Try:\n```json\n{"cards": [{"front": "A"}]}\n```\nand\n```json\n{"cards": [{"front": "B"}]}\n```'
+        inline = 'Here: {"cards": [{"front": "C"}]} done'
+
+        assert extract_cards_from_chat(fenced) == [{"front": "A"}, {"front": "B"}]
+        assert extract_cards_from_chat(inline) == [{"front": "C"}]
+        assert extract_cards_from_chat("no cards") == []
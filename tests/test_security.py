@@ -0,0 +1,71 @@
+"""Tests for security module."""
+
+import pytest
+
+from commit import security
+from commit.security import is_safe_latex, strip_dangerous_latex, validate_latex_for_llm
+
+
+class TestStripDangerousLatex:
+    """Tests for removing dangerous commands."""
+
+    def test_arguments_removed_with_command(self):
+        """Test that braced and optional arguments go with their command."""
+        content = r"A \input{secret} B \include[x] C \WRITE18 {ls} D \immediate"
+
+        assert strip_dangerous_latex(content) == "A  B  C  D "
+
+    def test_shell_escape_flags_removed(self):
+        """Test that shell-escape flags are removed regardless of case."""
+        assert strip_dangerous_latex("pdflatex --Shell-Escape x") == "pdflatex  x"
+
+    def test_longer_command_names_kept(self):
+        """Test that commands merely starting with a dangerous name survive."""
+        content = r"\includegraphics{fig} \inputenc \textbf{x}"
+
+        assert strip_dangerous_latex(content) == content
+
+    def test_clean_content_skips_substitution(self, monkeypatch):
+        """Test that content without dangerous commands is returned after one scan."""
+        class NoSub:
+            def sub(self, *args):
+                raise AssertionError("substitution ran")
+
+        monkeypatch.setattr(security, "_DANGEROUS_COMMAND_RE", NoSub())
+        monkeypatch.setattr(security, "_SHELL_ESCAPE_RE", NoSub())
+        content = r"$\frac{a}{b}$ \includegraphics{fig}"
+
+        assert strip_dangerous_latex(content) is content
+
+
+class TestIsSafeLatex:
+    """Tests for detecting dangerous commands."""
+
+    def test_dangerous_commands_detected(self):
+        """Test that single-backslash commands and flags are flagged."""
+        assert not is_safe_latex(r"\write18{rm -rf /}")
+        assert not is_safe_latex(r"\Input{x}")
+        assert not is_safe_latex("run with -shell-escape")
+
+    def test_safe_content(self):
+        """Test that ordinary LaTeX, including look-alike commands, is safe."""
+        assert is_safe_latex(r"$\frac{a}{b}$ \includegraphics{fig}")
+        assert is_safe_latex(strip_dangerous_latex(r"\input{x} \def\a{b}"))
+
+
+class TestValidateLatexForLlm:
+    """Tests for validating content before it is sent to an LLM."""
+
+    def test_dangerous_content_sanitized_once(self, monkeypatch, capsys):
+        """Test that dangerous content is stripped and flagged without a separate safety check."""
+        monkeypatch.setattr(security, "is_safe_latex", lambda _: pytest.fail("rescanned"))
+
+        assert validate_latex_for_llm(r"A \input{x} B") == (True, "A  B")
+        assert "Dangerous" in capsys.readouterr().out
+
+    def test_clean_content_truncated(self):
+        """Test that clean content passes through, truncated to the limit."""
+        assert validate_latex_for_llm("abcdef", max_length=4) == (
+            True, "abcd\n... (truncated for LLM)"
+        )
+        assert validate_latex_for_llm("  ")[0] is False
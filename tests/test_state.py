@@ -0,0 +1,264 @@
+"""Tests for state module."""
+
+import json
+
+from commit import state as state_module
+from commit.state import StateManager
+
+
+class TestJournal:
+    """Tests for journaled state saves."""
+
+    def test_changes_appended_and_replayed(self, tmp_path):
+        """Test that saves after the first append to the journal and reload intact."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.record_note("a", 1, "Math", "h1")
+        manager.save()
+        snapshot = path.read_text()
+
+        manager.record_note("b", 2, "Math", "h2")
+        manager.record_llm_block("a", "k1", ["b"])
+        manager.set_last_processed_sha("abc")
+        manager.remove_notes_by_guids(["a"])
+        manager.save()
+
+        assert path.read_text() == snapshot
+        reloaded = StateManager(path)
+        assert reloaded.get_all_note_guids() == ["b"]
+        assert reloaded.is_llm_block_current("a", "k1")
+        assert reloaded.get_last_processed_sha() == "abc"
+
+    def test_torn_line_ignored(self, tmp_path):
+        """Test that an interrupted append loses only the torn entry."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.save()
+        manager.record_note("a", 1, "Math", "h1")
+        manager.save()
+        with open(manager.journal_file, "a", encoding="utf-8") as f:
+            f.write('{"op": "set", "section": "note_')
+
+        reloaded = StateManager(path)
+
+        assert reloaded.get_all_note_guids() == ["a"]
+
+    def test_compaction_folds_journal(self, tmp_path, monkeypatch):
+        """Test that a long journal is folded into the snapshot."""
+        monkeypatch.setattr(state_module, "JOURNAL_COMPACT_LINES", 2)
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.save()
+        for guid in "abc":
+            manager.record_note(guid, 1, "Math", "h")
+            manager.save()
+
+        assert not manager.journal_file.exists()
+        assert set(json.loads(path.read_text())["note_hashes"]) == {"a", "b", "c"}
+        assert StateManager(path).get_all_note_guids() == ["a", "b", "c"]
+
+    def test_stale_journal_ignored(self, tmp_path):
+        """Test that a journal from before the last snapshot is not replayed."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.save()
+        manager.record_note("a", 1, "Math", "h1")
+        manager.save()
+        stale = manager.journal_file.read_text()
+
+        manager.replace_note_hashes({})
+        manager.save()
+        manager.journal_file.write_text(stale)
+
+        assert StateManager(path).get_all_note_guids() == []
+
+
+class TestExport:
+    """Tests for compact snapshots and readable exports."""
+
+    def test_snapshot_compact_export_pretty(self, tmp_path):
+        """Test that the snapshot has no indentation while a pretty export does."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.record_note("a", 1, "Math", "h1")
+        manager.save()
+
+        pretty = manager.export(pretty=True).decode()
+
+        assert "\n" not in path.read_text()
+        assert pretty.startswith("{\n  ")
+        assert json.loads(pretty) == json.loads(path.read_text())
+
+
+class TestLlmGenerations:
+    """Tests for the separate LLM generation archive."""
+
+    def test_archive_read_on_demand(self, tmp_path):
+        """Test that generations are appended to the archive and read only when asked."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.record_llm_generation("a", {"cards": []}, "m", "p", now="t1")
+        manager.save()
+        manager.record_llm_generation("a", {"cards": [1]}, "m", "p", now="t2")
+        manager.save()
+
+        reloaded = StateManager(path)
+
+        assert "llm_generations" not in json.loads(path.read_text())
+        assert reloaded._llm_generations is None
+        assert reloaded.get_llm_history("a") == {
+            "response": {"cards": [1]}, "timestamp": "t2", "model": "m", "provider": "p",
+        }
+
+    def test_inline_history_migrated(self, tmp_path):
+        """Test that generations stored in an older snapshot move to the archive."""
+        path = tmp_path / "state.json"
+        entry = {"response": {}, "timestamp": "t", "model": "m", "provider": "p"}
+        path.write_text(json.dumps({"note_hashes": {}, "llm_generations": {"a": entry}}))
+
+        manager = StateManager(path)
+        assert manager.get_llm_history("a") == entry
+        manager.save()
+
+        assert "llm_generations" not in json.loads(path.read_text())
+        assert StateManager(path).get_llm_history("a") == entry
+
+    def test_identical_responses_stored_once(self, tmp_path):
+        """Test that generations sharing a response reference one stored blob."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.record_llm_generation("a", {"cards": []}, "m", "p", now="t1")
+        manager.save()
+        manager.record_llm_generation("b", {"cards": []}, "m", "p", now="t2")
+        manager.record_llm_generation("c", {"cards": [1]}, "m", "p", now="t3")
+        manager.save()
+
+        lines = [json.loads(line) for line in manager.llm_file.read_text().splitlines()]
+        reloaded = StateManager(path)
+
+        assert sum("blob" in line for line in lines) == 2
+        assert reloaded.get_llm_history("b") == {
+            "response": {"cards": []}, "timestamp": "t2", "model": "m", "provider": "p",
+        }
+        assert reloaded.get_llm_history("c")["response"] == {"cards": [1]}
+
+    def test_inline_archive_lines_read(self, tmp_path):
+        """Test that archive lines carrying their response inline still load."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        entry = {"response": {"cards": []}, "timestamp": "t", "model": "m", "provider": "p"}
+        manager.llm_file.write_text(json.dumps({"guid": "a", **entry}) + "\n")
+
+        assert manager.get_llm_history("a") == entry
+
+    def test_clear_empties_archive(self, tmp_path):
+        """Test that clearing history drops saved generations."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.record_llm_generation("a", {}, "m", "p")
+        manager.save()
+
+        manager.clear_llm_history()
+        manager.record_llm_generation("b", {}, "m", "p")
+        manager.save()
+
+        reloaded = StateManager(path)
+        assert reloaded.get_llm_history("a") is None
+        assert reloaded.get_llm_history("b") is not None
+
+
+class TestLlmBlocks:
+    """Tests for deciding whether a block needs another LLM run."""
+
+    def test_current_while_key_and_notes_stand(self, tmp_path):
+        """Test that a changed key or a removed note re-queues the block."""
+        manager = StateManager(tmp_path / "state.json")
+        manager.record_note("n1", 1, "Math", "h", commit_sha="aaaa")
+        manager.record_note("n2", 2, "Math", "h", commit_sha="aaaa")
+        manager.record_llm_block("block", "k1", ["n1", "n2"])
+
+        assert manager.is_llm_block_current("block", "k1")
+        assert not manager.is_llm_block_current("block", "k2")
+        assert not manager.is_llm_block_current("other", "k1")
+
+        manager.remove_notes_by_guids(["n2"])
+        assert not manager.is_llm_block_current("block", "k1")
+
+    def test_blocks_without_notes_or_old_entries_not_current(self, tmp_path):
+        """Test that empty runs and content-hash entries from older state are re-sent."""
+        manager = StateManager(tmp_path / "state.json")
+        manager.record_llm_block("empty", "k1", [])
+        manager._state["llm_blocks"]["old"] = "k1"
+
+        assert not manager.is_llm_block_current("empty", "k1")
+        assert not manager.is_llm_block_current("old", "k1")
+
+
+class TestRecordNote:
+    """Tests for recording notes."""
+
+    def test_shared_timestamp(self, tmp_path):
+        """Test that a passed timestamp is used and created_at survives updates."""
+        manager = StateManager(tmp_path / "state.json")
+
+        manager.record_note("a", 1, "Math", "h1", now="2024-01-01T00:00:00")
+        manager.record_note("a", 1, "Math", "h2", now="2024-02-01T00:00:00")
+
+        info = manager.get_note_info("a")
+        assert info["created_at"] == "2024-01-01T00:00:00"
+        assert info["updated_at"] == "2024-02-01T00:00:00"
+        assert info["content_hash"] == "h2"
+
+
+class TestGetNoteAction:
+    """Tests for choosing a sync action from recorded hashes."""
+
+    def test_actions(self, tmp_path):
+        """Test create for untracked, skip for unchanged and update for changed notes."""
+        manager = StateManager(tmp_path / "state.json")
+        manager.record_note("a", 1, "Math", "h1")
+
+        assert manager.get_note_action("new", "h1") == "create"
+        assert manager.get_note_action("a", "h1") == "skip"
+        assert manager.get_note_action("a", "h2") == "update"
+        assert manager.has_note_changed("a", "h2")
+        assert not manager.has_note_changed("new", "h2")
+
+
+class TestNotesForCommit:
+    """Tests for looking up notes by creating commit."""
+
+    def test_lookup_by_full_and_short_sha(self, tmp_path):
+        """Test that notes are found by creating commit, not updating commit."""
+        path = tmp_path / "state.json"
+        manager = StateManager(path)
+        manager.record_note("a", 1, "Math", "h", commit_sha="aaaa1111")
+        manager.record_note("b", 2, "Math", "h", commit_sha="bbbb2222")
+        manager.record_note("a", 1, "Math", "h2", commit_sha="bbbb2222")
+        manager.save()
+
+        reloaded = StateManager(path)
+
+        assert reloaded.get_notes_for_commit("aaaa1111") == ["a"]
+        assert reloaded.get_notes_for_commit("bbbb") == ["b"]
+        assert reloaded.get_notes_for_commit("cccc") == []
+
+    def test_index_follows_changes(self, tmp_path):
+        """Test that notes added or removed after the first lookup are reflected."""
+        manager = StateManager(tmp_path / "state.json")
+        manager.record_note("a", 1, "Math", "h", commit_sha="aaaa")
+        assert manager.get_notes_for_commit("aaaa") == ["a"]
+
+        manager.record_note("b", 2, "Math", "h", commit_sha="aaaa")
+        manager.remove_notes_by_guids(["a"])
+
+        assert manager.get_notes_for_commit("aaaa") == ["b"]
+
+    def test_untracked_commit_included(self, tmp_path):
+        """Test that notes without a recorded commit are returned for any commit."""
+        manager = StateManager(tmp_path / "state.json")
+        manager.record_note("legacy", 1, "Math", "h")
+        manager.record_note("a", 2, "Math", "h", commit_sha="aaaa")
+
+        assert sorted(manager.get_notes_for_commit("aaaa")) == ["a", "legacy"]
+        assert manager.get_notes_for_commit("bbbb") == ["legacy"]
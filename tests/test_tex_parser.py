@@ -7,6 +7,8 @@ from commit.tex_parser import (
     normalize_tex,
     extract_metadata,
     get_first_sentence,
+    inject_guid_comment,
+    inject_guid_comments,
     strip_latex_commands,
 )
 
@@ -252,3 +254,45 @@ class TestStripLatexCommands:
         assert "important" in result
         assert r"\textbf" not in result
 
+
+
+class TestInjectGuidComments:
+    """Tests for GUID comment injection."""
+
+    SOURCE = (
+        "\\begin{definition}\nA.\n\\end{definition}\n"
+        "\\begin{theorem}\nB.\n\\end{theorem}\n"
+    )
+
+    def test_several_blocks_in_one_pass(self, tmp_path):
+        """Test that comments land above the right environments despite shifting lines."""
+        path = tmp_path / "notes.tex"
+        path.write_text(self.SOURCE, encoding="utf-8")
+
+        count = inject_guid_comments(str(path), {1: "a" * 40, 4: "b" * 40})
+
+        assert count == 2
+        assert path.read_text(encoding="utf-8").splitlines() == [
+            "% anki-tex-guid: " + "a" * 12,
+            r"\begin{definition}", "A.", r"\end{definition}",
+            "% anki-tex-guid: " + "b" * 12,
+            r"\begin{theorem}", "B.", r"\end{theorem}",
+        ]
+
+    def test_existing_comment(self, tmp_path):
+        """Test that existing comments are updated, or kept when updates are disabled."""
+        path = tmp_path / "notes.tex"
+        path.write_text("% guid: 0123456789ab\n" + self.SOURCE, encoding="utf-8")
+
+        assert inject_guid_comments(str(path), {2: "c" * 40}, update_existing=False) == 0
+        assert inject_guid_comment(str(path), 2, "1" * 40) is True
+        assert path.read_text(encoding="utf-8").startswith("% guid: " + "1" * 12 + "\n")
+
+    def test_line_out_of_range(self, tmp_path):
+        """Test that an invalid line number leaves the file untouched."""
+        path = tmp_path / "notes.tex"
+        path.write_text(self.SOURCE, encoding="utf-8")
+
+        with pytest.raises(ValueError):
+            inject_guid_comments(str(path), {1: "a" * 40, 99: "b" * 40})
+        assert path.read_text(encoding="utf-8") == self.SOURCE